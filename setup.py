@@ -18,10 +18,13 @@ setup(
         "GitPython",
         "requests"
     ],
+    extras_require = {
+        "secrets": ["cryptography"]
+    },
     python_requires = '>=3.6',
     entry_points = {
         'console_scripts': [
-            'wpm=wpmcli.cli:main',
+            'wpm=wpmcli.entry:main',
         ],
     }
 )
\ No newline at end of file
@@ -0,0 +1,307 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+#####################################################################################################
+# offline benchmark for wpm:
+#  - synthetic buckets: json files, `.py` constructors and nested `add_bucket` folders
+#  - synthetic remotes: local bare repos with a configurable history and file count
+#  - every command runs in its own `wpm` process against that workspace, timings go to a json file
+#    and can be compared with a stored baseline
+#
+#   python tests/benchmark.py --scales 10,50 --out bench.json
+#   python tests/benchmark.py --scales 10,50 --save-baseline
+#   python tests/benchmark.py --scales 10,50 --baseline tests/benchmark_baseline.json
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(THIS_DIR)
+DEFAULT_BASELINE = os.path.join(THIS_DIR, "benchmark_baseline.json")
+
+COMMANDS = ["load-cold", "load-warm", "list", "install", "status-fast", "status", "update", "refresh"]
+
+#####################################################################################################
+# remotes
+
+def _git(args, cwd, input = None):
+	p = subprocess.run(["git"] + args, cwd = cwd, input = input, stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+	if p.returncode != 0:
+		raise Exception(f"git {' '.join(args)} failed:\n{p.stderr.decode('utf-8', 'replace')}")
+	return p.stdout
+
+def _fast_import_stream(commits, files):
+	#`commits` commits on main, the first one adds `files` files, every other one rewrites a few of them
+	out = []
+	when = 1600000000
+	for c in range(commits):
+		out.append("commit refs/heads/main")
+		out.append(f"mark :{c + 1}")
+		out.append(f"committer bench <bench@localhost> {when + c * 60} +0000")
+		message = f"commit {c}"
+		out.append(f"data {len(message)}")
+		out.append(message)
+		if c > 0:
+			out.append(f"from :{c}")
+
+		changed = range(files) if c == 0 else [(c * 7 + k) % files for k in range(min(3, files))]
+		for f in changed:
+			content = f"file {f} revision {c}\n" * 8
+			out.append(f"M 644 inline src/dir{f % 16}/file{f}.txt")
+			out.append(f"data {len(content.encode('utf-8'))}")
+			out.append(content)
+
+		out.append("")
+
+	return ("\n".join(out) + "\n").encode("utf-8")
+
+def create_template_remote(abs_path, commits, files):
+	_git(["init", "--bare", "--quiet", abs_path], None)
+	_git(["fast-import", "--quiet"], abs_path, _fast_import_stream(commits, files))
+	_git(["symbolic-ref", "HEAD", "refs/heads/main"], abs_path)
+	_git(["gc", "--quiet"], abs_path)
+
+def create_remotes(root, count, commits, files):
+	#one template, copied for every package (each package still gets its own remote)
+	template = os.path.join(root, "template.git")
+	create_template_remote(template, commits, files)
+
+	remotes = os.path.join(root, "remotes")
+	os.makedirs(remotes, exist_ok = True)
+	for i in range(count):
+		shutil.copytree(template, os.path.join(remotes, f"pack{i:05d}.git"))
+
+	return remotes
+
+#####################################################################################################
+# buckets
+
+def package_names(count):
+	return [f"pack{i:05d}" for i in range(count)]
+
+def create_buckets(root, remotes, count, per_file):
+	#thirds: json files at the top, a `.py` constructor, json files in a nested bucket pulled in by `add_bucket`
+	bucket = os.path.join(root, "buckets")
+	nested = os.path.join(bucket, "nested")
+	os.makedirs(nested, exist_ok = True)
+
+	names = package_names(count)
+	json_names = names[0::3] + names[2::3]
+	py_names = names[1::3]
+
+	for index, start in enumerate(range(0, len(json_names), per_file)):
+		chunk = json_names[start:start + per_file]
+		folder = bucket if index % 2 == 0 else nested
+		content = {".bucket" : {"REMOTES" : remotes, "git-user" : "bench", "git-email" : "bench@localhost"}}
+		for n in chunk:
+			content[n] = {"class" : "git", "active-branch" : "main", "url" : "file://{REMOTES}/" + n + ".git"}
+		with open(os.path.join(folder, f"defs{index:04d}.json"), "w") as f:
+			json.dump(content, f, indent = 1)
+
+	lines = ["def load(database):", "\tdatabase.add_bucket(\"nested\")"]
+	for n in py_names:
+		lines.append(f"\tdatabase.add_git(\"{n}\", \"file://{remotes}/{n}.git\").branch(\"main\")")
+	with open(os.path.join(bucket, "constructor.py"), "w") as f:
+		f.write("\n".join(lines) + "\n")
+
+	return bucket
+
+#####################################################################################################
+# runs
+
+class Bench():
+	def __init__(self, root, bucket, jobs):
+		self.root = root
+		self.workspace = os.path.join(root, "workspace")
+		os.makedirs(os.path.join(self.workspace, ".wpm"), exist_ok = True)
+		self.jobs = jobs
+
+		self.env = dict(os.environ)
+		self.env["WPM_SEARCH_LOCATIONS"] = bucket
+		self.env["WPM_WORKSPACE_PATH"] = self.workspace
+		self.env["HOST_WORKSPACE"] = self.workspace
+		self.env["PYTHONPATH"] = REPO_DIR + os.pathsep + self.env.get("PYTHONPATH", "")
+		self.env["GIT_TERMINAL_PROMPT"] = "0"
+		#safe.directory and friends go to a throw away config, never to the user's one
+		self.env["GIT_CONFIG_GLOBAL"] = os.path.join(root, "gitconfig")
+		self.env.pop("WPM_USE_MIRRORS", None)
+
+	def wpm(self, args):
+		#returns the wall time of `wpm args`, raises if the command failed
+		cmd = [sys.executable, "-c", "from wpmcli.entry import main; main()"] + args
+		start = time.perf_counter()
+		p = subprocess.run(cmd, cwd = self.workspace, env = self.env, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+		duration = time.perf_counter() - start
+
+		output = p.stdout.decode("utf-8", "replace")
+		if p.returncode != 0 or "<<< FAILED >>>" in output:
+			raise Exception(f"wpm {' '.join(args)} failed:\n{output}")
+		return duration
+
+	def flip_modes(self, names, per_repo):
+		#mode-only changes for `refresh` to revert
+		for n in names:
+			src = os.path.join(self.workspace, n, "src")
+			flipped = 0
+			for root, dirs, files in os.walk(src):
+				for f in files:
+					if flipped >= per_repo:
+						break
+					os.chmod(os.path.join(root, f), 0o755)
+					flipped += 1
+
+	def run_command(self, command, names, args):
+		if command == "load-cold":
+			return self.wpm(["-q", "--no-cache", "list", "-a"])
+		if command == "load-warm":
+			return self.wpm(["-q", "list", "-a"])
+		if command == "list":
+			return self.wpm(["-q", "list", "-a", "-d", "-r"])
+		if command == "install":
+			return self.wpm(["-q", "install", "-f", "-j", str(self.jobs)] + names)
+		if command == "status-fast":
+			return self.wpm(["-q", "status", "-f", "-j", str(self.jobs)])
+		if command == "status":
+			return self.wpm(["-q", "status", "-j", str(self.jobs)])
+		if command == "update":
+			#one process per package, like users do; only a sample to keep big scales reasonable
+			return sum([self.wpm(["-q", "update", n]) for n in names[:args.update_sample]])
+		if command == "refresh":
+			self.flip_modes(names, args.flip)
+			return self.wpm(["-q", "refresh"])
+		raise Exception(f"Unknown command {command}")
+
+def _median(values):
+	s = sorted(values)
+	m = len(s) // 2
+	if len(s) % 2 == 1:
+		return s[m]
+	return (s[m - 1] + s[m]) / 2.0
+
+def run_scale(scale, args, commands):
+	root = tempfile.mkdtemp(prefix = f"wpm-bench-{scale}-", dir = args.workdir)
+	try:
+		start = time.perf_counter()
+		remotes = create_remotes(root, scale, args.commits, args.files)
+		bucket = create_buckets(root, remotes, scale, args.per_file)
+		print(f"-- scale {scale}: generated in {time.perf_counter() - start:.2f} sec ({root})")
+
+		bench = Bench(root, bucket, args.jobs)
+		names = package_names(scale)
+
+		#everything but `install` needs an installed workspace
+		if not "install" in commands:
+			bench.run_command("install", names, args)
+
+		result = {}
+		for c in commands:
+			runs = [bench.run_command(c, names, args) for _ in range(args.runs)]
+			result[c] = {"runs" : runs, "min" : min(runs), "median" : _median(runs)}
+			print(f"   {c.rjust(12)} | median {result[c]['median']:8.3f} sec | min {result[c]['min']:8.3f} sec")
+
+		return result
+	finally:
+		if args.keep:
+			print(f"   kept {root}")
+		else:
+			shutil.rmtree(root, ignore_errors = True)
+
+#####################################################################################################
+# baseline
+
+def compare(results, baseline, threshold):
+	#returns the list of (scale, command, baseline, current, ratio) slower than `threshold`
+	regressions = []
+	print("-- compared to baseline (median):")
+	for scale, commands in results["results"].items():
+		base = baseline.get("results", {}).get(scale, None)
+		if base == None:
+			continue
+		for c, r in commands.items():
+			if not c in base:
+				continue
+			before = base[c]["median"]
+			now = r["median"]
+			ratio = now / before if before > 0 else 1.0
+			marker = ""
+			if ratio > 1.0 + threshold:
+				marker = " << REGRESSION"
+				regressions.append((scale, c, before, now, ratio))
+			print(f"   {scale.rjust(6)} {c.rjust(12)} | {before:8.3f} -> {now:8.3f} sec ({ratio:5.2f}x){marker}")
+
+	return regressions
+
+def _git_version():
+	try:
+		return _git(["--version"], None).decode("utf-8").strip()
+	except Exception:
+		return None
+
+def main():
+	parser = argparse.ArgumentParser(description = "Offline wpm benchmark on synthetic buckets and local bare remotes.")
+	parser.add_argument("--scales", default = "10,50,200", help = "Comma separated package counts (default 10,50,200).")
+	parser.add_argument("--commits", type = int, default = 20, help = "Commits in every remote (default 20).")
+	parser.add_argument("--files", type = int, default = 100, help = "Files in every remote (default 100).")
+	parser.add_argument("--per-file", dest = "per_file", type = int, default = 25, help = "Packages per json definition file (default 25).")
+	parser.add_argument("--runs", type = int, default = 3, help = "Runs per command (default 3).")
+	parser.add_argument("-j", "--jobs", type = int, default = 8, help = "--jobs passed to install and status (default 8).")
+	parser.add_argument("--update-sample", dest = "update_sample", type = int, default = 10, help = "Packages updated per `update` run (default 10).")
+	parser.add_argument("--flip", type = int, default = 10, help = "Files per repo made executable before `refresh` (default 10).")
+	parser.add_argument("--commands", default = ",".join(COMMANDS), help = "Comma separated subset of: " + ", ".join(COMMANDS))
+	parser.add_argument("--workdir", default = None, help = "Where the synthetic workspaces are created (default: system temp).")
+	parser.add_argument("--keep", action = "store_true", help = "Keep the generated workspaces.")
+	parser.add_argument("--out", default = None, help = "Write the results to this json file.")
+	parser.add_argument("--baseline", default = None, help = "Compare with this results file.")
+	parser.add_argument("--save-baseline", dest = "save_baseline", action = "store_true", help = f"Store the results as the baseline ({DEFAULT_BASELINE}).")
+	parser.add_argument("--threshold", type = float, default = 0.25, help = "Slowdown ratio reported as a regression (default 0.25 = 25%%).")
+	args = parser.parse_args()
+
+	scales = [int(s) for s in args.scales.split(",") if s.strip() != ""]
+	commands = [c.strip() for c in args.commands.split(",") if c.strip() != ""]
+	for c in commands:
+		if not c in COMMANDS:
+			raise Exception(f"Unknown command {c}, expected one of {', '.join(COMMANDS)}")
+
+	results = {
+		"meta" : {
+			"time" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+			"python" : platform.python_version(),
+			"platform" : platform.platform(),
+			"git" : _git_version(),
+			"commits" : args.commits,
+			"files" : args.files,
+			"runs" : args.runs,
+			"jobs" : args.jobs,
+		},
+		"results" : {}
+	}
+
+	for scale in scales:
+		results["results"][str(scale)] = run_scale(scale, args, commands)
+
+	if args.out != None:
+		with open(args.out, "w") as f:
+			json.dump(results, f, indent = 2)
+		print(f"-- results: {args.out}")
+
+	if args.save_baseline:
+		with open(DEFAULT_BASELINE, "w") as f:
+			json.dump(results, f, indent = 2)
+		print(f"-- baseline saved: {DEFAULT_BASELINE}")
+
+	baseline_path = args.baseline
+	if baseline_path == None and not args.save_baseline and os.path.exists(DEFAULT_BASELINE):
+		baseline_path = DEFAULT_BASELINE
+
+	if baseline_path != None:
+		with open(baseline_path, "r") as f:
+			baseline = json.load(f)
+		if compare(results, baseline, args.threshold):
+			sys.exit(1)
+
+if __name__ == "__main__":
+	main()
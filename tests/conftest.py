@@ -0,0 +1,59 @@
+import os
+import subprocess
+
+import pytest
+
+#####################################################################################################
+# unit tests (python -m pytest tests), main_tests.py and main_tests_entrypoint.sh are the end to end runs
+# every test gets its own global git config and identity, nothing is read from the user running them
+
+@pytest.fixture(autouse = True)
+def git_env(tmp_path, monkeypatch):
+	config = tmp_path / "gitconfig"
+	config.write_text("[init]\n\tdefaultBranch = main\n[protocol \"file\"]\n\tallow = always\n")
+	monkeypatch.setenv("GIT_CONFIG_GLOBAL", str(config))
+	monkeypatch.setenv("GIT_CONFIG_NOSYSTEM", "1")
+	for k in ["GIT_AUTHOR", "GIT_COMMITTER"]:
+		monkeypatch.setenv(f"{k}_NAME", "wpm tests")
+		monkeypatch.setenv(f"{k}_EMAIL", "tests@wpm")
+	monkeypatch.delenv("GIT_DIR", raising = False)
+	monkeypatch.delenv("GIT_WORK_TREE", raising = False)
+	monkeypatch.setenv("WPM_CLONE_RETRIES", "0")
+	return config
+
+def git(cwd, *args):
+	p = subprocess.run(["git"] + list(args), cwd = str(cwd), stdout = subprocess.PIPE, stderr = subprocess.PIPE, text = True)
+	if p.returncode != 0:
+		raise Exception(f"git {' '.join(args)} failed: {p.stderr}")
+	return p.stdout.strip()
+
+def commit(repo, name, content, message = None):
+	path = os.path.join(str(repo), name)
+	os.makedirs(os.path.dirname(path), exist_ok = True)
+	with open(path, "w") as f:
+		f.write(content)
+	git(repo, "add", name)
+	git(repo, "commit", "-q", "-m", message or f"edit {name}")
+	return git(repo, "rev-parse", "HEAD")
+
+@pytest.fixture
+def make_repo(tmp_path):
+	#make_repo(name) -> path of a new repository with one commit on `main`
+	def make(name = "repo", files = None):
+		path = tmp_path / name
+		path.mkdir(parents = True)
+		git(path, "init", "-q", "-b", "main")
+		for f, content in (files or {"README" : "readme\n"}).items():
+			commit(path, f, content)
+		return path
+	return make
+
+@pytest.fixture
+def remote_and_clone(tmp_path, make_repo):
+	#(bare remote, clone of it) with `main` pushed
+	work = make_repo("work")
+	remote = tmp_path / "remote.git"
+	git(tmp_path, "clone", "-q", "--bare", str(work), str(remote))
+	clone = tmp_path / "clone"
+	git(tmp_path, "clone", "-q", str(remote), str(clone))
+	return remote, clone
@@ -15,3 +15,19 @@ from workspace_package_manager import wpm_internal_utils
 from workspace_package_manager import wpm_package_database
 from workspace_package_manager import wpm_package_controller
 
+from workspace_package_manager import wpm_status_scanner
+from workspace_package_manager import wpm_package_index
+from workspace_package_manager import wpm_startup_profile
+from workspace_package_manager import wpm_remote_revisions
+from workspace_package_manager import wpm_download_utils
+from workspace_package_manager import wpm_git_mirrors
+from workspace_package_manager import wpm_git_config
+from workspace_package_manager import wpm_records
+from workspace_package_manager import wpm_trace
+from workspace_package_manager import wpm_secrets
+from workspace_package_manager import wpm_daemon
+from workspace_package_manager import wpm_status_cache
+from workspace_package_manager import wpm_git_clone
+from workspace_package_manager import wpm_lockfile
+from workspace_package_manager import wpm_git_refs
+from workspace_package_manager import wpm_dependency_graph
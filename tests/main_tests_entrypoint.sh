@@ -25,17 +25,22 @@ echo "---------------------------------------------- (LIST2):"
 export WPM_SEARCH_LOCATIONS=/repo/tests/bucket1:/repo/tests/bucket2
 export WPM_WORKSPACE_PATH=/repo/build/_tests_workspace
 wpm -q list -a
+wpm -q --startup-profile list -a
 
 echo "---------------------------------------------- (INSTALL):"
 wpm -q install pack-pyr
 wpm -q list -a -d -r
+wpm list -a -d -r --format ndjson
+wpm -q --trace /repo/build/_tests_workspace/.wpm/trace.json list -a -r
 wpm -q install pack-pywr pack-json1 pack-json2
 wpm -q list
+wpm -q install -f --depth 1 --single-branch pack-json2
 echo "---------------------------------------------- (REFRESH):"
 wpm refresh
 
 wpm -q revision pack-pyr
 wpm -q revision -r pack-pyr
+wpm -q revision -r -a
 
 
 wpm update pack-pyr
\ No newline at end of file
@@ -0,0 +1,100 @@
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import subprocess
+
+import pytest
+
+from workspace_package_manager import wpm_daemon
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#####################################################################################################
+# what is forwarded, and what the client does with the replies (a scripted socket stands in for the daemon)
+
+def test_only_commands_answered_from_memory_are_served():
+	assert wpm_daemon.is_served("status", fast = True)
+	assert not wpm_daemon.is_served("status")
+	assert wpm_daemon.is_served("list")
+	assert wpm_daemon.is_served("revision")
+	assert not wpm_daemon.is_served("revision", remote = True)
+	assert not wpm_daemon.is_served("install")
+
+@pytest.fixture
+def workspace(tmp_path):
+	path = tmp_path / "ws"
+	(path / ".wpm").mkdir(parents = True)
+	return path
+
+def _serve(workspace, replies):
+	#answers one request with `replies` (None: say nothing until the client leaves), then closes
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	sock.bind(wpm_daemon.get_socket_path(str(workspace)))
+	sock.listen(1)
+
+	def run():
+		conn, _ = sock.accept()
+		with conn, conn.makefile("rwb") as f:
+			f.readline()
+			if replies == None:
+				f.read()
+				return
+			for r in replies:
+				f.write((json.dumps(r) + "\n").encode("utf-8"))
+				f.flush()
+		sock.close()
+
+	thread = threading.Thread(target = run, daemon = True)
+	thread.start()
+	return thread
+
+class _Stream():
+	def __init__(self):
+		self.text = ""
+
+	def write(self, text):
+		self.text += text
+
+	def flush(self):
+		pass
+
+def _forward(workspace):
+	out = _Stream()
+	err = _Stream()
+	return wpm_daemon.forward(str(workspace), ["list"], out, err), out.text, err.text
+
+def test_forward_returns_the_exit_code(workspace):
+	_serve(workspace, [{"out" : "a\n"}, {"err" : "b\n"}, {"done" : 3}])
+	assert _forward(workspace) == (3, "a\n", "b\n")
+
+def test_connection_lost_after_output_fails(workspace):
+	_serve(workspace, [{"out" : "partial\n"}])
+	code, out, err = _forward(workspace)
+	assert code == 1 and out == "partial\n"
+	assert "connection lost" in err
+
+def test_busy_daemon_falls_back(workspace, monkeypatch):
+	monkeypatch.setattr(wpm_daemon, "REPLY_TIMEOUT", 0.5)
+	_serve(workspace, None)
+	start = time.time()
+	assert _forward(workspace) == (None, "", "")
+	assert time.time() - start < 5
+
+@pytest.mark.parametrize("replies, code", [
+	([{"done" : 3}], 3),
+	([{"out" : "partial\n"}], 1),
+])
+def test_cli_exits_with_the_forwarded_code(tmp_path, workspace, replies, code):
+	thread = _serve(workspace, replies)
+	env = dict(os.environ)
+	env["PYTHONPATH"] = ROOT
+	env["WPM_SEARCH_LOCATIONS"] = str(tmp_path)
+	env["WPM_WORKSPACE_PATH"] = str(workspace)
+	env.pop("WPM_NO_DAEMON", None)
+	p = subprocess.run([sys.executable, "-c", "from wpmcli.cli import main; main()", "list"], cwd = str(workspace),
+		stdout = subprocess.PIPE, stderr = subprocess.PIPE, text = True, env = env)
+	thread.join(5)
+	assert p.returncode == code
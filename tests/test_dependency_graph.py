@@ -0,0 +1,83 @@
+import sys
+
+from workspace_package_manager import wpm_dependency_graph
+
+#####################################################################################################
+# resolve() over installed packages whose actions.py declares `dependencies`
+
+class _Actions():
+	def __init__(self, dependencies):
+		self.dependencies = dependencies
+
+	def evaluate_dependencies(self):
+		return self.dependencies
+
+class _Package():
+	def __init__(self, name, dependencies):
+		self.name = name
+		self.dependencies = dependencies
+
+	def get_install_path(self, workspace):
+		#every package is installed: the workspace folder itself
+		return workspace
+
+	def get_actions(self, workspace):
+		return _Actions(self.dependencies)
+
+class _Packs():
+	def __init__(self, graph):
+		self.packages = {n : _Package(n, deps) for n, deps in graph.items()}
+
+	def find(self, name):
+		return self.packages.get(name, None)
+
+def _resolve(tmp_path, graph, names):
+	return wpm_dependency_graph.resolve(str(tmp_path), _Packs(graph), names)
+
+def _states(graph):
+	return {n : node.state for n, node in graph.nodes.items()}
+
+def test_self_loop(tmp_path):
+	graph = _resolve(tmp_path, {"a" : ["a"], "b" : ["a"]}, ["b"])
+	assert graph.cycles == [["a"]]
+	assert _states(graph) == {"a" : "cycle", "b" : "blocked"}
+	assert graph.levels == []
+
+def test_three_cycle(tmp_path):
+	graph = _resolve(tmp_path, {"a" : ["b"], "b" : ["c"], "c" : ["a"], "d" : [], "app" : ["a", "d"]}, ["app"])
+	assert graph.cycles == [["a", "b", "c"]]
+	assert graph.get("a").error == "dependency cycle: a -> b -> c -> a"
+	assert _states(graph) == {"app" : "blocked", "a" : "cycle", "b" : "cycle", "c" : "cycle", "d" : "ok"}
+	#what doesn't depend on the cycle still gets a level
+	assert graph.levels == [["d"]]
+
+def test_diamond(tmp_path):
+	graph = _resolve(tmp_path, {"top" : ["left", "right"], "left" : ["base"], "right" : ["base"], "base" : []}, ["top"])
+	assert graph.cycles == []
+	assert graph.levels == [["base"], ["left", "right"], ["top"]]
+	assert sorted(graph.get("base").dependents) == ["left", "right"]
+	assert [n.name for n in graph.ordered()] == ["base", "left", "right", "top"]
+
+def test_dependent_of_a_missing_package(tmp_path):
+	graph = _resolve(tmp_path, {"app" : ["lib"], "lib" : ["gone"], "other" : []}, ["app", "other"])
+	assert _states(graph) == {"app" : "blocked", "lib" : "blocked", "gone" : "missing", "other" : "ok"}
+	assert graph.get("lib").error == "dependency gone missing"
+	assert graph.get("app").error == "dependency lib blocked"
+	assert graph.levels == [["other"]]
+	assert sorted(n.name for n in graph.failed()) == ["app", "gone", "lib"]
+
+def test_deep_chain(tmp_path):
+	#deeper than the recursion limit, nothing is recursive
+	depth = sys.getrecursionlimit() * 5
+	chain = {f"p{i}" : [f"p{i + 1}"] for i in range(depth)}
+	chain[f"p{depth}"] = []
+	graph = _resolve(tmp_path, chain, ["p0"])
+	assert graph.cycles == []
+	assert len(graph.levels) == depth + 1
+	assert graph.get("p0").level == depth
+
+def test_deep_cycle(tmp_path):
+	depth = sys.getrecursionlimit() * 5
+	chain = {f"p{i}" : [f"p{(i + 1) % depth}"] for i in range(depth)}
+	graph = _resolve(tmp_path, chain, ["p0"])
+	assert len(graph.cycles) == 1 and len(graph.cycles[0]) == depth
@@ -0,0 +1,73 @@
+import pytest
+
+from conftest import git, commit
+
+from workspace_package_manager import wpm_git_clone
+
+#####################################################################################################
+# clone()
+
+@pytest.fixture
+def remote(tmp_path, make_repo):
+	#bare remote with `main` (2 commits), `dev` and `release`
+	work = make_repo("work")
+	commit(work, "a.txt", "a\n")
+	for branch in ["dev", "release"]:
+		git(work, "checkout", "-q", "-b", branch, "main")
+		commit(work, f"{branch}.txt", f"{branch}\n")
+	git(work, "checkout", "-q", "main")
+	git(work, "tag", "v1")
+
+	path = tmp_path / "remote.git"
+	git(tmp_path, "clone", "-q", "--bare", str(work), str(path))
+	return path
+
+def _remote_branches(path):
+	return git(path, "for-each-ref", "--format=%(refname)", "refs/remotes/origin").split()
+
+def test_full_clone_fetches_every_branch(tmp_path, remote):
+	path = tmp_path / "clone"
+	transfer = wpm_git_clone.clone(f"file://{remote}", str(path), "main")
+	assert transfer.fetches == 2
+	assert "refs/remotes/origin/dev" in _remote_branches(path)
+	assert git(path, "tag") == "v1"
+	assert not wpm_git_clone.is_partial_clone(str(path))
+
+def test_depth_clones_a_single_branch(tmp_path, remote):
+	path = tmp_path / "clone"
+	transfer = wpm_git_clone.clone(f"file://{remote}", str(path), "main", depth = 1)
+	assert transfer.fetches == 1
+	assert _remote_branches(path) == ["refs/remotes/origin/HEAD", "refs/remotes/origin/main"]
+	assert git(path, "config", "--get-all", "remote.origin.fetch") == "+refs/heads/main:refs/remotes/origin/main"
+	assert git(path, "rev-list", "--count", "HEAD") == "1"
+	assert git(path, "rev-parse", "--abbrev-ref", "HEAD") == "main"
+
+def test_depth_with_a_missing_branch_fails(tmp_path, remote):
+	with pytest.raises(Exception, match = "couldn't find remote ref"):
+		wpm_git_clone.clone(f"file://{remote}", str(tmp_path / "clone"), "gone", depth = 1)
+
+#####################################################################################################
+# fetch output
+
+def test_parse_progress_receiving():
+	text = ("remote: Enumerating objects: 12, done.\r\n"
+		"Receiving objects:  50% (6/12)\rReceiving objects: 100% (12/12), 1.50 MiB | 2.00 MiB/s, done.\n"
+		"remote: Total 12 (delta 0), reused 0 (delta 0), pack-reused 0\n")
+	assert wpm_git_clone.parse_progress(text) == (12, int(1.5 * 1024 * 1024))
+
+def test_parse_progress_without_receiving_line():
+	#small fetches only print the total, no size
+	assert wpm_git_clone.parse_progress("remote: Total 3 (delta 0), reused 0\n") == (3, None)
+	assert wpm_git_clone.parse_progress("") == (0, None)
+
+@pytest.mark.parametrize("text, transient", [
+	("fatal: unable to access 'https://x/': Could not resolve host: x", True),
+	("error: RPC failed; curl 56 GnuTLS recv error (-9)\nfatal: early EOF", True),
+	("fatal: the remote end hung up unexpectedly", True),
+	("error: The requested URL returned error: 503", True),
+	("fatal: repository 'https://x/' not found", False),
+	("fatal: Authentication failed for 'https://x/'", False),
+	("fatal: couldn't find remote ref refs/heads/gone", False),
+])
+def test_is_transient_error(text, transient):
+	assert wpm_git_clone.is_transient_error(text) == transient
@@ -0,0 +1,128 @@
+import os
+
+from conftest import git
+
+from workspace_package_manager import wpm_git_config
+
+#####################################################################################################
+# parse -> write round trips, checked against what git itself reads
+
+_tricky = (
+	"# comment kept as is\r\n"
+	"[core]\r\n"
+	"\tautocrlf = false ; trailing comment\r\n"
+	"[safe] directory = /inline/header\r\n"
+	"\tdirectory = \"/quoted # not a comment\"\r\n"
+	"\tdirectory = /escaped\\\\back\\\"quote\r\n"
+	"\tdirectory = /continued\\\r\n"
+	"/line\r\n"
+	"[Section \"Sub Name\"]\r\n"
+	"\tKey = \"tab\\there\"\r\n"
+	"\tflag\r\n"
+)
+
+def _git_values(path, key):
+	return git(os.path.dirname(str(path)), "config", "--file", str(path), "--get-all", key).split("\n")
+
+def test_parser_reads_what_git_reads(tmp_path):
+	path = tmp_path / "config"
+	path.write_bytes(_tricky.encode("utf-8"))
+	config = wpm_git_config.ConfigFile(str(path))
+
+	assert config.get_all("safe", "directory") == _git_values(path, "safe.directory")
+	assert config.get("section", "key", "Sub Name") == "tab\there" == _git_values(path, "section.Sub Name.key")[0]
+	assert config.get("section", "flag", "Sub Name") == "true"
+	assert config.get("core", "autocrlf") == "false"
+
+def test_added_values_round_trip(tmp_path):
+	path = tmp_path / "config"
+	path.write_bytes(_tricky.encode("utf-8"))
+	values = ["/with space", "/hash#and;semicolon", "/back\\slash", "/quote\"d", " leading"]
+
+	config = wpm_git_config.ConfigFile(str(path))
+	before = config.get_all("safe", "directory")
+	config.add_values("safe", "directory", values)
+	config.save()
+
+	assert wpm_git_config.ConfigFile(str(path)).get_all("safe", "directory") == before + values
+	assert _git_values(path, "safe.directory") == before + values
+
+	#untouched lines stay byte for byte, line endings stay CRLF
+	data = path.read_bytes().decode("utf-8")
+	assert data.startswith("# comment kept as is\r\n[core]\r\n\tautocrlf = false ; trailing comment\r\n")
+	assert data.count("\n") == data.count("\r\n")
+
+def test_set_value_round_trip(tmp_path):
+	path = tmp_path / "config"
+	path.write_text("[user]\n\tname = old\n\tname = older\n")
+	config = wpm_git_config.ConfigFile(str(path))
+	config.set_value("user", "name", "New \"Name\"")
+	config.save()
+	assert _git_values(path, "user.name") == ["New \"Name\""]
+
+def test_symlinked_config_stays_a_symlink(tmp_path):
+	dotfiles = tmp_path / "dotfiles"
+	dotfiles.mkdir()
+	target = dotfiles / "gitconfig"
+	target.write_text("[user]\n\tname = me\n")
+	link = tmp_path / ".gitconfig"
+	os.symlink(str(target), str(link))
+
+	reconciler = wpm_git_config.GitConfigReconciler(str(link))
+	assert reconciler.ensure_safe_directories(["/repo"]) == 1
+
+	assert os.path.islink(str(link))
+	assert "/repo" in target.read_text()
+	assert not os.path.exists(str(target) + ".lock")
+
+#####################################################################################################
+# global view: xdg file, includes, resets
+
+def test_includes_are_followed(tmp_path):
+	included = tmp_path / "included.gitconfig"
+	included.write_text("[safe]\n\tdirectory = /from/include\n")
+	main = tmp_path / "gitconfig"
+	main.write_text("[include]\n\tpath = included.gitconfig\n")
+
+	reconciler = wpm_git_config.GitConfigReconciler(str(main))
+	assert reconciler.get_safe_directories() == ["/from/include"]
+	assert reconciler.ensure_safe_directories(["/from/include", "/new"]) == 1
+	assert _git_values(main, "safe.directory") == ["/new"]
+
+def test_xdg_and_home_files_are_both_read(tmp_path, monkeypatch):
+	home = tmp_path / "home"
+	(home / ".config" / "git").mkdir(parents = True)
+	(home / ".config" / "git" / "config").write_text("[safe]\n\tdirectory = /from/xdg\n")
+	(home / ".gitconfig").write_text("[safe]\n\tdirectory = /from/home\n")
+	monkeypatch.delenv("GIT_CONFIG_GLOBAL")
+	monkeypatch.delenv("XDG_CONFIG_HOME", raising = False)
+	monkeypatch.setenv("HOME", str(home))
+
+	reconciler = wpm_git_config.GitConfigReconciler()
+	assert reconciler.global_path == str(home / ".gitconfig")
+	assert reconciler.get_safe_directories() == ["/from/xdg", "/from/home"]
+	assert reconciler.ensure_safe_directories(["/from/xdg", "/from/home"]) == 0
+
+def test_empty_value_resets_the_list(tmp_path):
+	path = tmp_path / "gitconfig"
+	path.write_text("[safe]\n\tdirectory = /a\n\tdirectory = *\n\tdirectory =\n\tdirectory = /b\n")
+
+	reconciler = wpm_git_config.GitConfigReconciler(str(path))
+	assert reconciler.get_safe_directories() == ["/b"]
+	#`*` was reset, /a is not in effect anymore
+	assert reconciler.ensure_safe_directories(["/a", "/b"]) == 1
+	assert reconciler.get_safe_directories() == ["/b", "/a"]
+
+def test_dedupe_keeps_what_git_ends_up_with(tmp_path):
+	path = tmp_path / "gitconfig"
+	path.write_text("[safe]\n\tdirectory = /a\n\tdirectory = /a\n\tdirectory = /b\n\tdirectory =\n\tdirectory = /a\n\tdirectory = /b\n\tdirectory = /b\n")
+
+	reconciler = wpm_git_config.GitConfigReconciler(str(path))
+	assert reconciler.get_safe_directories() == ["/a", "/b", "/b"]
+	assert reconciler.dedupe_safe_directories(True) == (5, 2)
+	assert _git_values(path, "safe.directory") == ["/a", "/a", "/b", "", "/a", "/b", "/b"]
+	assert reconciler.dedupe_safe_directories() == (5, 2)
+
+	#the repeated /a before the reset is gone, the /a after it stays
+	assert reconciler.get_safe_directories() == ["/a", "/b"]
+	assert _git_values(path, "safe.directory") == ["/a", "/b", "", "/a", "/b"]
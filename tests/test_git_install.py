@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from conftest import git, commit
+
+from workspace_package_manager import wpm_package_handlers
+from workspace_package_manager import wpm_package_models
+
+#####################################################################################################
+# install_git_entry / CloneStrategy
+
+@pytest.fixture
+def remote(tmp_path, make_repo):
+	#bare remote with `main` (3 commits) and `other`, serving filters
+	work = make_repo("work")
+	commit(work, "a.txt", "a\n")
+	commit(work, "b.txt", "b\n")
+	git(work, "checkout", "-q", "-b", "other")
+	commit(work, "o.txt", "o\n")
+	git(work, "checkout", "-q", "main")
+
+	path = tmp_path / "remote.git"
+	git(tmp_path, "clone", "-q", "--bare", str(work), str(path))
+	git(path, "config", "uploadpack.allowFilter", "true")
+	git(path, "config", "uploadpack.allowAnySHA1InWant", "true")
+	return path
+
+def _entry(tmp_path, params):
+	bucket = wpm_package_handlers.BucketDefinition(None, None, str(tmp_path / "defs.json"))
+	entry = wpm_package_handlers.GitEntry("pkg", bucket)
+	assert entry.init_from_dict(params)
+	return entry
+
+def _remote_branches(path):
+	return git(path, "for-each-ref", "--format=%(refname)", "refs/remotes").split()
+
+def test_pinned_revision_with_filter_fetches_only_that_revision(tmp_path, remote):
+	pinned = git(remote, "rev-parse", "main~1")
+	entry = _entry(tmp_path, {"url" : f"file://{remote}", "active-branch" : "main", "locked" : pinned, "filter" : "blobless"})
+	workspace = tmp_path / "ws"
+	workspace.mkdir()
+
+	assert entry.install(str(workspace)) == True
+	path = workspace / "pkg"
+	assert git(path, "rev-parse", "HEAD") == pinned
+	assert _remote_branches(path) == []
+	#blobless keeps the history of the revision
+	assert git(path, "rev-list", "--count", "HEAD") == "2"
+	assert git(path, "config", "remote.origin.promisor") == "true"
+	assert not os.path.exists(os.path.join(str(path), ".git", "shallow"))
+
+def test_pinned_revision_without_strategy_clones_everything(tmp_path, remote):
+	pinned = git(remote, "rev-parse", "main~1")
+	entry = _entry(tmp_path, {"url" : f"file://{remote}", "active-branch" : "main", "locked" : pinned})
+	workspace = tmp_path / "ws"
+	workspace.mkdir()
+
+	assert entry.install(str(workspace)) == True
+	path = workspace / "pkg"
+	assert git(path, "rev-parse", "HEAD") == pinned
+	assert "refs/remotes/origin/other" in _remote_branches(path)
+
+@pytest.mark.parametrize("depth", [0, -1, True, "3", 1.5])
+def test_invalid_depth_is_refused(depth):
+	with pytest.raises(Exception, match = "Invalid clone depth"):
+		wpm_package_models.CloneStrategy(depth)
+
+def test_depth_from_definition_is_validated(tmp_path):
+	entry = _entry(tmp_path, {"url" : "https://example.com/x.git", "depth" : 0})
+	with pytest.raises(Exception, match = "Invalid clone depth"):
+		entry.model.get_clone_strategy()
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from conftest import git, commit
+
+from workspace_package_manager import wpm_git_refs
+
+#####################################################################################################
+# resolve_ref / read_head against what git says
+
+def _head(path):
+	gitdir, commondir = wpm_git_refs.get_git_dirs(str(path))
+	return wpm_git_refs.resolve_ref(gitdir, commondir, "HEAD")
+
+def test_loose_branch(make_repo):
+	repo = make_repo()
+	assert _head(repo) == ("refs/heads/main", git(repo, "rev-parse", "HEAD"))
+
+def test_packed_branch(make_repo):
+	repo = make_repo()
+	git(repo, "tag", "-a", "-m", "annotated", "v1")
+	git(repo, "pack-refs", "--all")
+	assert not os.path.exists(str(repo / ".git" / "refs" / "heads" / "main"))
+	#the peeled `^<sha>` line of the tag is not a ref
+	assert "^" in (repo / ".git" / "packed-refs").read_text()
+
+	assert _head(repo) == ("refs/heads/main", git(repo, "rev-parse", "HEAD"))
+	gitdir, commondir = wpm_git_refs.get_git_dirs(str(repo))
+	assert wpm_git_refs.resolve_ref(gitdir, commondir, "refs/tags/v1") == (None, git(repo, "rev-parse", "v1"))
+
+def test_loose_ref_wins_over_packed(make_repo):
+	repo = make_repo()
+	git(repo, "pack-refs", "--all")
+	sha = commit(repo, "b.txt", "b\n")
+	assert _head(repo) == ("refs/heads/main", sha)
+
+def test_detached(make_repo):
+	repo = make_repo()
+	first = git(repo, "rev-parse", "HEAD")
+	commit(repo, "b.txt", "b\n")
+	git(repo, "checkout", "-q", "--detach", first)
+	assert _head(repo) == (None, first)
+
+def test_unborn_branch(tmp_path):
+	repo = tmp_path / "empty"
+	git(tmp_path, "init", "-q", str(repo))
+	assert _head(repo) == ("refs/heads/main", None)
+	assert wpm_git_refs.read_revision(str(repo)) == None
+
+def test_linked_worktree(tmp_path, make_repo):
+	repo = make_repo()
+	commit(repo, "b.txt", "b\n")
+	worktree = tmp_path / "wt"
+	git(repo, "worktree", "add", "-q", "-b", "feature", str(worktree), "main~1")
+	git(repo, "pack-refs", "--all")
+
+	assert _head(worktree) == ("refs/heads/feature", git(worktree, "rev-parse", "HEAD"))
+	assert _head(repo) == ("refs/heads/main", git(repo, "rev-parse", "HEAD"))
+	#a commit in the worktree moves the shared branch ref
+	sha = commit(worktree, "c.txt", "c\n")
+	assert wpm_git_refs.read_revision(str(worktree)) == sha
+
+def test_unexpected_head_raises(make_repo):
+	repo = make_repo()
+	(repo / ".git" / "HEAD").write_text("garbage\n")
+	with pytest.raises(wpm_git_refs.RefError):
+		_head(repo)
@@ -0,0 +1,181 @@
+import os
+import subprocess
+
+import pytest
+
+from conftest import git, commit
+
+from workspace_package_manager import wpm_git_utils
+
+#####################################################################################################
+# read_git_porcelain_status
+
+def _status(path):
+	return wpm_git_utils.read_git_porcelain_status(str(path))
+
+def _record_commands(monkeypatch):
+	commands = []
+	popen = subprocess.Popen
+	def record(cmd, *args, **kwargs):
+		commands.append(cmd)
+		return popen(cmd, *args, **kwargs)
+	monkeypatch.setattr(wpm_git_utils.subprocess, "Popen", record)
+	return commands
+
+def test_porcelain_clean(make_repo):
+	repo = make_repo()
+	branch, sha, dirty, ahead, behind = _status(repo)
+	assert branch == "main"
+	assert sha == git(repo, "rev-parse", "HEAD")
+	assert dirty == False
+	#no upstream
+	assert ahead == None and behind == None
+
+def test_porcelain_tracked_change_skips_untracked_walk(make_repo, monkeypatch):
+	repo = make_repo()
+	(repo / "README").write_text("changed\n")
+	(repo / "untracked.txt").write_text("x\n")
+	commands = _record_commands(monkeypatch)
+
+	assert _status(repo)[2] == True
+	assert len(commands) == 1
+	assert "--untracked-files=no" in commands[0]
+
+def test_porcelain_untracked_only(make_repo, monkeypatch):
+	repo = make_repo()
+	(repo / "folder").mkdir()
+	(repo / "folder" / "new.txt").write_text("x\n")
+	commands = _record_commands(monkeypatch)
+
+	assert _status(repo)[2] == True
+	assert len(commands) == 2
+	assert "--untracked-files=normal" in commands[1]
+
+def test_porcelain_ignored_files_are_clean(make_repo):
+	repo = make_repo(files = {".gitignore" : "*.log\n"})
+	(repo / "build.log").write_text("x\n")
+	(repo / "empty").mkdir()
+	assert _status(repo)[2] == False
+
+def test_porcelain_detached(make_repo):
+	repo = make_repo()
+	sha = git(repo, "rev-parse", "HEAD")
+	git(repo, "checkout", "-q", "--detach")
+	branch, current, _, _, _ = _status(repo)
+	assert branch == "HEAD"
+	assert current == sha
+
+def test_porcelain_ahead_behind(remote_and_clone, tmp_path, monkeypatch):
+	remote, clone = remote_and_clone
+	other = tmp_path / "other"
+	git(tmp_path, "clone", "-q", str(remote), str(other))
+	commit(other, "a.txt", "a\n")
+	commit(other, "b.txt", "b\n")
+	git(other, "push", "-q", "origin", "main")
+
+	commit(clone, "c.txt", "c\n")
+	git(clone, "fetch", "-q")
+	_, _, dirty, ahead, behind = _status(clone)
+	assert dirty == False
+	assert (ahead, behind) == (1, 2)
+
+	#fast: git doesn't count them
+	commands = _record_commands(monkeypatch)
+	_, _, dirty, ahead, behind = wpm_git_utils.read_git_porcelain_status(str(clone), True)
+	assert dirty == False
+	assert (ahead, behind) == (None, None)
+	assert "--no-ahead-behind" in commands[0]
+
+#####################################################################################################
+# find_mode_only_changes / _run_git
+
+def _chmod_x(path):
+	os.chmod(str(path), os.stat(str(path)).st_mode | 0o111)
+
+def test_mode_only_change_is_found(make_repo):
+	repo = make_repo()
+	commit(repo, "tool.sh", "echo hi\n")
+	(repo / "data.bin").write_bytes(b"\0\1\2binary")
+	git(repo, "add", "data.bin")
+	git(repo, "commit", "-q", "-m", "binary")
+	_chmod_x(repo / "tool.sh")
+	_chmod_x(repo / "data.bin")
+
+	assert wpm_git_utils.find_mode_only_changes(str(repo)) == (2, ["data.bin", "tool.sh"])
+
+def test_mode_and_content_change_is_kept(make_repo):
+	repo = make_repo()
+	commit(repo, "tool.sh", "echo hi\n")
+	(repo / "tool.sh").write_text("echo changed\n")
+	_chmod_x(repo / "tool.sh")
+
+	assert wpm_git_utils.find_mode_only_changes(str(repo)) == (1, [])
+
+def test_renamed_file_is_not_a_mode_change(make_repo):
+	repo = make_repo()
+	commit(repo, "tool.sh", "echo hi\n")
+	os.rename(str(repo / "tool.sh"), str(repo / "renamed.sh"))
+	_chmod_x(repo / "renamed.sh")
+	assert wpm_git_utils.find_mode_only_changes(str(repo)) == (1, [])
+
+	#staged rename, then only the mode differs from the index
+	git(repo, "add", "-A")
+	assert wpm_git_utils.find_mode_only_changes(str(repo)) == (0, [])
+	os.chmod(str(repo / "renamed.sh"), 0o644)
+	assert wpm_git_utils.find_mode_only_changes(str(repo)) == (1, ["renamed.sh"])
+
+def test_git_error_names_the_command(tmp_path):
+	with pytest.raises(Exception, match = "git --version-x failed"):
+		wpm_git_utils._run_git(str(tmp_path), ["--version-x"])
+	with pytest.raises(Exception, match = "git checkout failed"):
+		wpm_git_utils._run_git(str(tmp_path), ["--literal-pathspecs", "checkout", "--", "x"])
+
+#####################################################################################################
+# checkout_revision
+
+@pytest.fixture
+def two_commits(remote_and_clone):
+	#clone with main at B (pushed), A its parent
+	_, clone = remote_and_clone
+	a = git(clone, "rev-parse", "HEAD")
+	b = commit(clone, "b.txt", "b\n")
+	git(clone, "push", "-q", "origin", "main")
+	git(clone, "fetch", "-q")
+	return clone, a, b
+
+def _branch(path):
+	return git(path, "rev-parse", "--abbrev-ref", "HEAD")
+
+def test_checkout_detached(two_commits):
+	clone, a, _ = two_commits
+	assert wpm_git_utils.checkout_revision(str(clone), a, None) == "detached"
+	assert _branch(clone) == "HEAD" and git(clone, "rev-parse", "HEAD") == a
+
+def test_checkout_branch_already_there(two_commits):
+	clone, _, b = two_commits
+	git(clone, "checkout", "-q", "--detach", b)
+	assert wpm_git_utils.checkout_revision(str(clone), b, "main") == "main"
+	assert _branch(clone) == "main"
+
+def test_checkout_new_branch(two_commits):
+	clone, a, _ = two_commits
+	assert wpm_git_utils.checkout_revision(str(clone), a, "feature") == "feature (new)"
+	assert _branch(clone) == "feature" and git(clone, "rev-parse", "feature") == a
+
+def test_checkout_fast_forward(two_commits):
+	clone, a, b = two_commits
+	git(clone, "reset", "-q", "--hard", a)
+	assert wpm_git_utils.checkout_revision(str(clone), b, "main") == "main (fast-forward)"
+	assert git(clone, "rev-parse", "main") == b
+
+def test_checkout_back_to_a_pushed_revision(two_commits):
+	clone, a, _ = two_commits
+	assert wpm_git_utils.checkout_revision(str(clone), a, "main") == "main (reset)"
+	assert _branch(clone) == "main" and git(clone, "rev-parse", "main") == a
+
+def test_checkout_keeps_local_commits(two_commits):
+	clone, a, _ = two_commits
+	local = commit(clone, "local.txt", "l\n")
+	assert wpm_git_utils.checkout_revision(str(clone), a, "main") == "detached, local main differs"
+	assert _branch(clone) == "HEAD" and git(clone, "rev-parse", "HEAD") == a
+	assert git(clone, "rev-parse", "main") == local
@@ -0,0 +1,128 @@
+import threading
+
+from workspace_package_manager import wpm_package_controller
+
+#####################################################################################################
+# InstallScheduler against a fake controller: nothing is installed, dependencies are known once fetched
+
+class _Actions():
+	def __init__(self, dependencies):
+		self.dependencies = dependencies
+
+	def evaluate_dependencies(self):
+		return self.dependencies
+
+class _Package():
+	def __init__(self, name):
+		self.name = name
+
+	def get_install_path(self, workspace):
+		return f"{workspace}/{self.name}"
+
+class _Packs():
+	def __init__(self, names):
+		self.packages = {n : _Package(n) for n in names}
+		self.find_threads = set()
+
+	def find(self, name):
+		self.find_threads.add(threading.current_thread())
+		return self.packages.get(name, None)
+
+class _Controller():
+	def __init__(self, tmp_path, dependencies, failing = ()):
+		self.workspace = str(tmp_path / "ws")
+		self.dependencies = dependencies
+		self.failing = failing
+		self.packs = _Packs([n for n in dependencies])
+		self.lock = threading.Lock()
+		self.fetched = []
+		self.finished = []
+		self.logs = []
+
+	def log(self, message):
+		self.logs.append(message)
+
+	def fetch_package(self, package, force, skip):
+		with self.lock:
+			self.fetched.append(package.name)
+		if package.name in self.failing:
+			raise Exception(f"{package.name} failed")
+		return package, _Actions(self.dependencies[package.name])
+
+	def finish_one(self, package, actions, start_time):
+		with self.lock:
+			self.finished.append(package.name)
+
+def _run(controller, names, jobs = 4):
+	scheduler = wpm_package_controller.InstallScheduler(controller, False, False, False, jobs)
+	return scheduler.run(names)
+
+def test_packages_are_looked_up_on_the_scheduler_thread(tmp_path):
+	deps = {"app" : ["a", "b"], "a" : ["c"], "b" : ["c"], "c" : []}
+	controller = _Controller(tmp_path, deps)
+	results = _run(controller, ["app"])
+
+	assert all(m.state == "done" for m in results.values())
+	assert controller.packs.find_threads == set([threading.current_thread()])
+
+def test_dependencies_finish_first_and_install_once(tmp_path):
+	deps = {"app" : ["left", "right"], "left" : ["base"], "right" : ["base"], "base" : [], "tool" : ["base"]}
+	controller = _Controller(tmp_path, deps)
+	results = _run(controller, ["app", "tool"])
+
+	assert all(m.state == "done" for m in results.values())
+	assert sorted(controller.fetched) == sorted(deps.keys())
+	assert sorted(controller.finished) == sorted(deps.keys())
+	order = controller.finished
+	for name, dependencies in deps.items():
+		for d in dependencies:
+			assert order.index(d) < order.index(name)
+	assert sorted(results["base"].dependents) == ["left", "right", "tool"]
+
+def test_failure_blocks_only_its_dependents(tmp_path):
+	deps = {"app" : ["lib", "util"], "lib" : ["base"], "base" : [], "util" : [], "other" : ["util"]}
+	controller = _Controller(tmp_path, deps, failing = ["base"])
+	results = _run(controller, ["app", "other"])
+
+	states = {n : m.state for n, m in results.items()}
+	assert states == {"app" : "blocked", "lib" : "blocked", "base" : "failed", "util" : "done", "other" : "done"}
+	assert results["base"].error == "base failed"
+	assert results["lib"].error == "dependency base failed"
+	assert results["app"].error == "dependency lib blocked"
+	assert not "app" in controller.finished and not "lib" in controller.finished
+
+def test_missing_dependency_fails_its_dependents(tmp_path):
+	deps = {"app" : ["gone"]}
+	controller = _Controller(tmp_path, deps)
+	results = _run(controller, ["app"])
+	assert results["gone"].state == "failed"
+	assert results["gone"].error == "Could not find package: gone"
+	assert results["app"].state == "blocked"
+
+class _SlowController(_Controller):
+	#fetches wait for each other, up to `jobs` of them at a time
+	def __init__(self, tmp_path, dependencies, jobs):
+		_Controller.__init__(self, tmp_path, dependencies)
+		self.barrier = threading.Barrier(jobs, timeout = 5)
+		self.running = 0
+		self.most = 0
+
+	def fetch_package(self, package, force, skip):
+		with self.lock:
+			self.running += 1
+			self.most = max(self.most, self.running)
+		try:
+			self.barrier.wait()
+		except threading.BrokenBarrierError:
+			pass
+		with self.lock:
+			self.running -= 1
+		return _Controller.fetch_package(self, package, force, skip)
+
+def test_independent_packages_install_in_parallel(tmp_path):
+	deps = {f"p{i}" : [] for i in range(6)}
+	controller = _SlowController(tmp_path, deps, 3)
+	results = _run(controller, sorted(deps.keys()), jobs = 3)
+	assert all(m.state == "done" for m in results.values())
+	#the barrier only opens with 3 fetches running at once, never more than the pool
+	assert controller.most == 3
@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from conftest import git, commit
+
+from workspace_package_manager import wpm_lockfile
+from workspace_package_manager import wpm_package_handlers
+
+#####################################################################################################
+# wpm lock / wpm sync
+
+@pytest.fixture
+def remote(tmp_path, make_repo):
+	#bare remote with `main` (3 commits) and `dev`
+	work = make_repo("work")
+	commit(work, "a.txt", "a\n")
+	commit(work, "b.txt", "b\n")
+	git(work, "checkout", "-q", "-b", "dev")
+	commit(work, "d.txt", "d\n")
+	git(work, "checkout", "-q", "main")
+
+	path = tmp_path / "remote.git"
+	git(tmp_path, "clone", "-q", "--bare", str(work), str(path))
+	return path
+
+@pytest.fixture
+def workspace(tmp_path):
+	path = tmp_path / "ws"
+	path.mkdir()
+	return path
+
+def _entry(tmp_path, remote):
+	bucket = wpm_package_handlers.BucketDefinition(None, None, str(tmp_path / "defs.json"))
+	entry = wpm_package_handlers.GitEntry("pkg", bucket)
+	assert entry.init_from_dict({"url" : f"file://{remote}", "active-branch" : "main"})
+	return entry
+
+def _clone(workspace, remote):
+	path = workspace / "pkg"
+	git(workspace, "clone", "-q", f"file://{remote}", str(path))
+	return path
+
+def test_lock_records_a_clean_pushed_revision(tmp_path, remote, workspace):
+	path = _clone(workspace, remote)
+	data, problems = wpm_lockfile.create_lock(str(workspace), [_entry(tmp_path, remote)])
+	assert problems == {}
+	assert data["packages"]["pkg"] == {"class" : "git", "revision" : git(path, "rev-parse", "HEAD"), "branch" : "main"}
+
+def test_lock_reports_local_changes(tmp_path, remote, workspace):
+	path = _clone(workspace, remote)
+	(path / "a.txt").write_text("changed\n")
+	_, problems = wpm_lockfile.create_lock(str(workspace), [_entry(tmp_path, remote)])
+	assert problems == {"pkg" : ["local changes"]}
+
+def test_lock_reports_unpushed_commits(tmp_path, remote, workspace):
+	path = _clone(workspace, remote)
+	sha = commit(path, "local.txt", "l\n")
+	_, problems = wpm_lockfile.create_lock(str(workspace), [_entry(tmp_path, remote)])
+	assert len(problems["pkg"]) == 1
+	assert problems["pkg"][0].startswith(f"{sha[:12]} is on no remote branch")
+
+def test_missing_package_is_cloned_at_the_locked_revision(tmp_path, remote, workspace):
+	sha = git(remote, "rev-parse", "main~1")
+	entry = _entry(tmp_path, remote)
+	results = wpm_lockfile.install_packages(str(workspace), [(entry, {"class" : "git", "revision" : sha, "branch" : "main"})])
+	assert [(r.state, r.info) for r in results] == [("installed", "main (new)")]
+
+	path = workspace / "pkg"
+	assert git(path, "rev-parse", "HEAD") == sha
+	assert git(path, "rev-parse", "--abbrev-ref", "main@{upstream}") == "origin/main"
+	assert git(path, "for-each-ref", "--format=%(refname)", "refs/remotes") == "refs/remotes/origin/main"
+	assert not os.path.exists(str(path / ".git" / "wpm-partial-clone.json"))
+
+	#reproducible: locking it again gives the same entry
+	data, problems = wpm_lockfile.create_lock(str(workspace), [entry])
+	assert problems == {}
+	assert data["packages"]["pkg"]["revision"] == sha
+	assert wpm_lockfile.sync_packages(str(workspace), [(entry, data["packages"]["pkg"])])[0].state == "unchanged"
+
+def test_lock_accepts_the_pinned_revision(tmp_path, remote, workspace):
+	sha = git(remote, "rev-parse", "main~1")
+	path = workspace / "pkg"
+	path.mkdir()
+	git(path, "init", "-q")
+	git(path, "fetch", "-q", f"file://{remote}", sha)
+	git(path, "checkout", "-q", "--detach", "FETCH_HEAD")
+
+	entry = _entry(tmp_path, remote)
+	_, problems = wpm_lockfile.create_lock(str(workspace), [entry])
+	assert list(problems.keys()) == ["pkg"]
+	entry.model.locked = sha
+	assert wpm_lockfile.create_lock(str(workspace), [entry])[1] == {}
@@ -0,0 +1,65 @@
+import os
+import zipfile
+
+import pytest
+
+from workspace_package_manager import wpm_package_handlers
+from workspace_package_manager import wpm_download_utils
+
+#####################################################################################################
+# BucketDefinition properties
+
+def test_get_property_reads_own_scope(tmp_path):
+	parent = wpm_package_handlers.BucketDefinition(None, None, str(tmp_path / "defs.json"))
+	parent.set_property("git-user", "parent")
+	child = wpm_package_handlers.BucketDefinition(parent, None, str(tmp_path / "child" / "defs.json"))
+	child.set_property("host", "example.com")
+
+	assert child.get_property("git-user") == None
+	assert child.get_property("host") == "example.com"
+	#inherited properties still count for requirements and templates
+	assert child.has_property("git-user")
+	assert child.format_string_for_bucket("{git-user}@{host}") == "parent@example.com"
+
+#####################################################################################################
+# ZipEntry
+
+def test_zip_url_is_used_as_written(tmp_path, monkeypatch):
+	urls = []
+	def download(url, abs_dest_path, headers = None, expected_sha256 = None, strip_root = False):
+		urls.append(url)
+		return wpm_download_utils.TransferResult(), wpm_download_utils.TransferResult()
+	monkeypatch.setattr(wpm_download_utils, "download_and_extract_zip", download)
+
+	bucket = wpm_package_handlers.BucketDefinition(None, None, str(tmp_path / "defs.json"))
+	bucket.set_property("host", "example.com")
+	entry = wpm_package_handlers.ZipEntry("z", bucket)
+	#braces are part of the url (query strings, templated cdn paths), not bucket properties
+	url = "https://{host}/archive.zip?filter={a,b}"
+	assert entry.init_from_string(url)
+
+	assert entry.install(str(tmp_path)) == True
+	assert urls == [url]
+
+def _zip_with_link(tmp_path, link):
+	archive = tmp_path / "links.zip"
+	with zipfile.ZipFile(str(archive), "w") as z:
+		z.writestr("root/data/file.txt", "content\n")
+		info = zipfile.ZipInfo("root/data/link")
+		info.external_attr = (0o120777 << 16)
+		z.writestr(info, link)
+	return archive
+
+def test_zip_symlinks_are_recreated(tmp_path):
+	dest = tmp_path / "out"
+	wpm_download_utils.extract_zip(str(_zip_with_link(tmp_path, "file.txt")), str(dest), strip_root = True)
+	assert os.path.islink(str(dest / "data" / "link"))
+	assert os.readlink(str(dest / "data" / "link")) == "file.txt"
+	assert (dest / "data" / "link").read_text() == "content\n"
+
+@pytest.mark.parametrize("link", ["../../outside.txt", "/etc/passwd"])
+def test_zip_symlinks_leaving_destination_are_refused(tmp_path, link):
+	dest = tmp_path / "out"
+	with pytest.raises(Exception, match = "Refusing to extract link"):
+		wpm_download_utils.extract_zip(str(_zip_with_link(tmp_path, link)), str(dest), strip_root = True)
+	assert not os.path.lexists(str(dest / "data" / "link"))
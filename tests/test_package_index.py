@@ -0,0 +1,173 @@
+import os
+import time
+
+from workspace_package_manager import wpm_package_database
+from workspace_package_manager import wpm_package_index
+from workspace_package_manager import wpm_secrets
+
+#####################################################################################################
+# PackageIndexCache: hits, misses and what invalidates it
+
+class _Vault():
+	def __init__(self, values):
+		self.values = values
+
+	def tryResolve(self, name):
+		return self.values.get(name, None)
+
+def _load(workspace, bucket, vault = None):
+	packs = wpm_package_database.PackageDatabase()
+	packs.factory = _Vault(vault or {})
+	#no prompt for what the vault doesn't have
+	packs.secrets = wpm_secrets.SecretResolver(str(workspace), packs.factory, None, False)
+	loader = wpm_package_database.PackageDatabaseConstructor(packs, None)
+	index = wpm_package_index.PackageIndexCache(str(workspace))
+	restored, reason = index.restore(loader, [str(bucket)])
+	if not restored:
+		loader.load_bucket_list(str(workspace), [str(bucket)], index)
+	return packs, restored, reason
+
+def _write(path, text):
+	path.write_text(text)
+	#mtime granularity: make sure a rewrite is seen as one
+	t = time.time() + 5
+	os.utime(str(path), (t, t))
+
+def _setup(tmp_path):
+	workspace = tmp_path / "ws"
+	workspace.mkdir()
+	bucket = tmp_path / "bucket"
+	bucket.mkdir()
+	_write(bucket / "defs.json", '{"alpha" : {"class" : "git", "url" : "https://example.com/a.git"}}')
+	return workspace, bucket
+
+def test_json_bucket_hit_after_first_load(tmp_path):
+	workspace, bucket = _setup(tmp_path)
+	packs, restored, reason = _load(workspace, bucket)
+	assert restored == False and reason == "no index"
+	assert packs.get_all_names() == ["alpha"]
+
+	packs, restored, _ = _load(workspace, bucket)
+	assert restored == True
+	assert packs.get_all_names() == ["alpha"]
+
+def test_edited_definition_misses(tmp_path):
+	workspace, bucket = _setup(tmp_path)
+	_load(workspace, bucket)
+	_write(bucket / "defs.json", '{"beta" : {"class" : "git", "url" : "https://example.com/b.git"}}')
+
+	packs, restored, reason = _load(workspace, bucket)
+	assert restored == False
+	assert "defs.json changed" in reason
+	assert packs.get_all_names() == ["beta"]
+
+def test_new_definition_file_misses(tmp_path):
+	workspace, bucket = _setup(tmp_path)
+	_load(workspace, bucket)
+	_write(bucket / "more.json", '{"beta" : {"class" : "git", "url" : "https://example.com/b.git"}}')
+	os.utime(str(bucket), (time.time() + 10, time.time() + 10))
+
+	packs, restored, _ = _load(workspace, bucket)
+	assert restored == False
+	assert sorted(packs.get_all_names()) == ["alpha", "beta"]
+
+_env_constructor = """
+import os
+def load(database):
+	if os.environ.get("WPM_TEST_FLAVOR", "") == "extra":
+		database.add_git("extra", "https://example.com/extra.git")
+	database.add_git("base", "https://example.com/base.git")
+"""
+
+def test_constructor_environment_is_part_of_the_key(tmp_path, monkeypatch):
+	workspace, bucket = _setup(tmp_path)
+	_write(bucket / "defs.py", _env_constructor)
+
+	monkeypatch.delenv("WPM_TEST_FLAVOR", raising = False)
+	_load(workspace, bucket)
+	packs, restored, _ = _load(workspace, bucket)
+	assert restored == True
+	assert not "extra" in packs.get_all_names()
+
+	monkeypatch.setenv("WPM_TEST_FLAVOR", "extra")
+	packs, restored, reason = _load(workspace, bucket)
+	assert restored == False
+	assert reason == "environment changed"
+	assert "extra" in packs.get_all_names()
+
+	packs, restored, _ = _load(workspace, bucket)
+	assert restored == True
+	assert "extra" in packs.get_all_names()
+
+_require_constructor = """
+def load(database):
+	if database.require("WPM_TEST_SECRET"):
+		database.add_git("secret", "https://example.com/secret.git")
+"""
+
+def test_constructor_calling_require_is_not_indexed(tmp_path):
+	workspace, bucket = _setup(tmp_path)
+	_write(bucket / "defs.py", _require_constructor)
+
+	packs, _, _ = _load(workspace, bucket, {"WPM_TEST_SECRET" : "x"})
+	assert "secret" in packs.get_all_names()
+	assert not os.path.exists(wpm_package_index.get_index_path(str(workspace)))
+
+	packs, restored, _ = _load(workspace, bucket, {})
+	assert restored == False
+	assert not "secret" in packs.get_all_names()
+
+_github_constructor = """
+import os
+def load(database):
+	env = os.environ.copy()
+	database.add_github_bucket(None, "other", env["WPM_TEST_BUCKET_URL"], "../installed")
+"""
+
+def test_constructor_copying_environment_and_cloning_bucket(tmp_path, monkeypatch, make_repo):
+	workspace, bucket = _setup(tmp_path)
+	other = make_repo("other", {"defs.json" : '{"gamma" : {"class" : "git", "url" : "https://example.com/c.git"}}'})
+	monkeypatch.setenv("WPM_TEST_BUCKET_URL", str(other))
+	_write(bucket / "defs.py", _github_constructor)
+
+	packs, restored, _ = _load(workspace, bucket)
+	assert restored == False
+	assert (tmp_path / "installed" / "other" / "defs.json").exists()
+	assert "gamma" in packs.get_all_names()
+
+	packs, restored, _ = _load(workspace, bucket)
+	assert restored == True
+	assert "gamma" in packs.get_all_names()
+
+#####################################################################################################
+# targeted loads (DefinitionChainIndex)
+
+def _load_targets(workspace, bucket, targets):
+	packs = wpm_package_database.PackageDatabase()
+	packs.secrets = wpm_secrets.SecretResolver(str(workspace), None, None, False)
+	loader = wpm_package_database.PackageDatabaseConstructor(packs, None)
+	chains = wpm_package_index.DefinitionChainIndex(str(workspace))
+	loader.load_bucket_list(str(workspace), [str(bucket)], None, targets, chains)
+	return packs
+
+def test_targeted_load_falls_back_to_a_full_load(tmp_path):
+	workspace, bucket = _setup(tmp_path)
+	_write(bucket / "more.json", '{"beta" : {"class" : "git", "url" : "https://example.com/b.git"}}')
+	#indexes the chains
+	_load_targets(workspace, bucket, None)
+
+	#not in the chain index yet
+	_write(bucket / "new.json", '{"gamma" : {"class" : "git", "url" : "https://example.com/g.git"}}')
+	packs = _load_targets(workspace, bucket, ["alpha"])
+	assert packs.get_all_names() == ["alpha"]
+	alpha = packs.find("alpha")
+	beta = packs.find("beta")
+	assert beta != None and packs.resolver != None
+
+	gamma = packs.find("gamma")
+	assert gamma != None
+	assert packs.resolver == None
+	assert sorted(packs.get_all_names()) == ["alpha", "beta", "gamma"]
+	#what was handed out before the full load is what find() keeps returning
+	assert packs.find("alpha") is alpha
+	assert packs.find("beta") is beta
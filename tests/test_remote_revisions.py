@@ -0,0 +1,50 @@
+import time
+
+from conftest import git, commit
+
+from workspace_package_manager import wpm_git_utils
+from workspace_package_manager import wpm_remote_revisions
+
+class _Package():
+	def __init__(self, name, url, branch = "main"):
+		self.name = name
+		self.url = url
+		self.branch = branch
+
+	def get_remote_ref(self):
+		return self.url, wpm_git_utils.get_remote_ref(self.branch)
+
+def test_resolves_and_caches(tmp_path, remote_and_clone):
+	remote, clone = remote_and_clone
+	cache = wpm_remote_revisions.RemoteRevisionCache(str(tmp_path), 60)
+	p = _Package("p", str(remote))
+
+	_, sha = wpm_remote_revisions.resolve_remote_revisions([p], 1, cache)[0]
+	assert sha == git(clone, "rev-parse", "HEAD")
+
+	#a push is not seen while the cached answer is fresh, it is without the cache
+	new_sha = commit(clone, "x.txt", "x\n")
+	git(clone, "push", "-q", "origin", "main")
+	assert wpm_remote_revisions.resolve_remote_revisions([p], 1, cache)[0][1] == sha
+	assert wpm_remote_revisions.resolve_remote_revisions([p], 1, None)[0][1] == new_sha
+
+def test_hung_remote_times_out(tmp_path, git_env):
+	with open(str(git_env), "a") as f:
+		f.write("[protocol \"ext\"]\n\tallow = always\n")
+	hung = _Package("hung", "ext::sh -c sleep% 30")
+
+	start = time.time()
+	_, sha = wpm_remote_revisions.resolve_remote_revisions([hung], 1, None, 1)[0]
+	assert sha == None
+	assert time.time() - start < 10
+
+def test_timeout_reaches_every_lookup(monkeypatch):
+	timeouts = []
+	def ls_remote(url, ref, timeout = None):
+		timeouts.append(timeout)
+		return "0" * 40
+	monkeypatch.setattr(wpm_git_utils, "ls_remote_ref", ls_remote)
+
+	packages = [_Package(f"p{i}", f"https://example.com/{i}.git") for i in range(4)]
+	wpm_remote_revisions.resolve_remote_revisions(packages, 2)
+	assert timeouts == [wpm_remote_revisions.DEFAULT_TIMEOUT] * 4
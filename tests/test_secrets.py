@@ -0,0 +1,101 @@
+import os
+import time
+
+import pytest
+
+from workspace_package_manager import wpm_secrets
+from workspace_package_manager import wpm_internal_utils
+
+#####################################################################################################
+# SessionCache: encrypted on disk, key in XDG_RUNTIME_DIR
+
+@pytest.fixture
+def runtime(tmp_path, monkeypatch):
+	path = tmp_path / "run"
+	path.mkdir(mode = 0o700)
+	monkeypatch.setenv("XDG_RUNTIME_DIR", str(path))
+	monkeypatch.delenv("WPM_SECRET_TTL", raising = False)
+	monkeypatch.delenv("WPM_CACHE_PROMPTED", raising = False)
+	return path
+
+@pytest.fixture
+def workspace(tmp_path):
+	path = tmp_path / "ws"
+	(path / ".wpm").mkdir(parents = True)
+	return path
+
+def test_values_survive_a_reload_encrypted(runtime, workspace):
+	cache = wpm_secrets.SessionCache(str(workspace))
+	assert cache.enabled()
+	cache.put("TOKEN", "s3cr3t-value")
+	cache.save()
+
+	assert not b"s3cr3t-value" in open(cache.path, "rb").read()
+	assert wpm_secrets.SessionCache(str(workspace)).get("TOKEN") == "s3cr3t-value"
+
+def test_modified_cache_is_rejected(runtime, workspace):
+	cache = wpm_secrets.SessionCache(str(workspace))
+	cache.put("TOKEN", "value")
+	cache.save()
+
+	data = bytearray(open(cache.path, "rb").read())
+	for i in [len(data) // 2, len(data) - 1, 5]:
+		tampered = bytearray(data)
+		tampered[i] ^= 1
+		with open(cache.path, "wb") as f:
+			f.write(bytes(tampered))
+		assert wpm_secrets.SessionCache(str(workspace)).entries == {}
+
+	#another session's key can't read it either
+	assert wpm_secrets.decrypt(os.urandom(32), bytes(data)) == None
+
+def test_entries_expire(runtime, workspace, monkeypatch):
+	cache = wpm_secrets.SessionCache(str(workspace), 60)
+	cache.put("OLD", "a")
+	now = time.time()
+	monkeypatch.setattr(wpm_secrets.time, "time", lambda: now + 30)
+	cache.put("NEW", "b")
+	cache.save()
+
+	monkeypatch.setattr(wpm_secrets.time, "time", lambda: now + 61)
+	assert cache.get("OLD") == None
+	assert cache.get("NEW") == "b"
+	assert list(wpm_secrets.SessionCache(str(workspace), 60).entries.keys()) == ["NEW"]
+
+def test_disabled_without_runtime_dir(runtime, workspace, monkeypatch):
+	monkeypatch.delenv("XDG_RUNTIME_DIR")
+	cache = wpm_secrets.SessionCache(str(workspace))
+	assert cache.enabled() == False
+	assert cache.disabled == "no private XDG_RUNTIME_DIR"
+	cache.put("TOKEN", "value")
+	cache.save()
+	assert not os.path.exists(cache.path)
+
+def test_disabled_without_cryptography(runtime, workspace, monkeypatch):
+	monkeypatch.setattr(wpm_secrets, "_get_aead", lambda: None)
+	cache = wpm_secrets.SessionCache(str(workspace))
+	assert cache.enabled() == False
+	assert "cryptography" in cache.disabled
+
+#####################################################################################################
+# SecretResolver
+
+class _Vault():
+	def tryResolve(self, name):
+		return "from-vault" if name == "VAULTED" else None
+
+@pytest.mark.parametrize("opt_in", [False, True])
+def test_prompted_values_are_cached_only_on_request(runtime, workspace, monkeypatch, opt_in):
+	if opt_in:
+		monkeypatch.setenv("WPM_CACHE_PROMPTED", "1")
+	monkeypatch.setattr(wpm_internal_utils, "ReadSecret", lambda message: "typed")
+	cache = wpm_secrets.SessionCache(str(workspace))
+	resolver = wpm_secrets.SecretResolver(str(workspace), _Vault(), cache)
+
+	assert resolver.resolve("VAULTED") == "from-vault"
+	assert resolver.resolve("TYPED") == "typed"
+	resolver.save()
+
+	cached = wpm_secrets.SessionCache(str(workspace))
+	assert cached.get("VAULTED") == "from-vault"
+	assert cached.get("TYPED") == ("typed" if opt_in else None)
@@ -0,0 +1,30 @@
+import os
+import json
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _run(tmp_path, *args, workspace = None, stderr = subprocess.STDOUT):
+	env = dict(os.environ)
+	env["PYTHONPATH"] = ROOT
+	env["WPM_NO_DAEMON"] = "1"
+	env["WPM_SEARCH_LOCATIONS"] = str(tmp_path)
+	env["WPM_WORKSPACE_PATH"] = workspace or str(tmp_path)
+	return subprocess.run([sys.executable, "-m", "wpmcli.entry"] + list(args), cwd = str(tmp_path), env = env,
+		stdout = subprocess.PIPE, stderr = stderr, text = True)
+
+def test_profile_measures_cli_imports(tmp_path):
+	p = _run(tmp_path, "--startup-profile", "-q", "list")
+	assert "-- startup profile:" in p.stdout
+	assert "wpmcli.cli" in p.stdout
+
+def test_profile_reported_on_exit(tmp_path):
+	p = _run(tmp_path, "--startup-profile", "list", workspace = str(tmp_path / "missing"))
+	assert p.returncode != 0
+	assert "-- startup profile:" in p.stdout
+
+def test_profile_leaves_records_alone(tmp_path):
+	p = _run(tmp_path, "--startup-profile", "list", "--format", "json", stderr = subprocess.PIPE)
+	json.loads(p.stdout)
+	assert "-- startup profile:" in p.stderr
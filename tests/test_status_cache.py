@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+from conftest import git, commit
+
+from workspace_package_manager import wpm_status_cache
+
+#####################################################################################################
+# read_index_paths on real index files, and what invalidates the fingerprint
+
+@pytest.fixture
+def repo(make_repo):
+	path = make_repo()
+	commit(path, "src/lib/one.c", "1\n")
+	commit(path, "src/lib/two.c", "2\n")
+	commit(path, "src/main.c", "m\n")
+	commit(path, ".gitignore", "*.tmp\n")
+	return path
+
+@pytest.fixture(params = [2, 4])
+def versioned(request, repo, monkeypatch):
+	git(repo, "update-index", "--index-version", str(request.param))
+	with open(str(repo / ".git" / "index"), "rb") as f:
+		assert int.from_bytes(f.read(8)[4:], "big") == request.param
+	#everything in these repositories was just written
+	monkeypatch.setattr(wpm_status_cache, "RACY_SECONDS", 0)
+	return repo
+
+def _fingerprint(repo):
+	fp = wpm_status_cache.get_fingerprint(str(repo), [])
+	assert fp != None
+	return fp
+
+def test_index_paths_match_git(versioned):
+	paths, simple = wpm_status_cache.read_index_paths(str(versioned / ".git" / "index"))
+	assert simple == True
+	assert paths == git(versioned, "ls-files").split("\n")
+
+def test_fingerprint_is_stable(versioned):
+	assert _fingerprint(versioned) == _fingerprint(versioned)
+
+def test_edit_invalidates(versioned):
+	before = _fingerprint(versioned)
+	(versioned / "src" / "lib" / "two.c").write_text("2 changed\n")
+	assert _fingerprint(versioned) != before
+
+def test_mode_change_invalidates(versioned):
+	path = versioned / "src" / "main.c"
+	mtime = path.stat().st_mtime_ns
+	before = _fingerprint(versioned)
+	os.chmod(str(path), path.stat().st_mode | 0o111)
+	assert path.stat().st_mtime_ns == mtime
+	assert _fingerprint(versioned) != before
+
+def test_added_file_invalidates(versioned):
+	before = _fingerprint(versioned)
+	(versioned / "src" / "lib" / "three.c").write_text("3\n")
+	after = _fingerprint(versioned)
+	assert after != before
+
+	git(versioned, "add", "src/lib/three.c")
+	assert _fingerprint(versioned) != after
+
+def test_ignoring_a_file_invalidates(versioned):
+	(versioned / "notes.log").write_text("x\n")
+	before = _fingerprint(versioned)
+	with open(str(versioned / ".gitignore"), "a") as f:
+		f.write("*.log\n")
+	assert _fingerprint(versioned) != before
+
+def test_info_exclude_invalidates(versioned):
+	(versioned / "notes.log").write_text("x\n")
+	before = _fingerprint(versioned)
+	(versioned / ".git" / "info").mkdir(exist_ok = True)
+	(versioned / ".git" / "info" / "exclude").write_text("*.log\n")
+	assert _fingerprint(versioned) != before
+
+def test_excludes_file_invalidates(versioned, git_env, tmp_path, monkeypatch):
+	(versioned / "notes.log").write_text("x\n")
+	#unset: $XDG_CONFIG_HOME/git/ignore
+	monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "xdg"))
+	default = tmp_path / "xdg" / "git" / "ignore"
+	before = _fingerprint(versioned)
+	default.parent.mkdir(parents = True)
+	default.write_text("*.log\n")
+	after_default = _fingerprint(versioned)
+	assert after_default != before
+
+	#pointing core.excludesFile somewhere else, then editing that file
+	excludes = tmp_path / "global-ignore"
+	excludes.write_text("")
+	git(versioned, "config", "--global", "core.excludesFile", str(excludes))
+	after_config = _fingerprint(versioned)
+	assert after_config != after_default
+	excludes.write_text("*.log\n")
+	assert _fingerprint(versioned) != after_config
+
+def test_recent_changes_are_not_cached(repo):
+	(repo / "src" / "main.c").write_text("just now\n")
+	assert wpm_status_cache.get_fingerprint(str(repo), []) == None
@@ -0,0 +1,36 @@
+import time
+
+from conftest import git
+
+from workspace_package_manager import wpm_status_scanner
+from workspace_package_manager import wpm_git_utils
+
+#####################################################################################################
+# full status: a fetch that doesn't finish in time leaves the package marked stale
+
+class _Package():
+	def __init__(self, name, path):
+		self.name = name
+		self.path = path
+
+	def fetch_remote(self, workspace, timeout):
+		return wpm_git_utils.fetch_remotes(self.path, timeout)
+
+	def get_status(self, workspace, fast, fetch_state = None):
+		return wpm_git_utils.get_git_status(None, self.path, fast, fetch_state)
+
+def test_fetch_timeout_marks_status_stale(tmp_path, git_env, remote_and_clone):
+	_, clone = remote_and_clone
+	with open(str(git_env), "a") as f:
+		f.write("[protocol \"ext\"]\n\tallow = always\n")
+	git(clone, "remote", "set-url", "origin", "ext::sh -c sleep% 30")
+
+	scanner = wpm_status_scanner.StatusScanner(str(tmp_path), fetch_timeout = 1)
+	start = time.time()
+	results = scanner.scan([_Package("hung", str(clone))], False)
+	assert time.time() - start < 10
+
+	status = results[0].status
+	assert status.stale == True
+	assert status.status == "stale"
+	assert f"(stale: fetch {wpm_git_utils.FETCH_TIMEOUT})" in status.info
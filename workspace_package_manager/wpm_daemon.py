@@ -0,0 +1,778 @@
+import os
+import sys
+import json
+import time
+import errno
+import select
+import socket
+import struct
+import threading
+import contextlib
+
+from . import wpm_internal_utils
+
+#####################################################################################################
+# `wpm daemon`: one long running process per workspace that keeps the package database and the
+# fast status of every package in memory, and answers the read only commands (status, list, revision)
+# the cli sends over <workspace>/.wpm/daemon.sock
+#  - requests are served one at a time, so only the ones answered from memory are sent (see is_served):
+#    `status --fast`, `list`, local `revision`; anything touching a remote runs in the client
+#  - bucket folders, the workspace folder and every installed package (worktree + .git) are watched
+#    with inotify, an event drops only what it touches (a package status, or the database for buckets)
+#  - without inotify (not linux) the folders are polled before each request: buckets and .git only,
+#    package worktrees can't be polled cheaply so their status is never cached
+#  - a client that can't connect (no daemon, stale socket), gets no reply within REPLY_TIMEOUT or a `fallback`
+#    reply runs the command itself
+# protocol: one json object per line, request {"argv", "env", "workspace"} or {"control" : "ping"|"stop"},
+# replies {"out" : text}, {"err" : text} then {"done" : code}, or a single {"fallback" : reason}
+
+SERVED_ACTIONS = ["status", "list", "revision"]
+
+CONNECT_TIMEOUT = 0.5
+#waiting for a daemon busy with another client
+REPLY_TIMEOUT = 30
+WRITE_TIMEOUT = 30
+DEFAULT_MAX_WATCHES = 8192
+#unix socket paths are limited to ~108 bytes
+MAX_SOCKET_PATH = 100
+
+def is_served(action, fast = False, remote = False):
+	#commands a daemon answers from memory
+	if not action in SERVED_ACTIONS:
+		return False
+	if action == "status" and fast == False:
+		return False
+	if action == "revision" and remote == True:
+		return False
+	return True
+
+def get_socket_path(workspace):
+	path = os.path.join(workspace, ".wpm", "daemon.sock")
+	if len(path.encode("utf-8")) <= MAX_SOCKET_PATH:
+		return path
+
+	import tempfile
+	import hashlib
+	uid = os.getuid() if hasattr(os, "getuid") else 0
+	digest = hashlib.sha1(os.path.abspath(workspace).encode("utf-8")).hexdigest()[:16]
+	return os.path.join(tempfile.gettempdir(), f"wpm-{uid}", f"daemon-{digest}.sock")
+
+def get_log_path(workspace):
+	return os.path.join(workspace, ".wpm", "daemon.log")
+
+def get_max_watches():
+	try:
+		return int(os.environ.get("WPM_DAEMON_WATCHES", DEFAULT_MAX_WATCHES))
+	except ValueError:
+		return DEFAULT_MAX_WATCHES
+
+def client_env():
+	#the part of the environment that changes what a command prints, the daemon only serves an identical one
+	keys = [k for k in os.environ.keys() if (k.startswith("WPM_") or k.startswith("GIT_")) and not k.startswith("WPM_DAEMON")]
+	keys += ["HOST_WORKSPACE", "HOME"]
+	return {k : os.environ.get(k, None) for k in keys if k != "GIT_OPTIONAL_LOCKS"}
+
+#####################################################################################################
+# protocol
+
+def _send(f, message):
+	f.write((json.dumps(message) + "\n").encode("utf-8"))
+	f.flush()
+
+def _receive(f):
+	line = f.readline()
+	if not line:
+		return None
+	return json.loads(line.decode("utf-8"))
+
+def _connect(workspace):
+	path = get_socket_path(workspace)
+	if not os.path.exists(path):
+		return None
+
+	s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	s.settimeout(CONNECT_TIMEOUT)
+	try:
+		s.connect(path)
+	except OSError:
+		s.close()
+		return None
+	return s
+
+def forward(workspace, argv, stream = None, err_stream = None):
+	#runs `argv` in the workspace daemon, returns its exit code or None when the command must run in process
+	stream = stream if stream != None else sys.stdout
+	err_stream = err_stream if err_stream != None else sys.stderr
+
+	s = _connect(workspace)
+	if s == None:
+		return None
+
+	wrote = False
+	try:
+		#served commands are answered from memory, a daemon that says nothing for this long is stuck or busy
+		s.settimeout(REPLY_TIMEOUT)
+		with s.makefile("rwb") as f:
+			_send(f, {"argv" : argv, "env" : client_env(), "workspace" : workspace})
+			while True:
+				message = _receive(f)
+				if message == None:
+					break
+				if "out" in message:
+					stream.write(message["out"])
+					stream.flush()
+					wrote = True
+				elif "err" in message:
+					err_stream.write(message["err"])
+					err_stream.flush()
+				elif "fallback" in message:
+					return None
+				elif "done" in message:
+					return message["done"]
+	except (OSError, ValueError):
+		pass
+	finally:
+		s.close()
+
+	if wrote == False:
+		return None
+
+	#part of the output is already out, running it again would print it twice
+	err_stream.write("-- wpm daemon: connection lost\n")
+	return 1
+
+def control(workspace, command):
+	#`ping` returns the daemon info, `stop` asks it to exit; None when no daemon answers
+	s = _connect(workspace)
+	if s == None:
+		return None
+	try:
+		s.settimeout(10)
+		with s.makefile("rwb") as f:
+			_send(f, {"control" : command})
+			return _receive(f)
+	except (OSError, ValueError):
+		return None
+	finally:
+		s.close()
+
+#####################################################################################################
+# watchers: watch_dir(path, key) watches the direct entries of a folder for `key`,
+# read(timeout) returns [(key, path, new_dir)], key None means events were lost (invalidate everything)
+
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_EXCL_UNLINK = 0x04000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+	| _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR | _IN_EXCL_UNLINK)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+class _Watches():
+	#wd (or path) -> (path, set of keys), shared by both watchers
+	def __init__(self, max_watches):
+		self.max_watches = max_watches
+		self.items = {}
+		self.by_key = {}
+
+	def add(self, ident, path, key):
+		entry = self.items.get(ident, None)
+		if entry == None:
+			entry = (path, set())
+			self.items[ident] = entry
+		entry[1].add(key)
+		self.by_key.setdefault(key, set()).add(ident)
+
+	def drop_key(self, key):
+		#returns the idents no key uses anymore
+		released = []
+		for ident in self.by_key.pop(key, set()):
+			entry = self.items.get(ident, None)
+			if entry == None:
+				continue
+			entry[1].discard(key)
+			if not entry[1]:
+				del self.items[ident]
+				released.append(ident)
+		return released
+
+	def forget(self, ident):
+		entry = self.items.pop(ident, None)
+		if entry != None:
+			for key in entry[1]:
+				self.by_key.get(key, set()).discard(ident)
+
+	def full(self):
+		return len(self.items) >= self.max_watches
+
+class InotifyWatcher():
+	kind = "inotify"
+	#every file change in a watched folder is reported, package worktrees can be watched
+	trees = True
+
+	def __init__(self, max_watches = None):
+		import ctypes
+		import ctypes.util
+
+		self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno = True)
+		self.fd = self.libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+		if self.fd < 0:
+			raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+		self.ctypes = ctypes
+		self.watches = _Watches(max_watches if max_watches != None else get_max_watches())
+
+	def fileno(self):
+		return self.fd
+
+	def count(self):
+		return len(self.watches.items)
+
+	def watch_dir(self, path, key):
+		if self.watches.full():
+			return False
+		wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+		if wd < 0:
+			#ENOSPC: the user's inotify watch limit, ENOENT/ENOTDIR: gone already
+			return False
+		self.watches.add(wd, path, key)
+		return True
+
+	def unwatch(self, key):
+		for wd in self.watches.drop_key(key):
+			self.libc.inotify_rm_watch(self.fd, wd)
+
+	def clear(self):
+		for key in list(self.watches.by_key.keys()):
+			self.unwatch(key)
+
+	def read(self, timeout = 0):
+		events = []
+		while True:
+			ready, _, _ = select.select([self.fd], [], [], timeout)
+			if not ready:
+				return events
+			timeout = 0
+
+			try:
+				data = os.read(self.fd, 65536)
+			except OSError as e:
+				if e.errno == errno.EAGAIN:
+					return events
+				raise
+
+			offset = 0
+			while offset + _EVENT_HEADER.size <= len(data):
+				wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+				name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b"\0")
+				offset += _EVENT_HEADER.size + length
+
+				if mask & _IN_Q_OVERFLOW:
+					events.append((None, None, False))
+					continue
+
+				entry = self.watches.items.get(wd, None)
+				if entry == None:
+					continue
+				if mask & _IN_IGNORED:
+					self.watches.forget(wd)
+					continue
+
+				path = os.path.join(entry[0], os.fsdecode(name)) if name else entry[0]
+				new_dir = (mask & _IN_ISDIR) != 0 and (mask & (_IN_CREATE | _IN_MOVED_TO)) != 0
+				for key in entry[1]:
+					events.append((key, path, new_dir))
+
+	def close(self):
+		if self.fd >= 0:
+			os.close(self.fd)
+			self.fd = -1
+
+class PollingWatcher():
+	kind = "polling"
+	#a folder snapshot sees entries added/removed/rewritten, too slow for whole worktrees
+	trees = False
+
+	def __init__(self, max_watches = None):
+		self.watches = _Watches(max_watches if max_watches != None else get_max_watches())
+		self.snapshots = {}
+
+	def fileno(self):
+		return None
+
+	def count(self):
+		return len(self.watches.items)
+
+	def _snapshot(self, path):
+		entries = {}
+		try:
+			with os.scandir(path) as it:
+				for e in it:
+					try:
+						st = e.stat(follow_symlinks = False)
+						entries[e.name] = (st.st_mtime_ns, st.st_size, e.is_dir(follow_symlinks = False))
+					except OSError:
+						pass
+		except OSError:
+			return None
+		return entries
+
+	def watch_dir(self, path, key):
+		if self.watches.full():
+			return False
+		snapshot = self._snapshot(path)
+		if snapshot == None:
+			return False
+		self.watches.add(path, path, key)
+		self.snapshots[path] = snapshot
+		return True
+
+	def unwatch(self, key):
+		for path in self.watches.drop_key(key):
+			self.snapshots.pop(path, None)
+
+	def clear(self):
+		self.watches = _Watches(self.watches.max_watches)
+		self.snapshots = {}
+
+	def read(self, timeout = 0):
+		events = []
+		for path, (_, keys) in list(self.watches.items.items()):
+			old = self.snapshots.get(path, {})
+			new = self._snapshot(path)
+			if new == None:
+				#the folder itself is gone
+				self.watches.forget(path)
+				self.snapshots.pop(path, None)
+				events.extend([(key, path, False) for key in keys])
+				continue
+
+			self.snapshots[path] = new
+			for name in set(old.keys()) | set(new.keys()):
+				if old.get(name, None) != new.get(name, None):
+					new_dir = name not in old and new[name][2]
+					events.extend([(key, os.path.join(path, name), new_dir) for key in keys])
+		return events
+
+	def close(self):
+		pass
+
+def create_watcher(max_watches = None):
+	if sys.platform.startswith("linux"):
+		try:
+			return InotifyWatcher(max_watches)
+		except (OSError, AttributeError):
+			pass
+	return PollingWatcher(max_watches)
+
+#####################################################################################################
+
+class StatusCache():
+	#fast status per package, valid until an event touches the package
+	#used by wpm_status_scanner (lookup/store), the token makes a result computed across an invalidation unusable
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.entries = {}
+		self.generations = {}
+		#packages that are not fully watched, their status is always computed
+		self.partial = set()
+		self.hits = 0
+		self.misses = 0
+
+	def lookup(self, workspace, package, fast):
+		with self.lock:
+			token = self.generations.get(package.name, 0)
+			if fast == False or package.name in self.partial:
+				return None, token
+			e = self.entries.get(package.name, None)
+			if e != None and e[0] == token:
+				self.hits += 1
+				return e[1], token
+			self.misses += 1
+			return None, token
+
+	def store(self, workspace, package, fast, status, token):
+		if fast == False:
+			return
+		with self.lock:
+			if self.generations.get(package.name, 0) == token and not package.name in self.partial:
+				self.entries[package.name] = (token, status)
+
+	def invalidate(self, name):
+		with self.lock:
+			self.generations[name] = self.generations.get(name, 0) + 1
+			self.entries.pop(name, None)
+
+	def clear(self):
+		with self.lock:
+			for name in list(self.generations.keys()) + list(self.entries.keys()):
+				self.generations[name] = self.generations.get(name, 0) + 1
+			self.entries = {}
+			self.partial = set()
+
+class Fallback(Exception):
+	#raised by the runner before any output: the client runs the command itself
+	pass
+
+class _ClientStream():
+	#stdout/stderr of a forwarded command, sent line by line; a client that went away is ignored
+	def __init__(self, f, field):
+		self.f = f
+		self.field = field
+		self.buffer = ""
+		self.wrote = False
+		self.closed = False
+
+	def write(self, text):
+		self.buffer += text
+		if "\n" in text or len(self.buffer) > 4096:
+			self.flush()
+		return len(text)
+
+	def flush(self):
+		if self.buffer == "" or self.closed:
+			self.buffer = ""
+			return
+		data = self.buffer
+		self.buffer = ""
+		self.wrote = True
+		try:
+			_send(self.f, {self.field : data})
+		except OSError:
+			self.closed = True
+
+	def isatty(self):
+		return False
+
+#####################################################################################################
+
+def _skip_dir(name):
+	return name == ".git" or name == "__pycache__"
+
+class DaemonServer():
+	#`loader()` returns a full PackageDatabase, `runner(argv)` runs a cli command (raises Fallback to decline it)
+	def __init__(self, workspace, search_locations, loader, runner, idle_timeout = 0, watcher = None, log = None):
+		self.workspace = os.path.abspath(workspace)
+		self.search_locations = [p for p in search_locations if p != ""]
+		self.loader = loader
+		self.runner = runner
+		self.idle_timeout = idle_timeout
+		self.watcher = watcher if watcher != None else create_watcher()
+		self.log = log if log != None else sys.stderr
+
+		self.cache = StatusCache()
+		self.env = client_env()
+		self.socket_path = get_socket_path(self.workspace)
+
+		self.packs = None
+		self.stale = True
+		self.installs_changed = False
+		#package name -> install path of the packages being watched
+		self.watched = {}
+
+		self.started = time.time()
+		self.last_request = self.started
+		self.requests = 0
+		self.loads = 0
+		self.stopping = False
+		self.sock = None
+
+	def _log(self, text):
+		self.log.write(time.strftime("%Y-%m-%d %H:%M:%S ") + text + "\n")
+		self.log.flush()
+
+	#######################################################################################################
+	# state
+
+	def get_packages(self):
+		if self.packs == None or self.stale:
+			self.packs = self.loader()
+			self.stale = False
+			self.loads += 1
+			self._rewatch()
+		elif self.installs_changed:
+			self._sync_packages()
+		return self.packs
+
+	def _watch_tree(self, root, key):
+		#returns False if part of the tree could not be watched
+		complete = True
+		for folder, dirs, _ in os.walk(root):
+			dirs[:] = [d for d in dirs if not _skip_dir(d)]
+			if not self.watcher.watch_dir(folder, key):
+				complete = False
+				dirs[:] = []
+		return complete
+
+	def _watch_package(self, name, ipath):
+		from . import wpm_git_config
+
+		key = "package:" + name
+		complete = self.watcher.trees
+
+		gitdir = wpm_git_config.get_repo_git_dir(ipath)
+		if os.path.isdir(gitdir):
+			#HEAD, index, packed-refs, FETCH_HEAD and the loose refs, not objects/ or logs/
+			complete = self.watcher.watch_dir(gitdir, key) and complete
+			complete = self._watch_tree(os.path.join(gitdir, "refs"), key) and complete
+
+		if self.watcher.trees:
+			complete = self._watch_tree(ipath, key) and complete
+
+		self.watched[name] = ipath
+		if complete == False:
+			with self.cache.lock:
+				self.cache.partial.add(name)
+
+	def _installed(self):
+		result = {}
+		for name, p in self.packs.getall():
+			ipath = p.get_install_path(self.workspace)
+			if os.path.isdir(ipath):
+				result[name] = ipath
+		return result
+
+	def _rewatch(self):
+		self.watcher.clear()
+		self.cache.clear()
+		self.watched = {}
+		self.installs_changed = False
+
+		self.watcher.watch_dir(self.workspace, "workspace")
+		for location in self.search_locations:
+			if os.path.isdir(location):
+				self._watch_tree(location, "buckets")
+		#definitions loaded from outside the search locations (add_bucket)
+		for m in self.packs.modules:
+			folder = m if os.path.isdir(m) else os.path.dirname(m)
+			self.watcher.watch_dir(folder, "buckets")
+
+		for name, ipath in self._installed().items():
+			self._watch_package(name, ipath)
+
+		self._log(f"watching {self.watcher.count()} folders ({self.watcher.kind}), {len(self.watched)} installed packages")
+
+	def _sync_packages(self):
+		#something was added/removed in the workspace folder
+		self.installs_changed = False
+		installed = self._installed()
+		for name in list(self.watched.keys()):
+			if installed.get(name, None) != self.watched[name]:
+				self.watcher.unwatch("package:" + name)
+				del self.watched[name]
+				with self.cache.lock:
+					self.cache.partial.discard(name)
+				self.cache.invalidate(name)
+		for name, ipath in installed.items():
+			if not name in self.watched:
+				self.cache.invalidate(name)
+				self._watch_package(name, ipath)
+
+	def _on_events(self, events):
+		for key, path, new_dir in events:
+			if key == None:
+				self._log("event queue overflow, dropping everything")
+				self.stale = True
+				continue
+
+			if path != None and (path.endswith(".pyc") or "__pycache__" in path):
+				continue
+
+			if key == "buckets":
+				self.stale = True
+			elif key == "workspace":
+				self.installs_changed = True
+			elif key.startswith("package:"):
+				name = key[len("package:"):]
+				self.cache.invalidate(name)
+				if new_dir and self.watcher.trees and not ".git" in path.split(os.sep):
+					if not self._watch_tree(path, key):
+						with self.cache.lock:
+							self.cache.partial.add(name)
+
+	def _drain(self):
+		self._on_events(self.watcher.read(0))
+
+	#######################################################################################################
+	# socket
+
+	def _bind(self):
+		path = self.socket_path
+		os.makedirs(os.path.dirname(path), mode = 0o700, exist_ok = True)
+		if os.path.exists(path):
+			if control(self.workspace, "ping") != None:
+				raise Exception(f"A daemon is already running for {self.workspace} ({path})")
+			#left over by a daemon that was killed
+			os.remove(path)
+
+		self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		old_umask = os.umask(0o077)
+		try:
+			self.sock.bind(path)
+		finally:
+			os.umask(old_umask)
+		self.sock.listen(16)
+
+	def _same_user(self, conn):
+		if not hasattr(socket, "SO_PEERCRED") or not hasattr(os, "getuid"):
+			return True
+		try:
+			_, uid, _ = struct.unpack("3i", conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")))
+		except OSError:
+			return False
+		return uid == os.getuid()
+
+	def info(self):
+		return {
+			"pid" : os.getpid(),
+			"workspace" : self.workspace,
+			"uptime" : round(time.time() - self.started, 1),
+			"requests" : self.requests,
+			"loads" : self.loads,
+			"packages" : len(self.packs.db) if self.packs != None else 0,
+			"installed" : len(self.watched),
+			"watches" : self.watcher.count(),
+			"watcher" : self.watcher.kind,
+			"unwatched" : len(self.cache.partial),
+			"cached" : len(self.cache.entries),
+			"hits" : self.cache.hits,
+			"misses" : self.cache.misses,
+		}
+
+	def _handle(self, conn):
+		conn.settimeout(WRITE_TIMEOUT)
+		with conn.makefile("rwb") as f:
+			request = _receive(f)
+			if request == None:
+				return
+
+			command = request.get("control", None)
+			if command == "ping":
+				_send(f, {"done" : 0, "info" : self.info()})
+				return
+			if command == "stop":
+				self.stopping = True
+				_send(f, {"done" : 0})
+				return
+
+			self.requests += 1
+			if os.path.abspath(request.get("workspace", "")) != self.workspace:
+				_send(f, {"fallback" : "different workspace"})
+				return
+			if request.get("env", None) != self.env:
+				_send(f, {"fallback" : "different environment"})
+				return
+
+			#changes since the last request, nothing is read from a cache an event already dropped
+			self._drain()
+
+			out = _ClientStream(f, "out")
+			err = _ClientStream(f, "err")
+			code = 0
+			cwd = os.getcwd()
+			try:
+				with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+					self.runner(request.get("argv", []))
+			except Fallback as e:
+				if out.wrote == False and err.wrote == False:
+					out.buffer = ""
+					err.buffer = ""
+					_send(f, {"fallback" : str(e)})
+					return
+				code = 1
+			except SystemExit as e:
+				code = e.code if isinstance(e.code, int) else 1
+			except Exception:
+				import traceback
+				self._log(traceback.format_exc())
+				code = 1
+			finally:
+				os.chdir(cwd)
+
+			out.flush()
+			err.flush()
+			if out.closed == False:
+				_send(f, {"done" : code})
+
+	def serve(self):
+		#returns when stopped or idle for `idle_timeout` seconds (0 = never)
+		self._bind()
+		self._log(f"serving {self.workspace} on {self.socket_path} (pid {os.getpid()})")
+
+		#status must not rewrite the index of the repositories it watches
+		os.environ["GIT_OPTIONAL_LOCKS"] = "0"
+
+		try:
+			self.get_packages()
+			while not self.stopping:
+				fds = [self.sock]
+				if self.watcher.fileno() != None:
+					fds.append(self.watcher.fileno())
+
+				timeout = 60
+				if self.idle_timeout > 0:
+					left = self.idle_timeout - (time.time() - self.last_request)
+					if left <= 0:
+						self._log("idle, exiting")
+						break
+					timeout = min(timeout, left)
+
+				ready, _, _ = select.select(fds, [], [], timeout)
+				if self.watcher.fileno() in ready:
+					self._drain()
+				if self.sock in ready:
+					conn, _ = self.sock.accept()
+					try:
+						if self._same_user(conn):
+							self._handle(conn)
+					except (OSError, ValueError) as e:
+						self._log(f"client error: {e}")
+					finally:
+						conn.close()
+					self.last_request = time.time()
+		finally:
+			self.sock.close()
+			if os.path.exists(self.socket_path):
+				os.remove(self.socket_path)
+			self.watcher.close()
+			self._log("stopped")
+
+#####################################################################################################
+
+def spawn(workspace, argv, env = None, timeout = 10):
+	#starts `argv` (a `wpm daemon run` command line) detached and waits for its socket, returns the ping info or None
+	import subprocess
+
+	log_path = get_log_path(workspace)
+	with open(log_path, "a") as log:
+		subprocess.Popen(argv, stdin = subprocess.DEVNULL, stdout = log, stderr = log, cwd = workspace, env = env,
+			start_new_session = True, close_fds = True)
+
+	end = time.time() + timeout
+	while time.time() < end:
+		reply = control(workspace, "ping")
+		if reply != None:
+			return reply.get("info", None)
+		time.sleep(0.1)
+	return None
+
+def format_info(info):
+	clrs = wpm_internal_utils.Colors
+	lines = [f"{clrs.LIGHT_BLUE}-- daemon:{clrs.END} pid {info['pid']}, up {info['uptime']:.0f} sec, {info['requests']} requests, {info['loads']} loads"]
+	lines.append(f"    packages: {info['packages']} ({info['installed']} installed, {info['unwatched']} not fully watched)")
+	lines.append(f"    watches:  {info['watches']} ({info['watcher']})")
+	lines.append(f"    status:   {info['cached']} cached, {info['hits']} hits, {info['misses']} misses")
+	return "\n".join(lines)
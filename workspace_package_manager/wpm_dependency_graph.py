@@ -0,0 +1,234 @@
+import os
+
+#####################################################################################################
+# dependency graph resolved before anything is installed:
+#  - dependencies come from the `dependencies()` of actions.py in the packages already installed,
+#    a package that is not installed yet has unknown dependencies until it is fetched
+#  - every package appears once, cycles (strongly connected components) are reported with their members
+#  - levels: level 0 has no dependencies, level N only depends on lower levels; packages in a cycle, or
+#    depending on one or on a package missing from the database, get no level
+
+class GraphNode():
+	def __init__(self, name):
+		self.name = name
+		self.package = None
+		self.installed = False
+		#None while unknown (not installed)
+		self.dependencies = None
+		self.dependents = []
+
+		#ok, unknown (dependencies), missing (no definition), error (actions.py failed), cycle or blocked
+		self.state = "ok"
+		self.error = None
+		self.level = None
+
+class DependencyGraph():
+	def __init__(self):
+		self.nodes = {}
+		self.roots = []
+		#lists of names, each one a cycle
+		self.cycles = []
+		#lists of names, lowest level first
+		self.levels = []
+
+	def get(self, name):
+		return self.nodes.get(name, None)
+
+	def ordered(self):
+		#every node, dependencies before dependents, the ones without a level last
+		names = [n for level in self.levels for n in level]
+		names += sorted([n for n in self.nodes if self.nodes[n].level == None])
+		return [self.nodes[n] for n in names]
+
+	def failed(self):
+		#nodes that can't be installed whatever happens later
+		return [n for n in self.nodes.values() if n.state in ("missing", "error", "cycle", "blocked")]
+
+#####################################################################################################
+
+def _read_dependencies(workspace, node):
+	if not node.installed:
+		node.state = "unknown"
+		return []
+
+	try:
+		actions = node.package.get_actions(workspace)
+		deps = actions.evaluate_dependencies() if actions != None else []
+	except Exception as e:
+		node.state = "error"
+		node.error = f"actions.py: {e}"
+		return []
+
+	node.dependencies = []
+	for d in deps:
+		if not d in node.dependencies:
+			node.dependencies.append(d)
+	return node.dependencies
+
+def _find_cycles(graph):
+	#tarjan's strongly connected components, iterative (deep chains would hit the recursion limit)
+	index = {}
+	low = {}
+	stack = []
+	on_stack = set()
+	cycles = []
+	counter = 0
+
+	for start in sorted(graph.nodes):
+		if start in index:
+			continue
+		work = [(start, 0)]
+		while work:
+			name, i = work.pop()
+			if i == 0:
+				index[name] = counter
+				low[name] = counter
+				counter += 1
+				stack.append(name)
+				on_stack.add(name)
+
+			deps = graph.nodes[name].dependencies or []
+			if i < len(deps):
+				work.append((name, i + 1))
+				dep = deps[i]
+				if not dep in index:
+					work.append((dep, 0))
+				elif dep in on_stack:
+					low[name] = min(low[name], index[dep])
+				continue
+
+			if work:
+				parent = work[-1][0]
+				low[parent] = min(low[parent], low[name])
+
+			if low[name] == index[name]:
+				component = []
+				while True:
+					n = stack.pop()
+					on_stack.discard(n)
+					component.append(n)
+					if n == name:
+						break
+				if len(component) > 1 or name in deps:
+					cycles.append(sorted(component))
+
+	return cycles
+
+def _assign_levels(graph):
+	#kahn's algorithm over the nodes whose whole dependency tree is installable
+	pending = {}
+	for node in graph.nodes.values():
+		if node.state in ("ok", "unknown"):
+			pending[node.name] = len(node.dependencies or [])
+
+	current = sorted([n for n, count in pending.items() if count == 0])
+	level = 0
+	while current:
+		graph.levels.append(current)
+		following = []
+		for name in current:
+			graph.nodes[name].level = level
+			for d in graph.nodes[name].dependents:
+				if not d in pending:
+					continue
+				pending[d] -= 1
+				if pending[d] == 0:
+					following.append(d)
+		current = sorted(following)
+		level += 1
+
+def _block_dependents(graph):
+	failed = [n.name for n in graph.failed()]
+	while failed:
+		name = failed.pop()
+		for d in graph.nodes[name].dependents:
+			node = graph.nodes[d]
+			if node.state in ("ok", "unknown"):
+				node.state = "blocked"
+				node.error = f"dependency {name} {graph.nodes[name].state}"
+				failed.append(d)
+
+def resolve(workspace, packs, names, follow = True):
+	#builds the graph of `names` (and of their dependencies when `follow` is set)
+	graph = DependencyGraph()
+	queue = []
+	for n in names:
+		if not n in graph.roots:
+			graph.roots.append(n)
+			queue.append(n)
+
+	while queue:
+		name = queue.pop(0)
+		if name in graph.nodes:
+			continue
+
+		node = GraphNode(name)
+		graph.nodes[name] = node
+		node.package = packs.find(name)
+		if node.package == None:
+			node.state = "missing"
+			node.error = "not found in the search locations"
+			continue
+
+		node.installed = os.path.exists(node.package.get_install_path(workspace))
+		if follow:
+			queue.extend(_read_dependencies(workspace, node))
+		else:
+			node.dependencies = []
+
+	for node in graph.nodes.values():
+		for d in node.dependencies or []:
+			if d in graph.nodes:
+				graph.nodes[d].dependents.append(node.name)
+
+	graph.cycles = _find_cycles(graph)
+	for cycle in graph.cycles:
+		for name in cycle:
+			graph.nodes[name].state = "cycle"
+			graph.nodes[name].error = "dependency cycle: " + " -> ".join(cycle + [cycle[0]])
+
+	_block_dependents(graph)
+	_assign_levels(graph)
+	return graph
+
+#####################################################################################################
+
+def subgraph(graph, name):
+	#names reachable from `name` (itself included)
+	seen = []
+	queue = [name]
+	while queue:
+		n = queue.pop(0)
+		if n in seen or not n in graph.nodes:
+			continue
+		seen.append(n)
+		queue.extend(graph.nodes[n].dependencies or [])
+	return seen
+
+def graph_record(node):
+	return {
+		"type" : "package",
+		"name" : node.name,
+		"installed" : node.installed,
+		"state" : node.state,
+		"level" : node.level,
+		"dependencies" : node.dependencies,
+		"error" : node.error,
+	}
+
+def to_dot(graph, names = None):
+	names = names if names != None else [n.name for n in graph.ordered()]
+	lines = ["digraph wpm {", "\trankdir=LR;"]
+	for n in names:
+		node = graph.nodes[n]
+		style = ""
+		if node.state != "ok":
+			style = f" [color=red, label=\"{n}\\n({node.state})\"]"
+		elif not node.installed:
+			style = " [style=dashed]"
+		lines.append(f"\t\"{n}\"{style};")
+	for n in names:
+		for d in graph.nodes[n].dependencies or []:
+			lines.append(f"\t\"{n}\" -> \"{d}\";")
+	lines.append("}")
+	return "\n".join(lines)
@@ -0,0 +1,151 @@
+import os
+import stat
+import time
+import shutil
+import hashlib
+import zipfile
+import threading
+
+#####################################################################################################
+# in-process download and extraction:
+#  - one pooled requests session per process (keep-alive across packages)
+#  - the body is streamed to disk in chunks and hashed as it arrives
+#  - zip members are copied out one by one through a fixed size buffer
+
+CHUNK_SIZE = 1024 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+	global _session
+	with _session_lock:
+		if _session == None:
+			import requests
+			from requests.adapters import HTTPAdapter
+
+			_session = requests.Session()
+			adapter = HTTPAdapter(pool_connections = 16, pool_maxsize = 16, max_retries = 3)
+			_session.mount("http://", adapter)
+			_session.mount("https://", adapter)
+
+	return _session
+
+def format_size(size):
+	for unit in ["B", "KiB", "MiB", "GiB"]:
+		if size < 1024.0 or unit == "GiB":
+			return f"{size:.1f} {unit}"
+		size = size / 1024.0
+
+class TransferResult():
+	def __init__(self):
+		self.size = 0
+		self.sha256 = None
+		self.duration = 0.0
+
+	def throughput(self):
+		if self.duration <= 0.0:
+			return format_size(self.size) + "/s"
+		return format_size(self.size / self.duration) + "/s"
+
+	def describe(self):
+		return f"{format_size(self.size)} in {self.duration:.3f} sec ({self.throughput()})"
+
+#####################################################################################################
+
+def download_file(url, abs_dest_path, headers = None, expected_sha256 = None):
+	#streams `url` into `abs_dest_path`, raises if the request fails or the sha256 does not match
+	result = TransferResult()
+	start = time.time()
+	h = hashlib.sha256()
+
+	with get_session().get(url, headers = headers, stream = True, timeout = 60) as response:
+		if response.status_code != 200:
+			raise Exception(f"Failed to download {url} (http {response.status_code})")
+
+		with open(abs_dest_path, "wb") as f:
+			for chunk in response.iter_content(chunk_size = CHUNK_SIZE):
+				if not chunk:
+					continue
+				h.update(chunk)
+				f.write(chunk)
+				result.size += len(chunk)
+
+	result.duration = time.time() - start
+	result.sha256 = h.hexdigest()
+
+	if expected_sha256 != None and expected_sha256.lower() != result.sha256:
+		os.remove(abs_dest_path)
+		raise Exception(f"sha256 mismatch for {url}\n\texpected: {expected_sha256}\n\tgot:      {result.sha256}")
+
+	return result
+
+def _inside(abs_path, dest_root):
+	return abs_path == dest_root or abs_path.startswith(dest_root + os.sep)
+
+def _extract_symlink(z, member, name, dest_root):
+	#recreated as a link, what it points to has to stay inside the destination as well
+	link = z.read(member).decode("utf-8")
+	parent = os.path.realpath(os.path.dirname(os.path.join(dest_root, name)))
+	path = os.path.join(parent, os.path.basename(name))
+	if os.path.isabs(link) or not _inside(os.path.realpath(os.path.join(parent, link)), dest_root):
+		raise Exception(f"Refusing to extract link {member.filename} -> {link} pointing outside of the destination")
+
+	os.makedirs(parent, exist_ok = True)
+	if os.path.lexists(path):
+		os.remove(path)
+	os.symlink(link, path)
+
+def extract_zip(abs_zip_path, abs_dest_path, strip_root = False):
+	#extracts members one at a time, `strip_root` drops the top folder of every member
+	result = TransferResult()
+	start = time.time()
+
+	dest_root = os.path.realpath(abs_dest_path)
+
+	with zipfile.ZipFile(abs_zip_path) as z:
+		for member in z.infolist():
+			name = member.filename
+			if strip_root:
+				_, _, name = name.partition("/")
+			if name == "":
+				continue
+
+			target = os.path.realpath(os.path.join(dest_root, name))
+			if not _inside(target, dest_root):
+				raise Exception(f"Refusing to extract {member.filename} outside of {abs_dest_path}")
+
+			if stat.S_ISLNK(member.external_attr >> 16):
+				_extract_symlink(z, member, name, dest_root)
+				result.size += member.file_size
+				continue
+
+			if member.is_dir():
+				os.makedirs(target, exist_ok = True)
+				continue
+
+			os.makedirs(os.path.dirname(target), exist_ok = True)
+			with z.open(member, "r") as src, open(target, "wb") as dst:
+				shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+			mode = (member.external_attr >> 16) & 0o777
+			if mode != 0:
+				os.chmod(target, mode)
+
+			result.size += member.file_size
+
+	result.duration = time.time() - start
+	return result
+
+def download_and_extract_zip(url, abs_dest_path, headers = None, expected_sha256 = None, strip_root = False):
+	#returns (download result, extract result), the archive is removed when done
+	os.makedirs(abs_dest_path, exist_ok = True)
+	archive = os.path.join(abs_dest_path, f".wpm-download-{os.getpid()}-{threading.get_ident()}.zip")
+	try:
+		downloaded = download_file(url, archive, headers, expected_sha256)
+		extracted = extract_zip(archive, abs_dest_path, strip_root)
+	finally:
+		if os.path.exists(archive):
+			os.remove(archive)
+
+	return downloaded, extracted
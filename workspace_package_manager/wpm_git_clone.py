@@ -0,0 +1,277 @@
+import os
+import re
+import time
+import random
+import hashlib
+import subprocess
+
+from . import wpm_internal_utils
+from . import wpm_download_utils
+from . import wpm_trace
+
+#####################################################################################################
+# clones that survive bad connections:
+#  - a clone is `git init` + fetch + checkout, a marker (<repo>/.git/wpm-partial-clone.json) stays until the
+#    checkout is done; the next install finds it and fetches into the existing object store instead of starting over
+#  - the active branch is fetched first and the other branches/tags after it, every completed fetch stays on disk
+#    (git can't continue a half received pack, an interrupted fetch only loses its own pack)
+#  - transient failures (dropped connections, timeouts, dns, 5xx) are retried with exponential backoff
+#  - objects and bytes received are read from `--progress` (object store growth when git prints no totals,
+#    small fetches are unpacked to loose objects without any progress)
+
+MARKER_NAME = "wpm-partial-clone.json"
+
+DEFAULT_RETRIES = 3
+BACKOFF_START = 2.0
+BACKOFF_MAX = 30.0
+
+#a stalled http transfer fails (and gets retried) instead of hanging forever
+_stall_options = ["-c", "http.lowSpeedLimit=1000", "-c", "http.lowSpeedTime=60"]
+
+_transient_errors = [
+	"could not resolve host",
+	"temporary failure in name resolution",
+	"connection timed out",
+	"operation timed out",
+	"operation too slow",
+	"connection reset",
+	"connection refused",
+	"couldn't connect to server",
+	"failed to connect",
+	"network is unreachable",
+	"the remote end hung up unexpectedly",
+	"early eof",
+	"unexpected disconnect",
+	"transfer closed",
+	"rpc failed",
+	"index-pack failed",
+	"broken pipe",
+	"returned error: 5",
+	"ssl_read",
+	"gnutls",
+]
+
+def get_retries():
+	try:
+		return max(0, int(os.environ.get("WPM_CLONE_RETRIES", DEFAULT_RETRIES)))
+	except ValueError:
+		return DEFAULT_RETRIES
+
+def is_transient_error(text):
+	text = text.lower()
+	return any(e in text for e in _transient_errors)
+
+class CloneTransfer(wpm_download_utils.TransferResult):
+	def __init__(self):
+		wpm_download_utils.TransferResult.__init__(self)
+		self.objects = 0
+		self.fetches = 0
+		self.retries = 0
+		#continued a partial clone left by an earlier install
+		self.resumed = False
+
+	def describe(self):
+		text = f"{self.objects} objects, " + wpm_download_utils.TransferResult.describe(self)
+		if self.resumed:
+			text += ", resumed"
+		if self.retries:
+			text += f", {self.retries} retries"
+		return text
+
+#####################################################################################################
+
+def _marker_path(abs_path):
+	return os.path.join(abs_path, ".git", MARKER_NAME)
+
+def is_partial_clone(abs_path):
+	return os.path.exists(_marker_path(abs_path))
+
+def _url_key(url):
+	#clone urls can carry tokens, the marker only needs to recognize the url
+	return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+_receiving = re.compile(r"(?:Receiving|Unpacking) objects:\s+\d+% \((\d+)/\d+\)(?:,\s+([\d.]+)\s+(bytes|KiB|MiB|GiB))?")
+_total = re.compile(r"remote: Total (\d+)")
+_units = {"bytes" : 1, "KiB" : 1024, "MiB" : 1024 * 1024, "GiB" : 1024 * 1024 * 1024}
+
+def parse_progress(text):
+	#returns (objects, bytes or None) from the last `Receiving objects` line of `git fetch --progress`
+	objects = None
+	total = 0
+	size = None
+	for line in re.split(r"[\r\n]", text):
+		m = _receiving.search(line)
+		if m != None:
+			objects = int(m.group(1))
+			if m.group(2) != None:
+				size = int(float(m.group(2)) * _units[m.group(3)])
+			continue
+		m = _total.search(line)
+		if m != None:
+			total = int(m.group(1))
+	return objects if objects != None else total, size
+
+def _last_error(text):
+	lines = [l.strip() for l in re.split(r"[\r\n]", text) if l.strip() != ""]
+	errors = [l for l in lines if l.startswith("fatal:") or l.startswith("error:")]
+	if errors:
+		return errors[-1]
+	return lines[-1] if lines else "unknown error"
+
+def _store_size(abs_path):
+	#packs + loose objects
+	objects = os.path.join(abs_path, ".git", "objects")
+	total = 0
+	try:
+		with os.scandir(objects) as it:
+			folders = [e.path for e in it if e.is_dir() and (len(e.name) == 2 or e.name == "pack")]
+		for folder in folders:
+			with os.scandir(folder) as it:
+				for e in it:
+					if e.name.endswith(".pack") or len(e.name) >= 38:
+						total += e.stat().st_size
+	except OSError:
+		pass
+	return total
+
+def _git(abs_path, args):
+	p = subprocess.run(["git"] + args, cwd = abs_path, stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+	if p.returncode != 0:
+		raise Exception(f"git {args[0]} failed in {abs_path}: {p.stderr.decode('utf-8', 'replace').strip()}")
+	return p.stdout.decode("utf-8", "replace")
+
+def _has_ref(abs_path, ref):
+	return subprocess.run(["git", "rev-parse", "--verify", "--quiet", ref], cwd = abs_path,
+		stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL).returncode == 0
+
+def fetch(abs_path, args, transfer = None, log = print):
+	#one `git fetch`, retried while it fails for network reasons, returns the CloneTransfer (`transfer` or a new one)
+	if transfer == None:
+		transfer = CloneTransfer()
+
+	retries = get_retries()
+	delay = BACKOFF_START
+	attempt = 0
+	while True:
+		attempt += 1
+		before = _store_size(abs_path)
+		start = time.time()
+		with wpm_trace.span("git fetch", "git", cwd = abs_path, attempt = attempt) as s:
+			p = subprocess.run(["git"] + _stall_options + ["fetch", "--progress"] + args, cwd = abs_path,
+				stdout = subprocess.DEVNULL, stderr = subprocess.PIPE)
+			s.set(returncode = p.returncode)
+		err = p.stderr.decode("utf-8", "replace")
+
+		objects, size = parse_progress(err)
+		transfer.duration += time.time() - start
+		transfer.objects += objects
+		transfer.size += size if size != None else max(0, _store_size(abs_path) - before)
+		transfer.fetches += 1
+
+		if p.returncode == 0:
+			return transfer
+
+		message = _last_error(err)
+		if attempt > retries or not is_transient_error(err):
+			raise Exception(f"git fetch failed in {abs_path}: {message}")
+
+		wait = min(BACKOFF_MAX, delay) * random.uniform(0.75, 1.25)
+		delay *= 2
+		transfer.retries += 1
+		if log != None:
+			log(f"   fetch failed ({message}), retrying in {wait:.1f} sec ({attempt}/{retries})")
+		time.sleep(wait)
+
+def _prepare(url, abs_path, transfer, track_branch = None):
+	#creates the repository (or picks up the partial one) with `origin` pointing at `url`
+	if is_partial_clone(abs_path):
+		marker = wpm_internal_utils.read_json_file(_marker_path(abs_path)) or {}
+		if marker.get("url", None) != _url_key(url):
+			raise Exception(f"{abs_path} holds a partial clone of another url, reinstall with --force")
+		transfer.resumed = True
+		return
+
+	if os.path.exists(abs_path) and os.listdir(abs_path):
+		raise Exception(f"Install folder {abs_path} is not empty")
+
+	os.makedirs(abs_path, exist_ok = True)
+	_git(abs_path, ["init", "--quiet"])
+	wpm_internal_utils.write_json_file(_marker_path(abs_path), {"url" : _url_key(url), "started" : time.time()})
+
+	if track_branch != None:
+		_git(abs_path, ["remote", "add", "-t", track_branch, "origin", url])
+	else:
+		_git(abs_path, ["remote", "add", "origin", url])
+
+def _use_reference(abs_path, reference):
+	objects = os.path.join(reference, "objects")
+	if not os.path.isdir(objects):
+		return False
+	alternates = os.path.join(abs_path, ".git", "objects", "info", "alternates")
+	os.makedirs(os.path.dirname(alternates), exist_ok = True)
+	with open(alternates, "w") as f:
+		f.write(objects + "\n")
+	return True
+
+def _dissociate(abs_path):
+	#copies what is borrowed from the reference, the clone must not depend on the mirror afterwards
+	_git(abs_path, ["repack", "-a", "-d", "-q"])
+	os.remove(os.path.join(abs_path, ".git", "objects", "info", "alternates"))
+
+def _finish(abs_path):
+	os.remove(_marker_path(abs_path))
+
+#####################################################################################################
+
+def clone(url, abs_path, branch, depth = None, filter = None, single_branch = False, reference = None, log = print):
+	#clones (or resumes cloning) `url` into `abs_path` with `branch` checked out, returns a CloneTransfer
+	#a depth implies a single branch, like `git clone --depth`
+	single_branch = single_branch or depth != None
+	transfer = CloneTransfer()
+	_prepare(url, abs_path, transfer, branch if single_branch else None)
+
+	options = []
+	if depth != None:
+		options += ["--depth", str(depth)]
+	if filter != None:
+		options += [f"--filter={filter}"]
+
+	borrowed = reference != None and _use_reference(abs_path, reference)
+
+	try:
+		fetch(abs_path, ["origin", f"+refs/heads/{branch}:refs/remotes/origin/{branch}"] + options, transfer, log)
+	except Exception as e:
+		#a definition pinned to a revision may name a branch the remote doesn't have
+		if single_branch or not "couldn't find remote ref" in str(e):
+			raise
+
+	if not single_branch:
+		fetch(abs_path, ["origin", "--tags"] + options, transfer, log)
+
+	if _has_ref(abs_path, f"refs/remotes/origin/{branch}"):
+		_git(abs_path, ["checkout", "--quiet", "--force", "-B", branch, "--track", f"origin/{branch}"])
+		_git(abs_path, ["remote", "set-head", "origin", branch])
+
+	if borrowed:
+		_dissociate(abs_path)
+
+	_finish(abs_path)
+	return transfer
+
+def fetch_revision(url, abs_path, revision, depth = 1, filter = None, log = print):
+	#init + fetch of `revision` (detached, its history down to `depth` commits, all of it for None),
+	#resumable like clone(), returns a CloneTransfer
+	transfer = CloneTransfer()
+	_prepare(url, abs_path, transfer)
+
+	options = []
+	if depth != None:
+		options += ["--depth", str(depth)]
+	if filter != None:
+		options += [f"--filter={filter}"]
+
+	fetch(abs_path, ["origin", revision] + options, transfer, log)
+	_git(abs_path, ["checkout", "--quiet", "--force", "--detach", "FETCH_HEAD"])
+
+	_finish(abs_path)
+	return transfer
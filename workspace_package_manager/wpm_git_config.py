@@ -0,0 +1,475 @@
+import os
+import time
+import threading
+
+#####################################################################################################
+# direct reader/writer for the few git config keys wpm manages (safe.directory, user.name, user.email)
+# values are compared with what's on disk and only the differences are written, in one go,
+# through a `<file>.lock` + rename like git itself does (on the file a symlinked config points to)
+# the global view is what git reads: the xdg file, then ~/.gitconfig (or only $GIT_CONFIG_GLOBAL), with their
+# `include.path` files expanded in place; `includeIf` is not followed, its conditions need a repository and
+# git checks safe.directory before it has one
+# an empty `safe.directory` value clears the list built so far, like in git
+
+class GitConfigError(Exception):
+	pass
+
+def get_global_config_path():
+	path = os.environ.get("GIT_CONFIG_GLOBAL", None)
+	if path != None and path != "":
+		return path
+
+	home = os.path.expanduser("~")
+	path = os.path.join(home, ".gitconfig")
+	if os.path.exists(path):
+		return path
+
+	xdg = os.environ.get("XDG_CONFIG_HOME", None) or os.path.join(home, ".config")
+	xdg_path = os.path.join(xdg, "git", "config")
+	if os.path.exists(xdg_path):
+		return xdg_path
+
+	return path
+
+def get_global_config_paths():
+	#every global file git reads, in reading order; writes go to get_global_config_path()
+	path = os.environ.get("GIT_CONFIG_GLOBAL", None)
+	if path != None and path != "":
+		return [path]
+
+	home = os.path.expanduser("~")
+	xdg = os.environ.get("XDG_CONFIG_HOME", None) or os.path.join(home, ".config")
+	return [os.path.join(xdg, "git", "config"), os.path.join(home, ".gitconfig")]
+
+def get_excludes_file(commondir):
+	#core.excludesFile as git resolves it: repository config over the global files, $XDG_CONFIG_HOME/git/ignore
+	#when unset (empty value included)
+	_, entries = load_config_files(get_global_config_paths() + [os.path.join(commondir, "config")])
+	value = None
+	for _, e in entries:
+		if e.section == "core" and e.subsection == None and e.key == "excludesfile":
+			value = e.value
+
+	if value == None or value == "":
+		xdg = os.environ.get("XDG_CONFIG_HOME", None) or os.path.join(os.path.expanduser("~"), ".config")
+		return os.path.join(xdg, "git", "ignore")
+	return os.path.expanduser(value)
+
+def get_repo_git_dir(repo_path):
+	#handles `.git` files (worktrees, submodules)
+	git_path = os.path.join(repo_path, ".git")
+	if os.path.isfile(git_path):
+		with open(git_path, "r") as f:
+			line = f.readline().strip()
+		if line.startswith("gitdir:"):
+			gitdir = line[len("gitdir:"):].strip()
+			if not os.path.isabs(gitdir):
+				gitdir = os.path.normpath(os.path.join(repo_path, gitdir))
+			return gitdir
+	return git_path
+
+def get_repo_config_path(repo_path):
+	gitdir = get_repo_git_dir(repo_path)
+	#linked worktrees share the main repository config
+	commondir = os.path.join(gitdir, "commondir")
+	if os.path.exists(commondir):
+		with open(commondir, "r") as f:
+			gitdir = os.path.normpath(os.path.join(gitdir, f.read().strip()))
+	return os.path.join(gitdir, "config")
+
+#####################################################################################################
+
+class ConfigEntry():
+	def __init__(self, section, subsection, key, value, line, shared_line):
+		self.section = section
+		self.subsection = subsection
+		self.key = key
+		self.value = value
+		#index of the first physical line of the entry
+		self.line = line
+		#the line also holds a section header or continues over several lines
+		self.shared_line = shared_line
+
+	def name(self):
+		if self.subsection != None:
+			return f"{self.section}.{self.subsection}.{self.key}"
+		return f"{self.section}.{self.key}"
+
+def _parse_value(text):
+	#returns the value with quotes, escapes and trailing comments handled
+	out = ""
+	quoted = False
+	trailing = 0
+	i = 0
+	while i < len(text):
+		c = text[i]
+		i += 1
+		if c == "\\" and i < len(text):
+			out += {"n" : "\n", "t" : "\t", "b" : "\b"}.get(text[i], text[i])
+			trailing = 0
+			i += 1
+			continue
+		if c == '"':
+			quoted = not quoted
+			trailing = 0
+			continue
+		if not quoted and c in "#;":
+			break
+
+		out += c
+		if not quoted and c.isspace():
+			trailing += 1
+		else:
+			trailing = 0
+
+	if trailing:
+		out = out[:-trailing]
+	return out
+
+def _parse_header(text):
+	#`[section]`, `[section "sub"]` or `[section.sub]`, returns (section, subsection, rest of line)
+	end = text.find("]")
+	if end < 0:
+		raise GitConfigError(f"bad section header: {text}")
+
+	inner = text[1:end].strip()
+	rest = text[end + 1:]
+
+	if '"' in inner:
+		section, _, sub = inner.partition(" ")
+		sub = sub.strip()
+		if sub.startswith('"') and sub.endswith('"'):
+			sub = sub[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+		return section.lower(), sub, rest
+
+	section, dot, sub = inner.partition(".")
+	if dot:
+		return section.lower(), sub.lower(), rest
+	return section.lower(), None, rest
+
+def parse_config_lines(lines):
+	#returns [ConfigEntry] for `lines` (text without line endings)
+	entries = []
+	section = None
+	subsection = None
+
+	i = 0
+	while i < len(lines):
+		start = i
+		text = lines[i].strip()
+		i += 1
+		shared = False
+
+		if text.startswith("["):
+			section, subsection, text = _parse_header(text)
+			text = text.strip()
+			shared = True
+
+		if text == "" or text[0] in "#;":
+			continue
+
+		#continuation lines
+		while text.endswith("\\") and not text.endswith("\\\\") and i < len(lines):
+			text = text[:-1] + lines[i]
+			i += 1
+			shared = True
+
+		key, eq, value = text.partition("=")
+		key = key.strip().lower()
+		if eq:
+			value = _parse_value(value.strip())
+		else:
+			value = "true"
+
+		entries.append(ConfigEntry(section, subsection, key, value, start, shared))
+
+	return entries
+
+def quote_value(value):
+	value = str(value)
+	escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\t", "\\t")
+	if escaped != value or value != value.strip() or any(c in value for c in "#; "):
+		return f'"{escaped}"'
+	return value
+
+#####################################################################################################
+
+class ConfigFile():
+	def __init__(self, path):
+		self.path = path
+		self.lines = []
+		self.newline = "\n"
+		self.stamp = None
+		self.load()
+
+	def load(self):
+		self.lines = []
+		self.stamp = None
+		if os.path.exists(self.path):
+			with open(self.path, "r", newline = "") as f:
+				content = f.read()
+			if "\r\n" in content:
+				self.newline = "\r\n"
+			self.lines = content.replace("\r\n", "\n").split("\n")
+			if self.lines and self.lines[-1] == "":
+				self.lines.pop()
+			st = os.stat(self.path)
+			self.stamp = (st.st_mtime_ns, st.st_size)
+		self.entries = parse_config_lines(self.lines)
+
+	def is_current(self):
+		try:
+			st = os.stat(self.path)
+			return self.stamp == (st.st_mtime_ns, st.st_size)
+		except OSError:
+			return self.stamp == None
+
+	def get_all(self, section, key, subsection = None):
+		return [e.value for e in self.entries if e.section == section and e.key == key and e.subsection == subsection]
+
+	def get(self, section, key, subsection = None):
+		values = self.get_all(section, key, subsection)
+		if values:
+			return values[-1]
+		return None
+
+	#######################################################################################################
+
+	def _section_end(self, section, subsection):
+		#line index after the last line of the last matching section, or None
+		end = None
+		current = False
+		for idx, line in enumerate(self.lines):
+			t = line.strip()
+			if t.startswith("["):
+				s, sub, _ = _parse_header(t)
+				current = (s == section and sub == subsection)
+			if current:
+				end = idx + 1
+		return end
+
+	def add_values(self, section, key, values, subsection = None):
+		#appends `values` as new entries (multi-valued keys)
+		if not values:
+			return
+		new_lines = [f"\t{key} = {quote_value(v)}" for v in values]
+		end = self._section_end(section, subsection)
+		if end == None:
+			self.lines.append(_format_header(section, subsection))
+			self.lines.extend(new_lines)
+		else:
+			self.lines[end:end] = new_lines
+		self.entries = parse_config_lines(self.lines)
+
+	def set_value(self, section, key, value, subsection = None):
+		#single-valued key, replaces every previous value
+		matches = [e for e in self.entries if e.section == section and e.key == key and e.subsection == subsection]
+		if len(matches) == 1 and matches[0].shared_line == False:
+			self.lines[matches[0].line] = f"\t{key} = {quote_value(value)}"
+			self.entries = parse_config_lines(self.lines)
+			return
+
+		self.remove_entries(matches)
+		self.add_values(section, key, [value], subsection)
+
+	def remove_entries(self, entries):
+		#entries sharing their line with a header or spanning lines are left alone
+		drop = set([e.line for e in entries if e.shared_line == False])
+		self.lines = [l for idx, l in enumerate(self.lines) if idx not in drop]
+		self.entries = parse_config_lines(self.lines)
+
+	def save(self):
+		#a symlinked config (dotfile managers) is written where it points, the link stays
+		path = os.path.realpath(self.path)
+		lock_path = path + ".lock"
+		folder = os.path.dirname(path)
+		if folder != "":
+			os.makedirs(folder, exist_ok = True)
+
+		fd = None
+		for _ in range(50):
+			try:
+				fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+				break
+			except FileExistsError:
+				time.sleep(0.1)
+		if fd == None:
+			raise GitConfigError(f"could not lock {path} ({lock_path} exists)")
+
+		try:
+			data = self.newline.join(self.lines) + self.newline
+			os.write(fd, data.encode("utf-8"))
+			os.close(fd)
+			fd = None
+			if os.path.exists(path):
+				os.chmod(lock_path, os.stat(path).st_mode & 0o777)
+			os.replace(lock_path, path)
+		finally:
+			if fd != None:
+				os.close(fd)
+			if os.path.exists(lock_path):
+				os.remove(lock_path)
+
+		st = os.stat(self.path)
+		self.stamp = (st.st_mtime_ns, st.st_size)
+
+def _format_header(section, subsection):
+	if subsection == None:
+		return f"[{section}]"
+	escaped = subsection.replace("\\", "\\\\").replace('"', '\\"')
+	return f'[{section} "{escaped}"]'
+
+#####################################################################################################
+
+MAX_INCLUDE_DEPTH = 10
+
+def _include_path(including, value):
+	value = os.path.expanduser(value)
+	if not os.path.isabs(value):
+		value = os.path.join(os.path.dirname(including), value)
+	return value
+
+def load_config_files(paths):
+	#returns ([ConfigFile] read, [(ConfigFile, ConfigEntry)] in the order git sees them, includes expanded)
+	files = []
+	entries = []
+
+	def read(path, depth):
+		if depth > MAX_INCLUDE_DEPTH:
+			raise GitConfigError(f"too many nested includes in {path}")
+		config = ConfigFile(path)
+		files.append(config)
+		for e in config.entries:
+			entries.append((config, e))
+			if _is_include(e) and e.value != "":
+				read(_include_path(path, e.value), depth + 1)
+
+	for p in paths:
+		read(p, 0)
+	return files, entries
+
+def _is_include(entry):
+	return entry.section == "include" and entry.subsection == None and entry.key == "path"
+
+def _is_safe_directory(entry):
+	return entry.section == "safe" and entry.subsection == None and entry.key == "directory"
+
+def get_safe_directories(entries):
+	#the list git ends up with: an empty value drops everything before it
+	values = []
+	for _, e in entries:
+		if _is_safe_directory(e):
+			if e.value == "":
+				values = []
+			else:
+				values.append(e.value)
+	return values
+
+class GitConfigReconciler():
+	#one per process, the global files are parsed once and re-read only if one of them changed on disk
+	def __init__(self, global_path = None):
+		self.global_path = global_path if global_path != None else get_global_config_path()
+		self.read_paths = [global_path] if global_path != None else get_global_config_paths()
+		if not self.global_path in self.read_paths:
+			self.read_paths.append(self.global_path)
+		self.lock = threading.Lock()
+		self._files = None
+		self._entries = None
+
+	def _load(self):
+		#the flattened entries are dropped (`_files = None`) after every write
+		if self._files == None or not all(f.is_current() for f in self._files):
+			self._files, self._entries = load_config_files(self.read_paths)
+
+	def _get_global(self):
+		#the file wpm writes to
+		self._load()
+		for f in self._files:
+			if f.path == self.global_path:
+				return f
+		return ConfigFile(self.global_path)
+
+	def get_safe_directories(self):
+		with self.lock:
+			self._load()
+			return get_safe_directories(self._entries)
+
+	def ensure_safe_directories(self, paths):
+		#adds the missing `safe.directory` entries, returns how many were written
+		with self.lock:
+			self._load()
+			existing = set(get_safe_directories(self._entries))
+			if "*" in existing:
+				return 0
+
+			missing = []
+			for p in paths:
+				if not p in existing and not p in missing:
+					missing.append(p)
+
+			if missing:
+				config = self._get_global()
+				config.add_values("safe", "directory", missing)
+				config.save()
+				self._files = None
+
+			return len(missing)
+
+	def ensure_repo_values(self, repo_path, values):
+		#`values` maps (section, key) to a value (None means leave alone), returns how many changed
+		config = ConfigFile(get_repo_config_path(repo_path))
+
+		changed = 0
+		for (section, key), value in values.items():
+			if value == None:
+				continue
+			if config.get_all(section, key) == [str(value)]:
+				continue
+			config.set_value(section, key, value)
+			changed += 1
+
+		if changed:
+			config.save()
+
+		return changed
+
+	def dedupe_safe_directories(self, dry_run = False):
+		#drops repeated `safe.directory` entries of the written file (first one wins), returns (kept, removed)
+		#a value is only a duplicate of one seen since the last reset (empty value) or include, removing it
+		#never changes what git ends up with
+		with self.lock:
+			config = self._get_global()
+			seen = set()
+			kept = 0
+			duplicates = []
+			for e in config.entries:
+				if _is_include(e):
+					seen = set()
+					continue
+				if not _is_safe_directory(e):
+					continue
+				if e.value == "":
+					seen = set()
+					kept += 1
+				elif e.value in seen and e.shared_line == False:
+					duplicates.append(e)
+				else:
+					seen.add(e.value)
+					kept += 1
+
+			if duplicates and not dry_run:
+				config.remove_entries(duplicates)
+				config.save()
+				self._files = None
+
+			return kept, len(duplicates)
+
+_reconciler = None
+_reconciler_lock = threading.Lock()
+
+def get_reconciler():
+	global _reconciler
+	with _reconciler_lock:
+		if _reconciler == None:
+			_reconciler = GitConfigReconciler()
+	return _reconciler
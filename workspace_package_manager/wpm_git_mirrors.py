@@ -0,0 +1,164 @@
+import os
+import time
+import shutil
+import hashlib
+import subprocess
+from urllib.parse import urlsplit
+
+from . import wpm_internal_utils
+
+#####################################################################################################
+# shared store of bare mirrors, one per normalised clone url:
+#   <root>/<name>-<hash>.git/
+#   <root>/<name>-<hash>.git/wpm-mirror.json   (normalised url, last fetch time)
+# the clone url (it can carry tokens) is only passed on the command line, never written
+# installs clone with `--reference-if-able <mirror> --dissociate` after an incremental fetch
+
+MIRROR_INFO = "wpm-mirror.json"
+
+_refspecs = ["+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*"]
+
+def get_mirror_root():
+	root = os.environ.get("WPM_MIRROR_PATH", None)
+	if root != None and root != "":
+		return root
+
+	cache = os.environ.get("XDG_CACHE_HOME", None)
+	if cache == None or cache == "":
+		cache = os.path.join(os.path.expanduser("~"), ".cache")
+
+	return os.path.join(cache, "wpm", "mirrors")
+
+def mirrors_enabled():
+	return os.environ.get("WPM_USE_MIRRORS", "") not in ("", "0", "false", "no")
+
+def normalize_url(url):
+	#same repository -> same key: no credentials, lowercase host, no trailing `/` or `.git`
+	url = url.strip()
+
+	if "://" not in url:
+		if ":" in url and not os.path.exists(url) and not url.startswith("/"):
+			#scp-like `user@host:path`
+			host, _, path = url.partition(":")
+			host = host.rpartition("@")[2]
+			url = f"ssh://{host}/{path}"
+		else:
+			url = "file://" + os.path.abspath(url)
+
+	parts = urlsplit(url)
+	host = (parts.hostname or "").lower()
+	if parts.port != None:
+		host = f"{host}:{parts.port}"
+
+	path = parts.path.rstrip("/")
+	if path.endswith(".git"):
+		path = path[:-4]
+
+	scheme = parts.scheme.lower()
+	if scheme in ("http", "https", "ssh", "git"):
+		#same repository whatever the transport
+		scheme = "git"
+
+	return f"{scheme}://{host}{path}"
+
+def _folder_size(abs_path):
+	total = 0
+	for root, dirs, files in os.walk(abs_path):
+		for f in files:
+			try:
+				total += os.lstat(os.path.join(root, f)).st_size
+			except OSError:
+				pass
+	return total
+
+class _MirrorLock():
+	#exclusive lock per mirror, concurrent installs of the same url wait for each other
+	def __init__(self, abs_path):
+		self.path = abs_path + ".lock"
+		self.f = None
+
+	def __enter__(self):
+		self.f = open(self.path, "w")
+		try:
+			import fcntl
+			fcntl.flock(self.f, fcntl.LOCK_EX)
+		except ImportError:
+			pass
+		return self
+
+	def __exit__(self, *args):
+		self.f.close()
+		return False
+
+#####################################################################################################
+
+class MirrorInfo():
+	def __init__(self, abs_path):
+		self.path = abs_path
+		self.name = os.path.basename(abs_path)
+
+		data = wpm_internal_utils.read_json_file(os.path.join(abs_path, MIRROR_INFO)) or {}
+		self.url = data.get("url", "?")
+		self.last_fetch = data.get("last-fetch", 0)
+
+	def size(self):
+		return _folder_size(self.path)
+
+class MirrorStore():
+	def __init__(self, root = None):
+		self.root = root if root != None else get_mirror_root()
+
+	def path_for(self, url):
+		key = normalize_url(url)
+		name = key.rstrip("/").rpartition("/")[2] or "repo"
+		digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+		return os.path.join(self.root, f"{name}-{digest}.git")
+
+	def refresh(self, url):
+		#creates or incrementally updates the mirror for `url`, returns its path (None on failure)
+		abs_path = self.path_for(url)
+		os.makedirs(self.root, exist_ok = True)
+
+		with _MirrorLock(abs_path):
+			if not os.path.exists(os.path.join(abs_path, "HEAD")):
+				rc = subprocess.run(["git", "init", "--bare", "--quiet", abs_path]).returncode
+				if rc != 0:
+					return None
+
+			rc = subprocess.run(["git", "fetch", "--quiet", "--prune", "--no-tags", "--", url] + _refspecs, cwd = abs_path).returncode
+			if rc != 0:
+				return None
+
+			wpm_internal_utils.write_json_file(os.path.join(abs_path, MIRROR_INFO), {
+				"url" : normalize_url(url),
+				"last-fetch" : time.time()
+			})
+
+		return abs_path
+
+	def list(self):
+		if not os.path.isdir(self.root):
+			return []
+
+		result = []
+		for name in sorted(os.listdir(self.root)):
+			abs_path = os.path.join(self.root, name)
+			if name.endswith(".git") and os.path.isdir(abs_path):
+				result.append(MirrorInfo(abs_path))
+		return result
+
+	def prune(self, max_age_days):
+		#removes mirrors not fetched in `max_age_days` (all of them for 0), returns what was removed
+		limit = time.time() - max_age_days * 24 * 3600
+		removed = []
+		for m in self.list():
+			if max_age_days > 0 and m.last_fetch >= limit:
+				continue
+
+			with _MirrorLock(m.path):
+				shutil.rmtree(m.path)
+			if os.path.exists(m.path + ".lock"):
+				os.remove(m.path + ".lock")
+			removed.append(m)
+
+		return removed
@@ -0,0 +1,112 @@
+import os
+import re
+import subprocess
+
+from . import wpm_git_config
+
+#####################################################################################################
+# resolves HEAD without GitPython or a git process:
+#  - .git folders and `.git` files (`gitdir: ...`, worktrees and submodules)
+#  - linked worktrees: HEAD and per-worktree refs in the gitdir, branches in the `commondir`
+#  - symbolic refs (HEAD -> refs/heads/x), loose refs first, then packed-refs, detached HEADs
+# layouts it doesn't know (reftable, broken or unexpected files) raise RefError, read_revision asks git then
+
+MAX_SYMREF_DEPTH = 5
+
+_sha = re.compile(r"^[0-9a-f]{40}([0-9a-f]{24})?$")
+
+class RefError(Exception):
+	pass
+
+def get_git_dirs(repo_path):
+	#(gitdir, commondir), they differ for linked worktrees
+	gitdir = wpm_git_config.get_repo_git_dir(repo_path)
+	commondir = gitdir
+	try:
+		with open(os.path.join(gitdir, "commondir"), "r") as f:
+			commondir = os.path.normpath(os.path.join(gitdir, f.read().strip()))
+	except OSError:
+		pass
+	return gitdir, commondir
+
+def _read_file(path):
+	try:
+		with open(path, "r") as f:
+			return f.read().strip()
+	except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+		return None
+	except (OSError, UnicodeDecodeError) as e:
+		raise RefError(f"could not read {path}: {e}")
+
+def _is_worktree_ref(name):
+	#refs git keeps per worktree, everything else is shared
+	return name == "HEAD" or not name.startswith("refs/") or name.startswith("refs/bisect/") or name.startswith("refs/worktree/") or name.startswith("refs/rewritten/")
+
+def _read_packed_ref(commondir, name):
+	path = os.path.join(commondir, "packed-refs")
+	try:
+		f = open(path, "r")
+	except FileNotFoundError:
+		return None
+	except OSError as e:
+		raise RefError(f"could not read {path}: {e}")
+
+	#lines: `# pack-refs with: ...`, `<sha> <name>` and `^<sha>` (peeled tag, skipped)
+	suffix = " " + name
+	with f:
+		for line in f:
+			line = line.rstrip("\n")
+			if line.endswith(suffix) and not line.startswith("#") and not line.startswith("^"):
+				sha = line[:-len(suffix)]
+				if _sha.match(sha) == None:
+					raise RefError(f"unexpected packed-refs line in {path}")
+				return sha
+	return None
+
+def resolve_ref(gitdir, commondir, name):
+	#returns (branch ref or None when detached, sha or None when the ref doesn't exist yet)
+	branch = None
+	for _ in range(MAX_SYMREF_DEPTH):
+		folder = gitdir if _is_worktree_ref(name) else commondir
+		value = _read_file(os.path.join(folder, name))
+		if value == None:
+			if name == "HEAD":
+				raise RefError(f"missing HEAD in {gitdir}")
+			return branch, _read_packed_ref(commondir, name)
+
+		if value.startswith("ref:"):
+			name = value[4:].strip()
+			branch = name
+			continue
+
+		if _sha.match(value) == None:
+			raise RefError(f"unexpected content in {os.path.join(folder, name)}")
+		return branch, value
+
+	raise RefError(f"symbolic refs nested too deep in {gitdir}")
+
+def read_head(repo_path):
+	#(branch ref or None when detached, sha or None for an unborn branch)
+	gitdir, commondir = get_git_dirs(repo_path)
+	if not os.path.isdir(gitdir):
+		raise RefError(f"{repo_path} is not a git repository")
+	if os.path.isdir(os.path.join(commondir, "reftable")):
+		raise RefError(f"{repo_path} uses reftable")
+	return resolve_ref(gitdir, commondir, "HEAD")
+
+def read_revision(repo_path):
+	#HEAD sha of the repository at `repo_path`, None when there are no commits
+	if not os.path.exists(os.path.join(repo_path, ".git")):
+		#git would find an enclosing repository
+		raise Exception(f"{repo_path} is not a git repository")
+	try:
+		_, sha = read_head(repo_path)
+		return sha
+	except RefError:
+		pass
+
+	p = subprocess.run(["git", "--no-optional-locks", "rev-parse", "--verify", "--quiet", "HEAD"], cwd = repo_path,
+		stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, text = True)
+	if p.returncode != 0:
+		return None
+	return p.stdout.strip()
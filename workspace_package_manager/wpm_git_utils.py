@@ -2,90 +2,162 @@
 
 import os
 import sys
-import requests
+import time
+import subprocess
 from . import wpm_internal_utils
+from . import wpm_trace
 
-import git
+#`git` (GitPython) and `requests` are slow to import, they are imported by the functions using them
 
 # stupid git problems:
 # https://stackoverflow.com/questions/34820975/git-clone-redirect-stderr-to-stdout-but-keep-errors-being-written-to-stderr
 # https://mirrors.edge.kernel.org/pub/software/scm/git/docs/git-clone.html
 
 def download_github_repository(destination_path, zipurl, token, branch_name):
+	from . import wpm_download_utils
+
 	headers = {
 		"Authorization": f"token {token}",
 		"Accept": "application/vnd.github.v3+json"
 	}
 
-	response = requests.get(zipurl, headers=headers)
-	if response.status_code != 200:
-		print(f"Failed to download {zipurl}")
-		return
+	try:
+		downloaded, extracted = wpm_download_utils.download_and_extract_zip(zipurl, destination_path, headers, strip_root = True)
+	except Exception as e:
+		print(f"Failed to download {zipurl}: {e}")
+		return False
 
-	with zipfile.ZipFile(io.BytesIO(response.content)) as z:
-		for member in z.infolist():
-			if member.is_dir():
-				continue
-			file_path = os.path.join(destination_path, os.path.relpath(member.filename, member.filename.split('/')[0]))
-			print(f"extracting: {file_path}")
-			os.makedirs(os.path.dirname(file_path), exist_ok=True)
-			zf = z.open(member, 'r')
-			of = open(file_path, 'wb')
-			shutil.copyfileobj(zf, of)
-			zf.close()
-			of.close()
+	print(f"downloaded {downloaded.describe()}, extracted {extracted.describe()}")
+	return True
 
 def get_current_revision(repo_path):
-	repo = git.Repo(repo_path)
-	current_commit = repo.head.commit
-	return current_commit.hexsha
+	from . import wpm_git_refs
+	return wpm_git_refs.read_revision(repo_path)
+
+
+def read_git_porcelain_status(abs_path, fast = False):
+	#branch, HEAD sha, ahead/behind and dirtiness from `git status --porcelain=v2 --branch`
+	#tracked files are checked first with -uno (no untracked walk), the untracked walk only runs when they are clean
+	#`fast`: ahead/behind are not counted (walking the history can be slow), both come back as None
+	options = ["--branch", "--untracked-files=no"]
+	if fast:
+		options.append("--no-ahead-behind")
+	with wpm_trace.span("git status", "git", cwd = abs_path):
+		branch, current_hash, dirty, ahead, behind = _read_git_porcelain_status(abs_path, options)
+		if not dirty:
+			dirty = _read_git_porcelain_status(abs_path, ["--untracked-files=normal"])[2]
+		return branch, current_hash, dirty, ahead, behind
+
+def _read_git_porcelain_status(abs_path, options):
+	#headers come first, reading stops at the first entry line (dirty) without listing the rest
+	cmd = ["git", "--no-optional-locks", "status", "--porcelain=v2"] + options
+
+	branch = None
+	current_hash = None
+	ahead = None
+	behind = None
+	dirty = False
+
+	p = subprocess.Popen(cmd, cwd = abs_path, stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, text = True)
+	try:
+		for line in p.stdout:
+			if not line.startswith("# "):
+				dirty = True
+				break
+
+			key, _, value = line[2:].rstrip("\n").partition(" ")
+			if key == "branch.oid":
+				current_hash = "" if value == "(initial)" else value
+			elif key == "branch.head":
+				branch = "HEAD" if value == "(detached)" else value
+			#`+? -?` with --no-ahead-behind
+			elif key == "branch.ab" and not "?" in value:
+				a, b = value.split(" ")
+				ahead = int(a.lstrip("+"))
+				behind = int(b.lstrip("-"))
+	finally:
+		if dirty:
+			p.kill()
+		p.stdout.close()
+		p.wait()
+
+	if branch == None:
+		branch = ""
+	if current_hash == None:
+		current_hash = ""
+
+	return branch, current_hash, dirty, ahead, behind
+
+def format_git_delta(ahead, behind):
+	delta_msg = []
 
+	if ahead:
+		delta_msg.append("ahead:" + str(ahead))
+	if behind:
+		delta_msg.append("behind:" + str(behind))
 
-def get_git_delta_cwd(branch, abs_path):
-	delta = wpm_internal_utils.run_silent_command("git rev-list --left-right --count " + branch + "...origin/" + branch, abs_path).replace("\n", "").replace("\t"," ")
-	delta = [x for x in delta.split(" ") if x != ""]
+	return "/".join(delta_msg)
 
-	delta_msg = []
+FETCH_OK = "ok"
+FETCH_TIMEOUT = "timeout"
+FETCH_FAILED = "failed"
 
-	if delta:
-		if delta[0] != "0":
-			delta_msg.append("ahead:" + delta[0])
-		if delta[1] != "0":
-			delta_msg.append("behind:" + delta[1])
+def fetch_remotes(abs_path, timeout = None):
+	#`git remote update` bounded by `timeout` seconds, returns FETCH_OK, FETCH_TIMEOUT or FETCH_FAILED
+	env = dict(os.environ)
+	#never wait on a credential prompt
+	env["GIT_TERMINAL_PROMPT"] = "0"
 
-	if delta_msg:
-		delta_msg = "/".join(delta_msg)
-	else:
-		delta_msg = ""
+	with wpm_trace.span("git remote update", "git", cwd = abs_path) as span:
+		state = _fetch_remotes(abs_path, env, timeout)
+		span.set(state = state)
+	return state
 
-	return delta_msg
+def _fetch_remotes(abs_path, env, timeout):
+	p = subprocess.Popen(["git", "remote", "update"], cwd = abs_path, env = env,
+		stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, start_new_session = True)
+	try:
+		rc = p.wait(timeout = timeout)
+	except subprocess.TimeoutExpired:
+		#also stop the transport helpers git started
+		try:
+			import signal
+			os.killpg(p.pid, signal.SIGKILL)
+		except (AttributeError, ImportError, OSError):
+			p.kill()
+		p.wait()
+		return FETCH_TIMEOUT
 
-def get_git_status_internal(abs_path, fast):
+	if rc != 0:
+		return FETCH_FAILED
+	return FETCH_OK
 
-	if fast == False:
-		wpm_internal_utils.run_silent_command("git remote update", abs_path)
+def get_git_status_internal(abs_path, fast, fetch_state = None):
+	#`fetch_state` is the result of an earlier fetch_remotes, None fetches here
 
-	branch = wpm_internal_utils.run_silent_command("git rev-parse --abbrev-ref --symbolic-full-name HEAD", abs_path).replace("\n","")
-	dirty = wpm_internal_utils.run_silent_command("git status --short", abs_path).replace(" ","").replace("\n","").replace("\t","")
+	if fast == False and fetch_state == None:
+		fetch_remotes(abs_path)
 
-	if fast == True:
-		return branch, None, dirty, None
+	branch, current_hash, dirty, ahead, behind = read_git_porcelain_status(abs_path, fast)
 
-	current_hash = wpm_internal_utils.run_silent_command("git rev-parse HEAD 2> /dev/null | head -c 64", abs_path).replace("\n","")
+	if fast == True:
+		return branch, None, dirty, None, None, None
 
 	if branch == "HEAD":
-		return branch, current_hash, dirty, ""
-	
-	delta = get_git_delta_cwd(branch, abs_path);
+		return branch, current_hash, dirty, "", None, None
 
-	return branch, current_hash, dirty, delta
+	return branch, current_hash, dirty, format_git_delta(ahead, behind), ahead, behind
 
-def get_git_status(git_model, install_path, fast):
-	branch, git_hash, dirty, delta = get_git_status_internal(install_path, fast)
+def get_git_status(git_model, install_path, fast, fetch_state = None):
+	branch, git_hash, dirty, delta, ahead, behind = get_git_status_internal(install_path, fast, fetch_state)
 
 	status = wpm_internal_utils.PackageStatusMessage()
+	status.branch = branch
+	status.hash = git_hash
+	status.ahead = ahead
+	status.behind = behind
 
-	if dirty != "":
+	if dirty:
 		# has local changes (uncommited)
 		status.marker = "*"
 		status.status = "DIRTY"
@@ -100,7 +172,7 @@ def get_git_status(git_model, install_path, fast):
 		status.info = f"git:{branch}"
 
 	if fast == False:
-		if dirty != "":
+		if dirty:
 			status.info = f"{status.info} ({git_hash}) {delta}"
 		elif delta != "":
 			status.info = f"{status.info} ({git_hash}) {delta}"
@@ -108,69 +180,209 @@ def get_git_status(git_model, install_path, fast):
 		else:
 			status.info = f"{status.info} ({git_hash})"
 
+		if fetch_state != None and fetch_state != FETCH_OK:
+			#ahead/behind are relative to whatever was fetched last time
+			status.stale = True
+			status.info = f"{status.info} (stale: fetch {fetch_state})"
+			if status.status == "ok":
+				status.status = "stale"
+
 	return status
 
 
 def refresh_git(entry, fast, workspace):
 	#first add as safe directory
-
-	#wpm_internal_utils.run_silent_command("git config --global --add safe.directory " + abs_path, workspace)
-	command = ""		
-	command += git_add_safe_command(workspace, entry)
-	command += git_user_command(workspace, entry)
-
-	rc = wpm_internal_utils.run_command_and_wait(command, workspace, True)
-	if rc != 0:
-		raise Exception(f"Failed to refresh {entry.name}")
+	try:
+		reconcile_git_config(workspace, entry)
+	except Exception as e:
+		raise Exception(f"Failed to refresh {entry.name}: {e}")
 
 	if fast == True:
 		return
 
 	#second revert empty file changes
-	from git import Repo
-
 	abs_path = entry.get_install_path(workspace)
-	repo = Repo(abs_path)
-
-	if repo.bare:
+	if not os.path.exists(os.path.join(abs_path, ".git")):
 		return
 
-	def check_for_empty_changes(file_path):
-		diffs = repo.git.diff('HEAD', file_path)
-		if ("new mode" in diffs or "old mode" in diffs):
-			for line in diffs.split('\n'):
-				if(line.startswith('+') or line.startswith('-')):
-					return False
-			return True
+	start = time.time()
+	modified, paths = find_mode_only_changes(abs_path)
+	if paths:
+		revert_paths(abs_path, paths)
 
-		return False
+	print(f"    {len(paths)} mode-only of {modified} modified files reverted ({time.time() - start:.3f} sec)")
 
-	for item in repo.index.diff(None):
-		if item.change_type != 'M':
-			continue
+#####################################################################################################
 
-		if check_for_empty_changes(item.a_path):
-			print(f"Fixing '{item.a_path}'")
-			repo.git.checkout('--', item.a_path)
+REVERT_CHUNK_PATHS = 512
+REVERT_CHUNK_BYTES = 64 * 1024
 
-def git_add_safe_command(workspace, entry):
-	path = entry.get_install_path(workspace);
+def _run_git(abs_path, args, input = None):
+	with wpm_trace.span("git", "git", cmd = " ".join(args[:8]), cwd = abs_path):
+		p = subprocess.run(["git", "--no-optional-locks"] + args, cwd = abs_path, input = input,
+			stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+	if p.returncode != 0:
+		command = next((a for a in args if not a.startswith("-")), args[0])
+		raise Exception(f"git {command} failed in {abs_path}: {p.stderr.decode('utf-8', 'replace').strip()}")
+	return p.stdout
 
-	command = f"git config --global --add safe.directory {path};"
+def list_untracked_dirs(abs_path):
+	#untracked folders git doesn't ignore, including empty ones and ones holding only ignored files
+	out = _run_git(abs_path, ["ls-files", "-z", "--others", "--exclude-standard", "--directory"])
+	entries = out.decode("utf-8", "surrogateescape").split("\0")
+	return [e.rstrip("/") for e in entries if e.endswith("/")]
 
-	return command
+def _git_succeeds(abs_path, args):
+	return subprocess.run(["git", "--no-optional-locks"] + args, cwd = abs_path,
+		stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL).returncode == 0
 
-def git_user_command(workspace, entry):
-	path = entry.get_install_path(workspace);
+def has_commit(abs_path, sha):
+	return _git_succeeds(abs_path, ["cat-file", "-e", f"{sha}^{{commit}}"])
 
-	command = f"cd {path};"
-	model = entry.model
-	if model.user_name != None:
-		command += f"cd {path};git config --local user.name \"{model.user_name}\";"
-	if model.user_email != None:
-		command += f"cd {path};git config --local user.email \"{model.user_email}\";"
+def get_branch_revision(abs_path, branch):
+	#sha of the local `branch`, None if there's no such branch
+	try:
+		return _run_git(abs_path, ["rev-parse", "--verify", "--quiet", f"refs/heads/{branch}"]).decode("utf-8").strip()
+	except Exception:
+		return None
 
-	return command
+def is_on_remote(abs_path, sha):
+	#True if a remote-tracking branch contains `sha` (as of the last fetch)
+	try:
+		return _run_git(abs_path, ["branch", "-r", "--contains", sha]).strip() != b""
+	except Exception:
+		return False
+
+def set_upstream(abs_path, branch):
+	#`branch` tracks origin/<branch>, also before anything was fetched from it
+	_run_git(abs_path, ["config", f"branch.{branch}.remote", "origin"])
+	_run_git(abs_path, ["config", f"branch.{branch}.merge", f"refs/heads/{branch}"])
+
+def fetch_commit(abs_path, sha, branch = None, log = print):
+	#brings `sha` into the repository, fetching as little as the remote allows:
+	#the locked branch first (keeps origin/<branch> current), then the commit alone, then every branch
+	#returns the wpm_git_clone.CloneTransfer
+	from . import wpm_git_clone
+
+	options = []
+	if os.path.exists(os.path.join(abs_path, ".git", "shallow")):
+		options = ["--depth", "1"]
+
+	attempts = []
+	if branch != None and branch != "HEAD":
+		attempts.append(["origin", f"+refs/heads/{branch}:refs/remotes/origin/{branch}"])
+	#servers without uploadpack.allowReachableSHA1InWant refuse this one
+	attempts.append(["origin", sha] + options)
+	attempts.append(["origin"])
+
+	transfer = wpm_git_clone.CloneTransfer()
+	for args in attempts:
+		try:
+			wpm_git_clone.fetch(abs_path, args, transfer, log)
+		except Exception:
+			continue
+		if has_commit(abs_path, sha):
+			return transfer
+
+	raise Exception(f"revision {sha} not found on origin")
+
+def checkout_revision(abs_path, sha, branch, force = False):
+	#puts `sha` in the worktree keeping `branch` checked out when no local commit would be lost
+	#returns what was checked out
+	f = ["--force"] if force else []
+	if branch == None or branch == "HEAD":
+		_run_git(abs_path, ["checkout", "--quiet"] + f + ["--detach", sha])
+		return "detached"
+
+	tip = get_branch_revision(abs_path, branch)
+	if tip == None:
+		_run_git(abs_path, ["checkout", "--quiet"] + f + ["-b", branch, sha])
+		return f"{branch} (new)"
+	if tip == sha:
+		_run_git(abs_path, ["checkout", "--quiet"] + f + [branch])
+		return branch
+	if _git_succeeds(abs_path, ["merge-base", "--is-ancestor", tip, sha]):
+		_run_git(abs_path, ["checkout", "--quiet"] + f + ["-B", branch, sha])
+		return f"{branch} (fast-forward)"
+	if _git_succeeds(abs_path, ["merge-base", "--is-ancestor", tip, f"refs/remotes/origin/{branch}"]):
+		#everything on the branch is also on origin, moving it back loses nothing
+		_run_git(abs_path, ["checkout", "--quiet"] + f + ["-B", branch, sha])
+		return f"{branch} (reset)"
+
+	#local commits on the branch that the lock doesn't have
+	_run_git(abs_path, ["checkout", "--quiet"] + f + ["--detach", sha])
+	return f"detached, local {branch} differs"
+
+def find_mode_only_changes(abs_path):
+	#one `git diff --raw --numstat -z` pass over the worktree (against the index)
+	#returns (number of modified files, [paths where only the file mode changed])
+	out = _run_git(abs_path, ["diff", "--raw", "--numstat", "-z", "--no-renames", "--no-abbrev", "--no-ext-diff"])
+	tokens = out.decode("utf-8", "surrogateescape").split("\0")
+
+	raw = {}
+	i = 0
+	while i < len(tokens) and tokens[i].startswith(":"):
+		old_mode, new_mode, old_sha, _, change = tokens[i][1:].split(" ")
+		raw[tokens[i + 1]] = (old_mode, new_mode, old_sha, change)
+		i += 2
+
+	candidates = []
+	binary = []
+	for t in tokens[i:]:
+		if t == "":
+			continue
+		added, deleted, path = t.split("\t", 2)
+		old_mode, new_mode, old_sha, change = raw.get(path, (None, None, None, None))
+		if change != "M" or old_mode == new_mode:
+			continue
+		if not old_mode.startswith("100") or not new_mode.startswith("100"):
+			#symlinks and submodules are never touched
+			continue
+
+		if added == "0" and deleted == "0":
+			candidates.append(path)
+		elif added == "-":
+			#binary, compare the blob ids instead
+			binary.append((path, old_sha))
+
+	if binary:
+		data = "\n".join([b[0] for b in binary]).encode("utf-8", "surrogateescape") + b"\n"
+		shas = _run_git(abs_path, ["hash-object", "--stdin-paths"], data).decode("ascii").split()
+		for (path, old_sha), sha in zip(binary, shas):
+			if sha == old_sha:
+				candidates.append(path)
+
+	return len(raw), sorted(candidates)
+
+def revert_paths(abs_path, paths):
+	#`git checkout -- <paths>` in chunks that stay well below the command line limit
+	chunk = []
+	size = 0
+	for path in paths:
+		if chunk and (len(chunk) >= REVERT_CHUNK_PATHS or size + len(path) > REVERT_CHUNK_BYTES):
+			_run_git(abs_path, ["--literal-pathspecs", "checkout", "--"] + chunk)
+			chunk = []
+			size = 0
+		chunk.append(path)
+		size += len(path) + 1
+
+	if chunk:
+		_run_git(abs_path, ["--literal-pathspecs", "checkout", "--"] + chunk)
+
+def reconcile_git_config(workspace, entry):
+	#safe.directory and the local user are written straight into the config files, only when missing
+	from . import wpm_git_config
+
+	path = entry.get_install_path(workspace)
+	reconciler = wpm_git_config.get_reconciler()
+	reconciler.ensure_safe_directories([path])
+
+	model = getattr(entry, "model", None)
+	if model != None:
+		reconciler.ensure_repo_values(path, {
+			("user", "name") : model.user_name,
+			("user", "email") : model.user_email
+		})
 
 def git_update_command(workspace, entry):
 	path = entry.get_install_path(workspace);
@@ -182,6 +394,10 @@ def git_update_command(workspace, entry):
 def git_fetch_and_checkout_command(workspace, entry):
 	path = entry.get_install_path(workspace);
 
+	if os.path.exists(os.path.join(path, ".git", "shallow")):
+		#shallow clones only ever get the pinned commit
+		return f"cd {path}; git fetch --depth 1 origin {entry.model.locked}; git checkout --detach FETCH_HEAD;"
+
 	command = f"cd {path}; git fetch; git checkout {entry.model.locked};"
 
 	return command
@@ -206,13 +422,7 @@ def install_bucket(url, abspath, folder):
 		if model.locked != None:
 			branch = model.locked
 		
-		command = ""		
-		command += git_add_safe_command(workspace, entry)
-		command += git_user_command(workspace, entry)
-	
-		rc = wpm_internal_utils.run_command_and_wait(command, workspace, True)
-		if rc != 0:
-			return False
+		reconcile_git_config(workspace, entry)
 
 		repo.git.checkout(branch)
 
@@ -226,42 +436,81 @@ def install_bucket(url, abspath, folder):
 		return false
 
 
-def install_git_entry(workspace, entry):
+def _fetch_single_revision(url, abs_path, revision, strategy):
+	#init + fetch of exactly `revision` (a pinned `locked`), no other branch or tag is downloaded
+	#returns (repo, wpm_git_clone.CloneTransfer)
 	from git import Repo
+	from . import wpm_git_clone
+
+	#a filter alone keeps the history of the revision (without blobs/trees), otherwise only the commit itself
+	depth = strategy.depth
+	if depth == None and strategy.filter == None:
+		depth = 1
+	transfer = wpm_git_clone.fetch_revision(url, abs_path, revision, depth, strategy.filter)
+
+	return Repo(abs_path), transfer
+
+def _clone(url, abs_path, model, strategy):
+	#returns (repo, wpm_git_clone.CloneTransfer), picks up a partial clone left in `abs_path`
+	from git import Repo
+	from . import wpm_git_clone
+
+	reference = None
+	if strategy.mirror == True:
+		from . import wpm_git_mirrors
+
+		start = time.time()
+		mirror = wpm_git_mirrors.MirrorStore().refresh(url)
+		if mirror != None:
+			print(f"   mirror: {mirror} ({wpm_internal_utils.compute_duration(start)})")
+			reference = mirror
+		else:
+			print(f"   mirror: refresh failed, cloning from {url}")
+
+	transfer = wpm_git_clone.clone(url, abs_path, model.active_branch, strategy.depth, strategy.filter,
+		strategy.single_branch == True, reference)
+
+	return Repo(abs_path), transfer
+
+def install_git_entry(workspace, entry, options = None):
 	from git.exc import GitCommandError
 
 	model = entry.model
 	url = entry.get_clone_url()
 	install_folder = entry.get_install_parent_folder(workspace)
+	strategy = model.get_clone_strategy(options)
 	
 	if not os.path.exists(install_folder):
 		os.makedirs(install_folder)
 
 	try:
 		tdir = os.path.join(install_folder, entry.name)
-		repo = Repo.clone_from(url, os.path.join(install_folder, entry.name))
 
 		# Check out the specified branch
 		branch = model.active_branch
 		if model.locked != None:
 			branch = model.locked
 
-		command = ""		
-		command += git_add_safe_command(workspace, entry)
-		command += git_user_command(workspace, entry)
-	
-		rc = wpm_internal_utils.run_command_and_wait(command, workspace, True)
-		if rc != 0:
-			return False
+		if model.locked != None and strategy.is_partial():
+			repo, transfer = _fetch_single_revision(url, tdir, model.locked, strategy)
+			branch = None
+		else:
+			repo, transfer = _clone(url, tdir, model, strategy)
 
-		repo.git.checkout(branch)
+		entry.transfer = transfer
+		print(f"   received {transfer.describe()}")
+
+		reconcile_git_config(workspace, entry)
+
+		if branch != None:
+			repo.git.checkout(branch)
 
 		return True
 	except GitCommandError as e:
 		print(f"Error cloning repository: {e}")
 		return False
 
-	except Exception as ex:
+	except Exception as e:
 		print(f"Error:{e}")
 		return False
 
@@ -272,24 +521,43 @@ def get_installed_revision(workspace, entry):
 
 	return get_current_revision(install_folder)
 
-def get_remote_revision(branch, entry):
-	url = entry.get_clone_url()
-	
-	result = wpm_internal_utils.run_silent_command(f"git ls-remote {url}", ".").replace("\r\n","\n")
+def get_remote_ref(branch):
+	if branch.startswith("refs/") or branch == "HEAD":
+		return branch
+	return "refs/heads/" + branch
 
-	lines = result.split("\n")
-	for line in lines:
-		line = line.strip()
-		if line.endswith(branch):
-			return line.split("\t")[0].strip()
+def ls_remote_ref(url, ref, timeout = None):
+	#asks the remote for `ref` only, returns the sha or None
+	cmd = ["git", "ls-remote", "--", url, ref]
+	try:
+		with wpm_trace.span("git ls-remote", "git", url = url, ref = ref):
+			p = subprocess.run(cmd, stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, text = True, timeout = timeout)
+	except subprocess.TimeoutExpired:
+		return None
+
+	if p.returncode != 0:
+		return None
+
+	for line in p.stdout.splitlines():
+		sha, _, name = line.strip().partition("\t")
+		if name == ref:
+			return sha
 
 	return None
 
+def get_remote_revision(branch, entry):
+	url = entry.get_clone_url()
+
+	return ls_remote_ref(url, get_remote_ref(branch))
+
 def update_git_entry(workspace, entry):
-	command = ""		
-	command += git_add_safe_command(workspace, entry)
-	command += git_user_command(workspace, entry)
-	
+	try:
+		reconcile_git_config(workspace, entry)
+	except Exception as e:
+		print(f"Failed to update git config for {entry.name}: {e}")
+		return False
+
+	command = ""
 	if entry.model.locked != None and entry.model.locked != "":
 		command += git_fetch_and_checkout_command(workspace, entry)
 	else:
@@ -2,15 +2,20 @@
 import os
 import sys
 import time
+import json
 import shutil
 import subprocess
 
+from . import wpm_trace
+
 def run_command_and_wait(cmd, _cwd, _shell=False):
 	sys.stdout.flush()
 
 	#print(cmd)
 
-	e = subprocess.run(cmd, cwd = _cwd, capture_output=True, shell=_shell)
+	with wpm_trace.span("subprocess", "process", cmd = str(cmd), cwd = str(_cwd)) as span:
+		e = subprocess.run(cmd, cwd = _cwd, capture_output=True, shell=_shell)
+		span.set(returncode = e.returncode)
 	stderr = e.stderr.decode("utf-8").strip()
 	stdout = e.stdout.decode("utf-8").strip()
 
@@ -31,7 +36,9 @@ def run_command_in_active_terminal(cmd, _cwd):
 
 def run_silent_command(cmd, _cwd):
 	#p = subprocess.Popen([cmd], cwd = _cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-	p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=_cwd, text=True, shell=True)
+	with wpm_trace.span("subprocess", "process", cmd = str(cmd), cwd = str(_cwd)) as span:
+		p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=_cwd, text=True, shell=True)
+		span.set(returncode = p.returncode)
 	return p.stdout
 
 def actually_remove_folder(path):
@@ -49,13 +56,43 @@ def actually_remove_folder(path):
 		time.sleep(0.1)
 		itr = itr + 1
 
+def read_json_file(path):
+	#returns None if the file is missing or unreadable
+	try:
+		with open(path, "r") as f:
+			return json.load(f)
+	except:
+		return None
+
+def write_json_file(path, data, indent = None):
+	#write to a temporary file and swap it in, readers never see a partial file
+	folder = os.path.dirname(path)
+	if folder != "":
+		os.makedirs(folder, exist_ok = True)
+
+	tmp_path = f"{path}.{os.getpid()}.tmp"
+	try:
+		with open(tmp_path, "w") as f:
+			json.dump(data, f, indent = indent, sort_keys = indent != None)
+		os.replace(tmp_path, path)
+	finally:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+
 class PackageStatusMessage():
 	def __init__(self):
 		self.marker = " "
 		self.status = ""
 		self.info = ""
 
+		self.branch = None
+		self.hash = None
+		self.ahead = None
+		self.behind = None
+
 		self.updatable = False
+		#remote data could not be refreshed (fetch timed out or failed)
+		self.stale = False
 
 def ReadSecret(promptText):
 	try:
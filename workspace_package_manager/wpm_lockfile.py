@@ -0,0 +1,153 @@
+import os
+import concurrent.futures
+
+from . import wpm_internal_utils
+from . import wpm_git_utils
+from . import wpm_trace
+
+#####################################################################################################
+# workspace lockfile (<workspace>/.wpm/lock.json by default):
+#  - `wpm lock` records the checked out revision (and branch) of every installed package, a revision with
+#    local changes on top or on no remote branch (nobody else could fetch it) is refused unless forced
+#  - `wpm sync` brings the workspace back to it: packages already at their revision are not touched, the
+#    others are fetched (only the locked commit when the remote allows it) and checked out, in parallel;
+#    missing git packages are cloned straight at their revision
+# only git packages have revisions to sync, the other classes are recorded so a missing one gets installed
+
+LOCK_VERSION = 1
+
+def get_lock_path(workspace):
+	return os.path.join(workspace, ".wpm", "lock.json")
+
+def _is_git(package):
+	return package.get_classname() == "git"
+
+def _lock_entry(workspace, package):
+	#returns (entry, [reasons the revision can't be reproduced elsewhere])
+	entry = {"class" : package.get_classname()}
+	problems = []
+	ipath = package.get_install_path(workspace)
+	if _is_git(package):
+		branch, sha, dirty, _, _ = wpm_git_utils.read_git_porcelain_status(ipath, True)
+		if sha == "":
+			raise Exception(f"{package.name} has no commits")
+		entry["revision"] = sha
+		entry["branch"] = branch if branch != "HEAD" else None
+		if dirty:
+			problems.append("local changes")
+		#a definition pinned to the revision was fetched from the remote by it, no branch to look for
+		if package.model.locked != sha and not wpm_git_utils.is_on_remote(ipath, sha):
+			problems.append(f"{sha[:12]} is on no remote branch (push it, or fetch if it was pushed)")
+	else:
+		rev = package.get_installed_revision(workspace)
+		if rev != None:
+			entry["revision"] = rev
+	return entry, problems
+
+def create_lock(workspace, packages, jobs = 8):
+	#returns (lock data for the installed `packages`, {name : [problems]} for the ones that can't be reproduced)
+	installed = [p for p in packages if os.path.exists(p.get_install_path(workspace))]
+	with concurrent.futures.ThreadPoolExecutor(max(1, jobs)) as executor:
+		entries = list(executor.map(lambda p: _lock_entry(workspace, p), installed))
+	data = {
+		"version" : LOCK_VERSION,
+		"packages" : {p.name : e for p, (e, _) in zip(installed, entries)}
+	}
+	return data, {p.name : problems for p, (_, problems) in zip(installed, entries) if problems}
+
+def write_lock(path, data):
+	#meant to be committed, one entry per line keeps diffs readable
+	wpm_internal_utils.write_json_file(path, data, 2)
+
+def read_lock(path):
+	data = wpm_internal_utils.read_json_file(path)
+	if data == None:
+		raise Exception(f"Could not read lockfile {path}, create it with `wpm lock`")
+	if data.get("version", None) != LOCK_VERSION:
+		raise Exception(f"Unsupported lockfile version in {path}")
+	return data.get("packages", {})
+
+#####################################################################################################
+
+class SyncResult():
+	def __init__(self, name):
+		self.name = name
+		#unchanged, synced, installed, skipped or failed
+		self.state = "unchanged"
+		self.info = ""
+		#wpm_git_clone.CloneTransfer when commits had to be fetched
+		self.transfer = None
+
+def _sync_one(workspace, package, entry, force, log):
+	result = SyncResult(package.name)
+	sha = entry.get("revision", None)
+	if not _is_git(package) or sha == None:
+		return result
+
+	ipath = package.get_install_path(workspace)
+	with wpm_trace.span("sync", "package", name = package.name) as s:
+		try:
+			_, current, dirty, _, _ = wpm_git_utils.read_git_porcelain_status(ipath, True)
+			if current == sha:
+				return result
+
+			if dirty and not force:
+				result.state = "skipped"
+				result.info = "local changes, use --force to discard them"
+				return result
+
+			if not wpm_git_utils.has_commit(ipath, sha):
+				result.transfer = wpm_git_utils.fetch_commit(ipath, sha, entry.get("branch", None), log)
+				s.set(bytes = result.transfer.size)
+
+			result.info = wpm_git_utils.checkout_revision(ipath, sha, entry.get("branch", None), force)
+			result.state = "synced"
+		except Exception as e:
+			result.state = "failed"
+			result.info = str(e)
+		s.set(state = result.state)
+	return result
+
+def _install_one(workspace, package, entry, log):
+	from . import wpm_git_clone
+
+	result = SyncResult(package.name)
+	sha = entry["revision"]
+	branch = entry.get("branch", None)
+	ipath = package.get_install_path(workspace)
+	with wpm_trace.span("sync install", "package", name = package.name) as s:
+		try:
+			os.makedirs(os.path.dirname(ipath), exist_ok = True)
+			#the whole history of the revision, then the branch it was locked on (mostly the same objects)
+			result.transfer = wpm_git_clone.fetch_revision(package.get_clone_url(), ipath, sha, None, None, log)
+			if branch != None:
+				try:
+					wpm_git_clone.fetch(ipath, ["origin", f"+refs/heads/{branch}:refs/remotes/origin/{branch}"], result.transfer, log)
+				except Exception:
+					#gone from the remote, the revision is still there
+					pass
+			wpm_git_utils.reconcile_git_config(workspace, package)
+			result.info = wpm_git_utils.checkout_revision(ipath, sha, branch)
+			if branch != None:
+				wpm_git_utils.set_upstream(ipath, branch)
+			result.state = "installed"
+			s.set(bytes = result.transfer.size)
+		except Exception as e:
+			result.state = "failed"
+			result.info = str(e)
+		s.set(state = result.state)
+	return result
+
+def can_install_locked(package, entry):
+	return _is_git(package) and entry.get("revision", None) != None
+
+def install_packages(workspace, targets, jobs = 8, log = print):
+	#clones the missing git packages of `targets` (list of (package, lock entry)) at their locked revision
+	#returns a SyncResult per package in the same order (installed or failed)
+	with concurrent.futures.ThreadPoolExecutor(max(1, jobs)) as executor:
+		return list(executor.map(lambda t: _install_one(workspace, t[0], t[1], log), targets))
+
+def sync_packages(workspace, targets, force = False, jobs = 8, log = print):
+	#`targets`: list of (package, lock entry), returns a SyncResult per package in the same order
+	with concurrent.futures.ThreadPoolExecutor(max(1, jobs)) as executor:
+		return list(executor.map(lambda t: _sync_one(workspace, t[0], t[1], force, log), targets))
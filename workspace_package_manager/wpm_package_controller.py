@@ -1,84 +1,254 @@
-
 import os
 import sys
 import time
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from . import wpm_internal_utils
+from . import wpm_trace
+from . import wpm_dependency_graph
 
 _colors = wpm_internal_utils.Colors
 
 #####################################################################################################
 
 class PackageMetadata():
-	def __init__(self):
+	def __init__(self, name):
+		self.name = name
 		self.dependencies = []
+		self.dependents = []
+
+		#fetching -> waiting -> finishing -> done
+		#or failed/blocked
+		self.state = "fetching"
+		self.error = None
+
+		self.package = None
+		self.actions = None
+		self.start_time = time.time()
+
+#####################################################################################################
+
+class InstallScheduler():
+	def __init__(self, controller, force, shallow, skip, jobs):
+		self.controller = controller
+		self.force = force
+		self.shallow = shallow
+		self.skip = skip
+		self.jobs = max(1, int(jobs))
+
+		self.packages = {}
+		self.running = {}
+		self.executor = None
+
+	def resolve(self, names):
+		#the graph known before anything is fetched: cycles and missing packages fail here, along with
+		#everything depending on them, the rest is started dependencies first
+		graph = wpm_dependency_graph.resolve(self.controller.workspace, self.controller.packs, names, self.shallow == False)
+
+		for node in graph.failed():
+			meta = PackageMetadata(node.name)
+			meta.state = "blocked" if node.state == "blocked" else "failed"
+			meta.error = node.error
+			self.packages[node.name] = meta
+		for node in graph.failed():
+			self.packages[node.name].dependents = [d for d in node.dependents if d in self.packages]
+			if node.state != "blocked":
+				self.controller.log(f"{_colors.LIGHT_RED}-- {_colors.BOLD}ERROR{_colors.END} {node.name}: {node.error}")
+
+		unknown = len([n for n in graph.nodes.values() if n.state == "unknown"])
+		self.controller.log(f"{_colors.LIGHT_BLUE}-- resolved:{_colors.END} {len(graph.nodes)} packages, {len(graph.levels)} levels ({unknown} not installed yet)")
+		return graph
+
+	def run(self, names):
+		graph = self.resolve(names)
+
+		with ThreadPoolExecutor(max_workers = self.jobs) as executor:
+			self.executor = executor
+			for node in graph.ordered():
+				self._discover(node.name)
+
+			while self.running:
+				done, _ = wait(list(self.running.keys()), return_when = FIRST_COMPLETED)
+				for f in done:
+					meta, phase = self.running.pop(f)
+					try:
+						result = f.result()
+					except Exception as e:
+						self._fail(meta, str(e))
+						continue
+
+					if phase == "fetch":
+						self._on_fetched(meta, result)
+					else:
+						self._on_finished(meta)
+
+			self.executor = None
+
+		#anything still waiting depends on itself through a cycle
+		for meta in self.packages.values():
+			if meta.state == "waiting":
+				meta.state = "failed"
+				pending = [d for d in meta.dependencies if self.packages[d].state != "done"]
+				meta.error = "dependency cycle: " + ", ".join(pending)
+
+		return self.packages
+
+	def _submit(self, meta, phase, func, *args):
+		f = self.executor.submit(func, *args)
+		self.running[f] = (meta, phase)
+
+	def _discover(self, name):
+		meta = self.packages.get(name, None)
+		if meta != None:
+			return meta
+
+		meta = PackageMetadata(name)
+		self.packages[name] = meta
+		#looked up here, on the scheduler thread: after a targeted load find() may load every definition,
+		#workers only ever see the package they were given
+		package = self.controller.packs.find(name)
+		if package == None:
+			self._fail(meta, f"Could not find package: {name}")
+			return meta
+		self._submit(meta, "fetch", self.controller.fetch_package, package, self.force, self.skip)
+		return meta
+
+	def _on_fetched(self, meta, result):
+		meta.package, meta.actions = result
+
+		if meta.actions != None and self.shallow == False:
+			for dep in meta.actions.evaluate_dependencies():
+				if dep in meta.dependencies:
+					continue
+				meta.dependencies.append(dep)
+				self._discover(dep).dependents.append(meta.name)
+
+		meta.state = "waiting"
+		self._try_finish(meta)
+
+	def _try_finish(self, meta):
+		if meta.state != "waiting":
+			return
+
+		for dep in meta.dependencies:
+			dmeta = self.packages[dep]
+			if dmeta.state in ("failed", "blocked"):
+				self._block(meta, f"dependency {dep} {dmeta.state}")
+				return
+
+		for dep in meta.dependencies:
+			if self.packages[dep].state != "done":
+				return
+
+		meta.state = "finishing"
+		self._submit(meta, "finish", self.controller.finish_one, meta.package, meta.actions, meta.start_time)
+
+	def _on_finished(self, meta):
+		meta.state = "done"
+		for name in meta.dependents:
+			self._try_finish(self.packages[name])
+
+	def _fail(self, meta, error):
+		meta.state = "failed"
+		meta.error = error
+		self.controller.log(f"{_colors.LIGHT_RED}-- {_colors.BOLD}ERROR{_colors.END} {meta.name}: {error}")
+		for name in meta.dependents:
+			self._try_finish(self.packages[name])
+
+	def _block(self, meta, reason):
+		meta.state = "blocked"
+		meta.error = reason
+		for name in meta.dependents:
+			self._try_finish(self.packages[name])
 
 #####################################################################################################
 
 class WorkspaceController():
-	def __init__(self, workspace, packs):
+	def __init__(self, workspace, packs, install_options = None):
 		self.workspace = workspace
 		self.packs = packs
+		#wpm_package_models.CloneStrategy from the command line, overrides definitions
+		self.install_options = install_options
 
-	def _process_install(self, package, start_time):
-		actions = package.get_actions(self.workspace)
-		if actions != None:
-			print(f"{_colors.LIGHT_BLUE}-- do(install):{_colors.END} {package_file}")
-			duration = wpm_internal_utils.compute_duration(start_time)
-			print(f"{_colors.LIGHT_GREEN}-- {_colors.BOLD}OK{_colors.END} {_colors.DARK_GRAY}({duration}){_colors.END}")
-			
-			return acc
-		else:
-			duration = wpm_internal_utils.compute_duration(start_time)
-			print(f"{_colors.LIGHT_GREEN}-- {_colors.BOLD}OK{_colors.END} {_colors.DARK_GRAY}({duration}){_colors.END}")
-
-		return None
+		self.output_lock = threading.Lock()
 
-	def install_one(self, package_name_ref, force, skip):
+	def log(self, message):
+		with self.output_lock:
+			print(message)
+			sys.stdout.flush()
 
-		start_time = time.time()
+	def fetch_one(self, package_name_ref, force, skip):
 		package_info = self.packs.find(package_name_ref)
 		if (package_info == None):
 			raise Exception(f"Could not find package: {package_name_ref}")
 
+		return self.fetch_package(package_info, force, skip)
+
+	def fetch_package(self, package_info, force, skip):
+		#puts the package files in place, returns (package, actions)
 		install_path = package_info.get_install_path(self.workspace)
 
 		already_installed = os.path.exists(install_path)
 
+		#an interrupted install is continued, not reported as installed
+		if already_installed and force == False and package_info.is_partial_install(self.workspace):
+			self.log(f"{_colors.LIGHT_BLUE}-- resuming: {_colors.BOLD}{_colors.LIGHT_WHITE}{package_info.name}{_colors.END} -> {install_path}")
+			already_installed = False
+
 		if already_installed:
 			if skip:
-				print(f"{_colors.LIGHT_BLUE}-- skipping: {_colors.BOLD}{_colors.LIGHT_WHITE}{package_name_ref}{_colors.END} -> {install_path}")
-				return self._process_install(package_info, start_time)
+				self.log(f"{_colors.LIGHT_BLUE}-- skipping: {_colors.BOLD}{_colors.LIGHT_WHITE}{package_info.name}{_colors.END} -> {install_path}")
+				return package_info, package_info.get_actions(self.workspace)
 
 			if force:
-				print(f"{_colors.LIGHT_BLUE}-- removing:{_colors.END} {install_path}", end="")
 				wpm_internal_utils.actually_remove_folder(install_path)
-				print(" (done)")
+				#loaded from the removed files (by the dependency graph)
+				package_info.actions = None
+				self.log(f"{_colors.LIGHT_BLUE}-- removing:{_colors.END} {install_path} (done)")
 			else:
 				raise Exception(f"Package already installed at {install_path}")
 
-		print(f"{_colors.LIGHT_BLUE}-- installing: {_colors.BOLD}{_colors.LIGHT_WHITE}{package_name_ref}{_colors.END} -> {install_path}")
-		sys.stdout.flush()
-		if package_info.install(self.workspace) == False:
-			duration = wpm_internal_utils.compute_duration(start_time)
-			print(f"{_colors.LIGHT_RED}-- {_colors.BOLD}ERROR{_colors.END} {_colors.DARK_GRAY}({duration}){_colors.END}")
-			return None
+		self.log(f"{_colors.LIGHT_BLUE}-- installing: {_colors.BOLD}{_colors.LIGHT_WHITE}{package_info.name}{_colors.END} -> {install_path}")
+		with wpm_trace.span("install", "package", name = package_info.name) as s:
+			if package_info.install(self.workspace, self.install_options) == False:
+				raise Exception(f"Failed to install {package_info.name}")
+			if package_info.transfer != None:
+				s.set(bytes = package_info.transfer.size, seconds = package_info.transfer.duration)
 
-		return self._process_install(package_info, start_time)
+		return package_info, package_info.get_actions(self.workspace)
 
-	def install_loop(self, ref_queue, force, shallow, skip):
-		install_queue = ref_queue.copy()
-		install_names = set()
+	def finish_one(self, package, actions, start_time):
+		#runs once all dependencies of `package` are installed
+		if actions != None:
+			with wpm_trace.span("do(install)", "package", name = package.name):
+				_, found = actions.run("install")
+			if found:
+				self.log(f"{_colors.LIGHT_BLUE}-- do(install):{_colors.END} {package.name}")
 
-		while install_queue:
-			name = install_queue.pop()
+		duration = wpm_internal_utils.compute_duration(start_time)
+		self.log(f"{_colors.LIGHT_GREEN}-- {_colors.BOLD}OK{_colors.END} {package.name} {_colors.DARK_GRAY}({duration}){_colors.END}")
 
-			actions = self.install_one(name, force, skip)
-			if actions != None and shallow == False:
-				dependencies = actions.evaluate_dependencies()
-				install_queue.extend([dep for dep in dependencies if not dep in install_names])
-			else:
-				install_names.add(name)
+	def install_one(self, package_name_ref, force, skip):
+		start_time = time.time()
+		package_info, actions = self.fetch_one(package_name_ref, force, skip)
+		self.finish_one(package_info, actions, start_time)
+		return actions
+
+	def install_loop(self, ref_queue, force, shallow, skip, jobs = 1):
+		scheduler = InstallScheduler(self, force, shallow, skip, jobs)
+		results = scheduler.run(ref_queue)
+
+		failed = [m for m in results.values() if m.state != "done"]
+		if failed:
+			self.log("-" * wpm_internal_utils.LineSize())
+			for m in sorted(failed, key = lambda m: m.name):
+				self.log(f"{_colors.LIGHT_RED}-- {m.state}:{_colors.END} {m.name} ({m.error})")
+			raise Exception(f"{len(failed)} of {len(results)} packages were not installed")
+
+		return results
 
 #####################################################################################################
 
+
+
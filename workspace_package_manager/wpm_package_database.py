@@ -1,18 +1,35 @@
 
 import os
-import io
 import sys
 import json
 import hashlib
-import zipfile
 import time
-import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from . import wpm_internal_utils
+from . import wpm_trace
 from . import wpm_package_handlers
 
 _colors = wpm_internal_utils.Colors
 
+#json definitions of a bucket folder are read and parsed ahead on this pool, registration stays in order
+PARSE_JOBS = 16
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+def _get_parse_pool():
+	global _parse_pool
+	with _parse_pool_lock:
+		if _parse_pool == None:
+			_parse_pool = ThreadPoolExecutor(max_workers = PARSE_JOBS, thread_name_prefix = "wpm-parse")
+	return _parse_pool
+
+def _read_json(abs_path_to_file):
+	with open(abs_path_to_file, "r") as f:
+		return json.load(f)
+
 class PackageDatabaseConstructor(object):
 	def __init__(self, package_database, logger):
 		self.database = package_database
@@ -21,6 +38,21 @@ class PackageDatabaseConstructor(object):
 		self.item_stack = []
 		self.logger = logger
 
+		#every definition pushed during the load, in order (see wpm_package_index)
+		self.buckets = []
+		self.cacheable = True
+		#a .py constructor ran: the environment is part of the index key
+		self.constructors_loaded = False
+		self._constructors = 0
+
+		#while set, only these definitions are visited (targeted loads, see load_targets)
+		self.target_paths = None
+		self.workspace = None
+		self.bucket_list = None
+		self.chains = None
+		self.full_index = None
+		self.resolve_lock = threading.Lock()
+
 	def add_bucket(self, rel_path_to_dir):
 		active_folder = self.active_bucket.folder
 		abs_path = os.path.join(active_folder, rel_path_to_dir);
@@ -38,7 +70,14 @@ class PackageDatabaseConstructor(object):
 			ipath = self.active_bucket.folder
 		
 		abspath = os.path.join(ipath, name)
+
+		if self.target_paths != None and not abspath in self.target_paths:
+			return
 		
+		if property_check != None and self._constructors > 0:
+			#what gets defined depends on a secret
+			self.cacheable = False
+
 		if not os.path.exists(abspath):
 			if property_check != None:
 				if self.active_bucket.fetch_requirement(property_check) == False:
@@ -53,23 +92,133 @@ class PackageDatabaseConstructor(object):
 
 		self.add_bucket(abspath)
 
-	def load_bucket_list(self, workspace, bucket_list):
+	def load_bucket_list(self, workspace, bucket_list, index = None, targets = None, chains = None):
+		#`targets`: package names the command needs, with `chains` (wpm_package_index.DefinitionChainIndex)
+		#only the definitions declaring them are loaded; anything else is resolved on demand
 		start = time.time()
+
+		self.workspace = workspace
+		self.bucket_list = bucket_list
+		self.chains = chains
+		self.full_index = index
 		
 		if self.logger != None:
 			self.logger(f"{_colors.LIGHT_BLUE}-- workspace:{_colors.END} {_colors.PURPLE}{workspace}{_colors.END}")
-			self.logger(f"{_colors.LIGHT_BLUE}-- loading packages:{_colors.END}")
 
-		#main definition in this repo
-		for b in bucket_list:
-			if os.path.exists(b):
-				self.load_bucket(b)
+		restored = False
+		if index != None:
+			with wpm_trace.span("package index restore", "load") as span:
+				restored, reason = index.restore(self, bucket_list)
+				span.set(hit = restored, reason = reason)
+			if self.logger != None:
+				if restored:
+					self.logger(f"{_colors.LIGHT_BLUE}-- package index:{_colors.END} hit {_colors.DARK_GRAY}({reason}){_colors.END}")
+				else:
+					self.logger(f"{_colors.LIGHT_BLUE}-- package index:{_colors.END} miss {_colors.DARK_GRAY}({reason}){_colors.END}")
+
+		if restored:
+			if chains != None and not chains.exists():
+				chains.save(self.database, bucket_list)
+		elif targets and chains != None and self.load_targets(targets):
+			#everything else is loaded the first time someone asks for it
+			self.database.resolver = self.resolve_missing
+		else:
+			self.load_everything()
 		
 		if self.logger != None:
 			duration = wpm_internal_utils.compute_duration(start)
 			self.logger(f"{_colors.LIGHT_GREEN}-- {_colors.BOLD}OK{_colors.END} {_colors.DARK_GRAY}({duration}){_colors.END}")
 			self.logger(_colors.DARK_GRAY + "-" * wpm_internal_utils.LineSize() + _colors.END)
 
+	def load_everything(self):
+		if self.logger != None:
+			self.logger(f"{_colors.LIGHT_BLUE}-- loading packages:{_colors.END}")
+
+		#main definition in this repo
+		for b in self.bucket_list:
+			if os.path.exists(b):
+				self.load_bucket(b)
+
+		if self.full_index != None:
+			self.full_index.save(self, self.bucket_list)
+		if self.chains != None:
+			self.chains.save(self.database, self.bucket_list)
+
+	def load_targets(self, names):
+		#loads only the definition chains of `names`, returns False if any of them is not found that way
+		for name in names:
+			if self.database.db.get(name, None) != None:
+				continue
+
+			chain, reason = self.chains.get(name, self.bucket_list)
+			if chain != None:
+				self.load_chain(chain)
+				if self.database.db.get(name, None) == None:
+					reason = f"{name} not found in {chain[-1]}"
+
+			if self.database.db.get(name, None) == None:
+				if self.logger != None:
+					self.logger(f"{_colors.LIGHT_BLUE}-- definition chains:{_colors.END} miss {_colors.DARK_GRAY}({reason}){_colors.END}")
+				self.reset()
+				return False
+
+			if self.logger != None:
+				self.logger(f"{_colors.LIGHT_BLUE}-- definition chains:{_colors.END} {name} {_colors.DARK_GRAY}({reason}){_colors.END}")
+
+		return True
+
+	def load_chain(self, chain):
+		#resumes below the deepest definition of `chain` that is already loaded (chains share prefixes)
+		loaded = {b.abspath : b for b in self.buckets}
+		depth = 0
+		while depth < len(chain) and chain[depth] in loaded:
+			depth += 1
+		if depth == len(chain):
+			return
+
+		self.target_paths = set(chain)
+		self.item_stack = [loaded[p] for p in chain[:depth]]
+		self.active_bucket = self.item_stack[-1] if self.item_stack else None
+		try:
+			with wpm_trace.span("definition chain", "load", path = chain[-1]):
+				first = chain[depth]
+				if depth == 0:
+					for b in self.bucket_list:
+						if b in self.target_paths:
+							self.load_bucket(b)
+				elif os.path.isdir(first):
+					self.load_bucket(first)
+				else:
+					self._load_item(first)
+		finally:
+			self.target_paths = None
+			self.item_stack = []
+			self.active_bucket = None
+
+	def reset(self):
+		#drops everything loaded so far (a full load follows)
+		self.database.db = {}
+		self.database.modules = set()
+		self.database.resolver = None
+		self.buckets = []
+		self.cacheable = True
+		self.constructors_loaded = False
+
+	def resolve_missing(self, name):
+		#PackageDatabase.find() fallback after a targeted load
+		#the full load below swaps `db`: callers look packages up from one thread (InstallScheduler hands
+		#its workers the package), the packages handed out so far are kept in the new `db`
+		with self.resolve_lock:
+			if self.database.resolver == None or self.database.db.get(name, None) != None:
+				return self.database.db.get(name, None)
+			loaded = dict(self.database.db)
+			if self.load_targets([name]) == False:
+				self.load_everything()
+				for n, p in loaded.items():
+					if n in self.database.db:
+						self.database.db[n] = p
+			return self.database.db.get(name, None)
+
 	def add_git(self, package_name, params):
 		entry = wpm_package_handlers.GitEntry(package_name, self.active_bucket)
 
@@ -97,10 +246,14 @@ class PackageDatabaseConstructor(object):
 		self.active_bucket.set_property(pname, pvalue);
 
 	def require(self, pname):
+		if self._constructors > 0:
+			#the constructor can branch on the result, its output can't be indexed
+			self.cacheable = False
 		return self.active_bucket.fetch_requirement(pname)
 
 	def reset_factory(self, factory):
 		self.database.factory = factory
+		self.cacheable = False
 
 	def _add_entry(self, entry, contents):
 		if entry.deserialize(contents) == False:
@@ -128,8 +281,9 @@ class PackageDatabaseConstructor(object):
 	#######################################################################################################
 	#######################################################################################################
 
-	def _push_definition(self, abs_item_path):
-		if not os.path.exists(abs_item_path):
+	def _push_definition(self, abs_item_path, exists = False):
+		#`exists`: the caller just saw the path in a directory scan
+		if exists == False and not os.path.exists(abs_item_path):
 			return False
 
 		if self.database.add_definition(abs_item_path) == False:
@@ -137,6 +291,7 @@ class PackageDatabaseConstructor(object):
 
 		self.active_bucket = wpm_package_handlers.BucketDefinition(self.active_bucket, self.database, abs_item_path)
 		self.item_stack.append(self.active_bucket)
+		self.buckets.append(self.active_bucket)
 
 		return True
 
@@ -163,8 +318,9 @@ class PackageDatabaseConstructor(object):
 				continue
 			self.add_entry(k, v)
 
-	def load_json(self, abs_path_to_file):
-		if self._push_definition(abs_path_to_file) == False:
+	def load_json(self, abs_path_to_file, prefetched = None):
+		#`prefetched`: future of the parsed content (see _load_bucket_internal)
+		if self._push_definition(abs_path_to_file, prefetched != None) == False:
 			return False
 
 		active_folder = self.active_bucket.folder
@@ -173,9 +329,10 @@ class PackageDatabaseConstructor(object):
 
 		json_content = None	
 		try:
-			f = open(abs_path_to_file,"r")
-			json_content = json.load(f)
-			f.close()
+			if prefetched != None:
+				json_content = prefetched.result()
+			else:
+				json_content = _read_json(abs_path_to_file)
 		except:
 			raise Exception(f"Invalid json {abs_path_to_file}\n")
 
@@ -190,6 +347,9 @@ class PackageDatabaseConstructor(object):
 		if self._push_definition(abs_path_to_file) == False:
 			return False
 
+		#content depends on the factory, can't be indexed
+		self.cacheable = False
+
 		if self.logger != None:
 			self.logger(f"     {_colors.CYAN}{os.path.relpath(abs_path_to_file, active_folder)}{_colors.END}")
 
@@ -224,9 +384,14 @@ class PackageDatabaseConstructor(object):
 		load_location = "definition.sha" + hashlib.sha256(abs_path_to_file.encode('utf-8')).hexdigest()
 		spec = importlib.util.spec_from_file_location(load_location, abs_path_to_file)
 		constructor = importlib.util.module_from_spec(spec)
-		spec.loader.exec_module(constructor)
 
-		constructor.load(self)
+		self.constructors_loaded = True
+		self._constructors += 1
+		try:
+			spec.loader.exec_module(constructor)
+			constructor.load(self)
+		finally:
+			self._constructors -= 1
 
 		self._pop_definition(abs_path_to_file)
 		return True
@@ -247,10 +412,14 @@ class PackageDatabaseConstructor(object):
 
 		return False
 
-	def _load_item(self, abs_item_path):
+	def _load_item(self, abs_item_path, prefetched = None):
+		with wpm_trace.span("definition", "load", path = abs_item_path):
+			self._load_item_internal(abs_item_path, prefetched)
+
+	def _load_item_internal(self, abs_item_path, prefetched = None):
 		loaded = None
 		if abs_item_path.endswith(".json"):
-			loaded = self.load_json(abs_item_path)
+			loaded = self.load_json(abs_item_path, prefetched)
 		elif abs_item_path.endswith(".py"):
 			loaded = self.load_constructor(abs_item_path)
 		#elif abs_item_path.endswith(".vet.json"):
@@ -272,21 +441,38 @@ class PackageDatabaseConstructor(object):
 
 
 	def load_bucket(self, abs_path_to_dir):
-		if self._push_definition(abs_path_to_dir) == False:
+		with wpm_trace.span("bucket", "load", path = abs_path_to_dir):
+			return self._load_bucket_internal(abs_path_to_dir)
+
+	def _load_bucket_internal(self, abs_path_to_dir):
+		if self.target_paths != None and not abs_path_to_dir in self.target_paths:
 			return False
 
-		folders_and_files = os.listdir(abs_path_to_dir)
+		if self._push_definition(abs_path_to_dir) == False:
+			return False
 
 		if self.logger != None:
 			self.logger(f"   {_colors.BROWN}#{abs_path_to_dir}{_colors.END}")
 
-		for i in folders_and_files:
-			abs_item_path = os.path.join(abs_path_to_dir, i)
+		#one scan for names and types (same order as os.listdir)
+		items = []
+		with os.scandir(abs_path_to_dir) as it:
+			for e in it:
+				if self._bucket_ignore(abs_path_to_dir, e.path, e.name):
+					continue
+				if self.target_paths != None and not e.path in self.target_paths:
+					continue
+				items.append((e.path, e.name.endswith(".json") and e.is_file()))
 
-			if self._bucket_ignore(abs_path_to_dir, abs_item_path, i):
-				continue
+		prefetched = {}
+		if PARSE_JOBS > 1 and len([1 for _, is_json in items if is_json]) > 1:
+			pool = _get_parse_pool()
+			for abs_item_path, is_json in items:
+				if is_json and not abs_item_path in self.database.modules:
+					prefetched[abs_item_path] = pool.submit(_read_json, abs_item_path)
 
-			self._load_item(abs_item_path)
+		for abs_item_path, _ in items:
+			self._load_item(abs_item_path, prefetched.get(abs_item_path, None))
 
 		self._pop_definition(abs_path_to_dir)
 		return True
@@ -306,6 +492,12 @@ class PackageDatabase(object):
 		self.factory = None
 		self.fileFormats = []
 
+		#called by find() for names that are not loaded (set after a targeted load)
+		self.resolver = None
+
+		#wpm_secrets.SecretResolver, batches and caches requirement lookups when set
+		self.secrets = None
+
 	def load_workspace(self, workspace):
 		return
 		#config_path = os.path.join(workspace, ".wpm", "config.json")
@@ -327,11 +519,17 @@ class PackageDatabase(object):
 		return self.db.items()
 
 	def find(self, name):
-		return self.db.get(name, None)
+		p = self.db.get(name, None)
+		if p == None and self.resolver != None:
+			p = self.resolver(name)
+		return p
 
 	#######################################################################################################
 
 	def try_resolve(self, pname):
+		if self.secrets != None:
+			return self.secrets.resolve(pname)
+
 		result = None
 		if self.factory != None:
 			result = self.factory.tryResolve(pname)
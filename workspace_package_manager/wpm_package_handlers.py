@@ -2,14 +2,36 @@
 import os
 import sys
 import json
-import zipfile
-import io
-import shutil
+import string
 import importlib.util
 
 from . import wpm_package_models
 from . import wpm_internal_utils
 
+#######################################################################################################
+# compiled `{name}` templates, shared by every bucket
+# a template is a list of (literal, field) pairs; None when it needs str.format (specs, indexing, ...)
+
+_templates = {}
+
+def _compile_template(s):
+	parts = []
+	try:
+		for literal, field, spec, conversion in string.Formatter().parse(s):
+			if field != None and (field == "" or spec or conversion or not field.replace("-", "_").isidentifier()):
+				return None
+			parts.append((literal, field))
+	except ValueError:
+		return None
+	return parts
+
+def _get_template(s):
+	t = _templates.get(s, False)
+	if t == False:
+		t = _compile_template(s)
+		_templates[s] = t
+	return t
+
 class BucketDefinition():
 	def __init__(self, parent, database, abs_path):
 		self.parent = parent
@@ -18,15 +40,44 @@ class BucketDefinition():
 		self.abspath = abs_path
 		
 		self.props = {}
+		#properties resolved through the database (secrets), never written to disk
+		self.requirements = []
+
+		#flattened view of the properties of this bucket and all its parents, and strings formatted with it
+		#both are dropped (here and in every child) when a property changes
+		self.children = []
+		self._scope = None
+		self._formatted = {}
+		if parent != None:
+			parent.children.append(self)
+
+	def _invalidate(self):
+		#a child can only have a scope if its parent has one
+		if self._scope == None:
+			return
+		self._scope = None
+		self._formatted = {}
+		for c in self.children:
+			c._invalidate()
+
+	def get_scope(self):
+		scope = self._scope
+		if scope == None:
+			scope = dict(self.parent.get_scope()) if self.parent != None else {}
+			scope.update(self.props)
+			self._scope = scope
+		return scope
 
 	def load_json_properties(self, jdict):
 		self.props = jdict
+		self._invalidate()
 
 	def load_json_requirements(self, l):
 		for rprop in l:
 			self.fetch_requirement(rprop)
 		
 	def get_property(self, name):
+		#own properties only, templates and has_property see the inherited ones too
 		if self.props != None:
 			return self.props.get(name, None)
 		if self.parent != None:
@@ -36,15 +87,10 @@ class BucketDefinition():
 
 	def set_property(self, pname, pvalue):
 		self.props[pname] = str(pvalue)
+		self._invalidate()
 
 	def has_property(self, pname):
-		if pname in self.props:
-			return True
-
-		if self.parent != None:
-			return self.parent.has_property(pname)
-		
-		return None #self.database.has_property(pname)
+		return pname in self.get_scope()
 
 	def fetch_requirement(self, rname):
 		if self.has_property(rname):
@@ -53,31 +99,35 @@ class BucketDefinition():
 		m = self.database.try_resolve(rname)
 		if m != None:
 			self.set_property(rname, m)
+			self.requirements.append(rname)
 			return True
 
 		return False
 
-	def get_all_properties(self):
-		props = {}
-		if self.parent != None:
-			props.update(self.parent.get_all_properties())
-
-		if self.props != None:
-			props.update(self.props)
+	def get_public_properties(self):
+		#own properties without resolved requirements
+		return {k : v for k, v in self.props.items() if not k in self.requirements}
 
-		return props
+	def get_all_properties(self):
+		return dict(self.get_scope())
 
 	def format_string_for_bucket(self, s):
-		props = self.get_all_properties()
-		#while True:
+		result = self._formatted.get(s, None)
+		if result != None:
+			return result
+
+		props = self.get_scope()
 		try:
-			return s.format(**props)
+			template = _get_template(s)
+			if template == None:
+				result = s.format(**props)
+			else:
+				result = "".join([literal + (format(props[field], "") if field != None else "") for literal, field in template])
 		except KeyError as e:
-
 			raise Exception(f"Missing key in string {s}:{e}")
 
-		except:
-			raise
+		self._formatted[s] = result
+		return result
 
 
 #######################################################################################################
@@ -100,6 +150,14 @@ class PackageActions:
 
 		return None, False
 
+	def evaluate_dependencies(self):
+		#names of the packages listed by `dependencies()` in actions.py
+		deps, found = self.run("dependencies")
+		if found == False or deps == None:
+			return []
+
+		return list(deps)
+
 #######################################################################################################
 
 class BasePackage(object):
@@ -108,6 +166,9 @@ class BasePackage(object):
 		self.bucket = bucket
 		self.actions = None
 
+		#wpm_download_utils.TransferResult of the last install (None when nothing was downloaded)
+		self.transfer = None
+
 	def get_property(self, name):
 		return self.bucket.get_property(name)
 		
@@ -142,17 +203,34 @@ class BasePackage(object):
 	def sanitize(self, workspace, fast):
 		pass
 
+	def get_cache_state(self):
+		#plain json data that restores the entry without its definition
+		return {}
+
+	def load_cache_state(self, state):
+		pass
+
 	#######################################################################################################
 
-	def get_status(self, fast):
+	def get_status(self, workspace, fast, fetch_state = None):
 		#TODO: cleanup
 		#return wpm_internal_utils.PackageStatusMessage
+		#`fetch_state` comes from fetch_remote, when given the status must not fetch again
 		return None	
 
-	def install(self, workspace):
+	def fetch_remote(self, workspace, timeout):
+		#refreshes remote data used by a full status, returns a state or None if there's nothing to fetch
+		return None
+
+	def install(self, workspace, options = None):
 		#returns True/False if install was successfull
+		#`options` is a wpm_package_models.CloneStrategy that overrides the definition
 		raise Exception("Missing install implementation!")
 
+	def is_partial_install(self, workspace):
+		#True if an interrupted install left the install path behind and install() can continue it
+		return False
+
 	def update(self, workspace):
 		#returns True/False if update is sucessfull, 
 		raise Exception("Missing update implementation!")
@@ -165,6 +243,10 @@ class BasePackage(object):
 		#returns sha 256 revision
 		return None
 
+	def get_remote_ref(self):
+		#returns (url, ref) used for remote revisions, or None
+		return None
+
 	def get_actions(self, workspace):
 		if self.actions != None:
 			return self.actions
@@ -217,6 +299,12 @@ class GitEntry(BasePackage):
 		self.model.load_defaults(self.bucket)
 		return True
 
+	def get_cache_state(self):
+		return dict(self.model.__dict__)
+
+	def load_cache_state(self, state):
+		self.model.__dict__.update(state)
+
 	#######################################################################################################
 
 	def branch(self, branchname):
@@ -238,6 +326,19 @@ class GitEntry(BasePackage):
 		self.model.useremail = email
 		return self
 
+	def depth(self, n):
+		self.model.clone_depth = n
+		return self
+
+	def clone_filter(self, f):
+		#"blobless", "treeless" or any `git clone --filter` spec
+		self.model.clone_filter = wpm_package_models.normalize_clone_filter(f)
+		return self
+
+	def single_branch(self, enabled = True):
+		self.model.single_branch = enabled
+		return self
+
 	#######################################################################################################
 
 	def get_active_branch(self):
@@ -246,9 +347,13 @@ class GitEntry(BasePackage):
 	def get_clone_url(self):
 		return self.format_string(self.model.url)
 
-	def install(self, workspace):
+	def install(self, workspace, options = None):
 		u = _get_git_utils()
-		return u.install_git_entry(workspace, self)
+		return u.install_git_entry(workspace, self, options)
+
+	def is_partial_install(self, workspace):
+		from . import wpm_git_clone
+		return wpm_git_clone.is_partial_clone(self.get_install_path(workspace))
 
 	def update(self, workspace):
 		u = _get_git_utils()
@@ -265,13 +370,25 @@ class GitEntry(BasePackage):
 			branch = self.get_active_branch()
 		return u.get_remote_revision(branch, self)
 
-	def get_status(self, workspace, fast):
+	def get_remote_ref(self):
+		u = _get_git_utils()
+		return self.get_clone_url(), u.get_remote_ref(self.get_active_branch())
+
+	def fetch_remote(self, workspace, timeout):
+		ipath = self.get_install_path(workspace)
+		if not os.path.exists(os.path.join(ipath, ".git")):
+			return None
+
+		u = _get_git_utils()
+		return u.fetch_remotes(ipath, timeout)
+
+	def get_status(self, workspace, fast, fetch_state = None):
 		ipath = self.get_install_path(workspace)
 
 		git_path = os.path.join(ipath, ".git")
 		if os.path.exists(git_path):
 			u = _get_git_utils();
-			return u.get_git_status(self.model, self.get_install_path(workspace), fast)
+			return u.get_git_status(self.model, self.get_install_path(workspace), fast, fetch_state)
 		else:
 			status = wpm_internal_utils.PackageStatusMessage()
 			status.marker = "?"
@@ -303,10 +420,10 @@ class LocalEntry(BasePackage):
 	def init_from_string(self, params):
 		return True
 
-	def install(self, workspace):
+	def install(self, workspace, options = None):
 		return True
 			
-	def get_status(self, workspace, fast):
+	def get_status(self, workspace, fast, fetch_state = None):
 		return wpm_internal_utils.PackageStatusMessage()
 
 	def sanitize(self, workspace, fast):
@@ -323,6 +440,7 @@ class ZipEntry(BasePackage):
 	def __init__(self, name, bucket):
 		BasePackage.__init__(self, name, bucket)
 		self.url = None
+		self.sha256 = None
 
 	def init_from_dict(self, params):
 		try:
@@ -330,22 +448,33 @@ class ZipEntry(BasePackage):
 		except:
 			return False
 
+		self.sha256 = params.get("sha256", None)
 		return True
 
 	def init_from_string(self, params):
 		self.url = params
 		return True
 
-	def install(self, workspace):
+	def get_cache_state(self):
+		return {"url" : self.url, "sha256" : self.sha256}
+
+	def load_cache_state(self, state):
+		self.url = state["url"]
+		self.sha256 = state.get("sha256", None)
+
+	def install(self, workspace, options = None):
+		from . import wpm_download_utils
 
 		ifolder = self.get_install_parent_folder(workspace)
-		if not os.path.exists(ifolder):
-			os.makedirs(ifolder)
 
-		cmd = ""
-		cmd = cmd + f"cd {ifolder};"
-		cmd = cmd + f"wget {self.url} -O {self.name}.zip;"
-		cmd = cmd + f"unzip {self.name}.zip;"
-		cmd = cmd + f"rm {self.name}.zip;"
+		try:
+			downloaded, extracted = wpm_download_utils.download_and_extract_zip(self.url, ifolder, expected_sha256 = self.sha256)
+		except Exception as e:
+			print(f"Error: {e}")
+			return False
+
+		self.transfer = downloaded
+		print(f"   downloaded {downloaded.describe()} sha256:{downloaded.sha256}")
+		print(f"   extracted {extracted.describe()}")
+		return True
 
-		wpm_internal_utils.run_command_and_wait(cmd, workspace, True)
@@ -0,0 +1,273 @@
+import os
+import hashlib
+
+from . import wpm_internal_utils
+from . import wpm_package_handlers
+
+#####################################################################################################
+# on-disk index of a loaded PackageDatabase, stored in <workspace>/.wpm/package-index.json
+# the index is valid while every visited definition (files and bucket folders) is unchanged:
+#  - files are compared by mtime/size first and by sha256 if those moved
+#  - folders are compared by mtime first and by a hash of their listing if it moved
+#  - if a .py constructor ran, the environment must be the same (compared by digest, see get_environment_digest)
+# resolved requirements (secrets) are never stored, they are fetched again on restore; a .py constructor
+# calling require() makes the database non-cacheable, no index is written
+
+INDEX_VERSION = 3
+
+#set by the shell on every cd/nesting, a constructor has no business depending on these
+_VOLATILE_ENVIRONMENT = set(["PWD", "OLDPWD", "SHLVL", "_"])
+
+def get_index_path(workspace):
+	return os.path.join(workspace, ".wpm", "package-index.json")
+
+def _hash_file(abs_path):
+	h = hashlib.sha256()
+	with open(abs_path, "rb") as f:
+		for chunk in iter(lambda: f.read(1024 * 1024), b""):
+			h.update(chunk)
+	return h.hexdigest()
+
+def _hash_listing(abs_path):
+	listing = "\n".join(sorted(os.listdir(abs_path)))
+	return hashlib.sha256(listing.encode("utf-8")).hexdigest()
+
+def get_environment_digest():
+	h = hashlib.sha256()
+	for name, value in sorted(dict(os.environ).items()):
+		if not name in _VOLATILE_ENVIRONMENT:
+			h.update(f"{name}={value}\0".encode("utf-8", "surrogateescape"))
+	return h.hexdigest()
+
+def _fingerprint(abs_path):
+	st = os.stat(abs_path)
+	if os.path.isdir(abs_path):
+		return {"mtime" : st.st_mtime_ns, "listing" : _hash_listing(abs_path)}
+
+	return {"mtime" : st.st_mtime_ns, "size" : st.st_size, "sha256" : _hash_file(abs_path)}
+
+def _fingerprint_matches(abs_path, fp):
+	#returns True if the path still has the content described by `fp`
+	#a content match with a new mtime updates `fp` in place
+	try:
+		st = os.stat(abs_path)
+		if "listing" in fp:
+			if not os.path.isdir(abs_path):
+				return False
+			if st.st_mtime_ns == fp["mtime"]:
+				return True
+			if _hash_listing(abs_path) != fp["listing"]:
+				return False
+		else:
+			if os.path.isdir(abs_path):
+				return False
+			if st.st_mtime_ns == fp["mtime"] and st.st_size == fp["size"]:
+				return True
+			if st.st_size != fp["size"] or _hash_file(abs_path) != fp["sha256"]:
+				return False
+
+		fp["mtime"] = st.st_mtime_ns
+		fp["touched"] = True
+		return True
+	except OSError:
+		return False
+
+#####################################################################################################
+
+class PackageIndexCache():
+	def __init__(self, workspace, use_existing = True):
+		self.path = get_index_path(workspace)
+		#when False the index is only rebuilt, never read
+		self.use_existing = use_existing
+
+	def _check(self, data, bucket_list):
+		#returns None if `data` can be used, otherwise the reason it can't
+		if data == None:
+			return "no index"
+		if data.get("version", None) != INDEX_VERSION:
+			return "index version changed"
+		if data["search_locations"] != [[b, os.path.exists(b)] for b in bucket_list]:
+			return "search locations changed"
+
+		if data["environment"] != None and data["environment"] != get_environment_digest():
+			return "environment changed"
+
+		for abs_path, fp in data["files"].items():
+			if not _fingerprint_matches(abs_path, fp):
+				return f"{abs_path} changed"
+
+		classes = [wpm_package_handlers.GitEntry.ClassName, wpm_package_handlers.LocalEntry.ClassName, wpm_package_handlers.ZipEntry.ClassName]
+		for p in data["packages"]:
+			if not p["class"] in classes:
+				return f"unknown class {p['class']}"
+
+		return None
+
+	def restore(self, constructor, bucket_list):
+		#rebuilds the database from the index, returns (restored, reason)
+		if self.use_existing == False:
+			return False, "disabled"
+
+		data = wpm_internal_utils.read_json_file(self.path)
+		reason = self._check(data, bucket_list)
+		if reason != None:
+			return False, reason
+
+		database = constructor.database
+
+		buckets = []
+		for b in data["buckets"]:
+			parent = None
+			if b["parent"] != None:
+				parent = buckets[b["parent"]]
+
+			bucket = wpm_package_handlers.BucketDefinition(parent, database, b["path"])
+			bucket.load_json_properties(dict(b["props"]))
+			for rname in b["requirements"]:
+				bucket.fetch_requirement(rname)
+
+			database.add_definition(b["path"])
+			buckets.append(bucket)
+
+		for p in data["packages"]:
+			constructor.active_bucket = buckets[p["bucket"]]
+			entry = constructor.create_entry(p["class"], p["name"])
+			constructor.active_bucket = None
+
+			entry.load_cache_state(p["state"])
+			database.add_package(p["name"], entry)
+
+		constructor.buckets = buckets
+
+		touched = [fp for fp in data["files"].values() if fp.pop("touched", False)]
+		if touched:
+			try:
+				wpm_internal_utils.write_json_file(self.path, data)
+			except OSError:
+				pass
+
+		return True, f"{len(data['packages'])} packages"
+
+	def save(self, constructor, bucket_list):
+		if constructor.cacheable == False:
+			self.invalidate()
+			return
+
+		bucket_index = {}
+		buckets = []
+		for b in constructor.buckets:
+			bucket_index[id(b)] = len(buckets)
+			buckets.append({
+				"path" : b.abspath,
+				"parent" : bucket_index[id(b.parent)] if b.parent != None else None,
+				"props" : b.get_public_properties(),
+				"requirements" : list(b.requirements),
+			})
+
+		packages = []
+		for name, entry in constructor.database.getall():
+			packages.append({
+				"name" : name,
+				"class" : entry.get_classname(),
+				"bucket" : bucket_index[id(entry.bucket)],
+				"state" : entry.get_cache_state(),
+			})
+
+		files = {}
+		for abs_path in constructor.database.modules:
+			if os.path.exists(abs_path):
+				files[abs_path] = _fingerprint(abs_path)
+
+		data = {
+			"version" : INDEX_VERSION,
+			"search_locations" : [[b, os.path.exists(b)] for b in bucket_list],
+			"files" : files,
+			"environment" : get_environment_digest() if constructor.constructors_loaded else None,
+			"buckets" : buckets,
+			"packages" : packages,
+		}
+
+		try:
+			wpm_internal_utils.write_json_file(self.path, data)
+		except (OSError, TypeError, ValueError):
+			#properties that are not json (or a read-only workspace) just mean no index
+			self.invalidate()
+
+	def invalidate(self):
+		if os.path.exists(self.path):
+			os.remove(self.path)
+
+#####################################################################################################
+# package name -> definition chain, stored in <workspace>/.wpm/package-chains.json
+# a chain is the list of definitions (search location, ..., declaring file) a package sits under,
+# loading only those is enough to get the package with the same properties as a full load
+# the chain is only a hint: if loading it does not produce the package the caller falls back to a full load
+
+CHAINS_VERSION = 1
+
+def get_chains_path(workspace):
+	return os.path.join(workspace, ".wpm", "package-chains.json")
+
+def get_definition_chain(entry):
+	chain = []
+	b = entry.bucket
+	while b != None:
+		chain.insert(0, b.abspath)
+		b = b.parent
+	return chain
+
+class DefinitionChainIndex():
+	def __init__(self, workspace):
+		self.path = get_chains_path(workspace)
+		self.data = None
+
+	def _read(self):
+		if self.data == None:
+			self.data = wpm_internal_utils.read_json_file(self.path) or {}
+		return self.data
+
+	def exists(self):
+		return self._read().get("version", None) == CHAINS_VERSION
+
+	def get(self, name, bucket_list):
+		#returns (chain or None, reason)
+		data = self._read()
+		if data.get("version", None) != CHAINS_VERSION:
+			return None, "no chain index"
+		if data["search_locations"] != bucket_list:
+			return None, "search locations changed"
+
+		index = data["packages"].get(name, None)
+		if index == None:
+			return None, f"{name} not indexed"
+
+		chain = data["chains"][index]
+		for abs_path in chain:
+			if not os.path.exists(abs_path):
+				return None, f"{abs_path} is gone"
+
+		return chain, f"{len(chain)} definitions"
+
+	def save(self, database, bucket_list):
+		chains = []
+		chain_index = {}
+		packages = {}
+		for name, entry in database.getall():
+			chain = get_definition_chain(entry)
+			key = "\n".join(chain)
+			if not key in chain_index:
+				chain_index[key] = len(chains)
+				chains.append(chain)
+			packages[name] = chain_index[key]
+
+		self.data = {
+			"version" : CHAINS_VERSION,
+			"search_locations" : list(bucket_list),
+			"chains" : chains,
+			"packages" : packages,
+		}
+
+		try:
+			wpm_internal_utils.write_json_file(self.path, self.data)
+		except OSError:
+			pass
@@ -1,3 +1,40 @@
+CLONE_FILTERS = {
+	"blobless" : "blob:none",
+	"treeless" : "tree:0",
+}
+
+def normalize_clone_filter(f):
+	if f == None or f == "":
+		return None
+	return CLONE_FILTERS.get(f, f)
+
+class CloneStrategy():
+	#how much of a repository is fetched, None/False means "full clone" for each field
+	def __init__(self, depth = None, filter = None, single_branch = None, mirror = None):
+		#bool is an int for python, `"depth" : true` is not a depth
+		if depth != None and (isinstance(depth, bool) or not isinstance(depth, int) or depth < 1):
+			raise Exception(f"Invalid clone depth {depth!r}, expected a positive number of commits")
+		self.depth = depth
+		self.filter = normalize_clone_filter(filter)
+		self.single_branch = single_branch
+		#clone through the shared mirror store (wpm_git_mirrors)
+		self.mirror = mirror
+
+	def override(self, other):
+		#returns a copy where every field set in `other` wins
+		if other == None:
+			return CloneStrategy(self.depth, self.filter, self.single_branch, self.mirror)
+
+		return CloneStrategy(
+			other.depth if other.depth != None else self.depth,
+			other.filter if other.filter != None else self.filter,
+			other.single_branch if other.single_branch != None else self.single_branch,
+			other.mirror if other.mirror != None else self.mirror
+		)
+
+	def is_partial(self):
+		return self.depth != None or self.filter != None or self.single_branch == True
+
 
 
 class GitModel():
@@ -11,6 +48,10 @@ class GitModel():
 		self.user_name = None
 		self.user_email = None
 
+		self.clone_depth = None
+		self.clone_filter = None
+		self.single_branch = None
+
 	def load_from_dict(self, data):
 		self.url = data["url"]
 		self.active_branch = data.get("active-branch", "master")
@@ -22,6 +63,13 @@ class GitModel():
 		self.user_name = data.get("user", self.user_name)
 		self.user_email = data.get("email", self.user_email)
 
+		self.clone_depth = data.get("depth", None)
+		self.clone_filter = normalize_clone_filter(data.get("filter", None))
+		self.single_branch = data.get("single-branch", None)
+
+	def get_clone_strategy(self, overrides = None):
+		return CloneStrategy(self.clone_depth, self.clone_filter, self.single_branch).override(overrides)
+
 	def load_defaults(self, bucket):
 		self.user_name = bucket.get_property("git-user")
-		self.user_email = bucket.get_property("git-email")
\ No newline at end of file
+		self.user_email = bucket.get_property("git-email")
@@ -0,0 +1,118 @@
+import sys
+import json
+import threading
+
+#####################################################################################################
+# machine readable output for status/list/revision (`--format json|ndjson`)
+#   ndjson: one object per line, written and flushed as soon as the record is ready
+#   json:   a single array written when the command is done
+# records carry raw values only, no padding and no colors
+
+FORMATS = ["text", "json", "ndjson"]
+
+def is_machine_format(fmt):
+	return fmt != None and fmt != "text"
+
+class RecordWriter():
+	def __init__(self, fmt, stream = None):
+		if not fmt in FORMATS or fmt == "text":
+			raise Exception(f"Unsupported record format: {fmt}")
+
+		self.format = fmt
+		self.stream = stream if stream != None else sys.stdout
+		self.records = []
+		self.lock = threading.Lock()
+
+	def emit(self, record):
+		with self.lock:
+			if self.format == "ndjson":
+				self.stream.write(json.dumps(record) + "\n")
+				self.stream.flush()
+			else:
+				self.records.append(record)
+
+	def close(self):
+		if self.format == "json":
+			self.stream.write(json.dumps(self.records, indent = 2) + "\n")
+			self.stream.flush()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		#a failed command reports a single error record instead of a partial array
+		if exc_type == None:
+			self.close()
+		return False
+
+def write_error(fmt, message, stream = None):
+	stream = stream if stream != None else sys.stdout
+	record = {"type" : "error", "error" : message}
+	if fmt == "json":
+		stream.write(json.dumps([record], indent = 2) + "\n")
+	else:
+		stream.write(json.dumps(record) + "\n")
+	stream.flush()
+
+#####################################################################################################
+
+def _definition(package):
+	try:
+		return package.get_definition_location()
+	except Exception:
+		return None
+
+def status_record(workspace, package, status):
+	return {
+		"type" : "package",
+		"name" : package.name,
+		"kind" : package.get_classname(),
+		"status" : status.status.strip(),
+		"marker" : status.marker.strip(),
+		"info" : status.info,
+		"branch" : status.branch,
+		"hash" : status.hash,
+		"ahead" : status.ahead,
+		"behind" : status.behind,
+		"updatable" : status.updatable,
+		"stale" : status.stale,
+		"install_path" : package.get_install_path(workspace),
+		"definition" : _definition(package),
+	}
+
+def missing_record(workspace, package):
+	return {
+		"type" : "missing",
+		"name" : package.name,
+		"kind" : package.get_classname(),
+		"install_path" : package.get_install_path(workspace),
+		"definition" : _definition(package),
+	}
+
+def folder_record(record_type, abs_path, name):
+	#`unlisted` / `ignored` folders of the workspace that no package claims
+	return {
+		"type" : record_type,
+		"name" : name,
+		"install_path" : abs_path,
+	}
+
+def list_record(workspace, package, installed, revision = None):
+	return {
+		"type" : "package",
+		"name" : package.name,
+		"kind" : package.get_classname(),
+		"installed" : installed,
+		"revision" : revision,
+		"install_path" : package.get_install_path(workspace),
+		"definition" : _definition(package),
+	}
+
+def revision_record(workspace, package, revision, remote):
+	return {
+		"type" : "revision",
+		"name" : package.name,
+		"revision" : revision,
+		"remote" : remote,
+		"install_path" : package.get_install_path(workspace),
+	}
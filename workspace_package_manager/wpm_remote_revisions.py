@@ -0,0 +1,94 @@
+import os
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from . import wpm_internal_utils
+
+#####################################################################################################
+# remote head lookups, resolved on a bounded pool and remembered for a short time
+# in <workspace>/.wpm/remote-revisions.json
+# keys are hashes of (url, ref), clone urls can carry tokens and are never written
+
+DEFAULT_TTL = 60
+#seconds a single ls-remote may take, a hung remote is reported as unknown (None)
+DEFAULT_TIMEOUT = 30
+
+def get_cache_path(workspace):
+	return os.path.join(workspace, ".wpm", "remote-revisions.json")
+
+def _cache_key(url, ref):
+	return hashlib.sha256(f"{url}\n{ref}".encode("utf-8")).hexdigest()
+
+class RemoteRevisionCache():
+	def __init__(self, workspace, ttl = DEFAULT_TTL, use_existing = True):
+		self.path = get_cache_path(workspace)
+		self.ttl = ttl
+		self.modified = False
+
+		self.entries = {}
+		if use_existing and ttl > 0:
+			self.entries = wpm_internal_utils.read_json_file(self.path) or {}
+
+	def get(self, url, ref):
+		e = self.entries.get(_cache_key(url, ref), None)
+		if e == None:
+			return None
+		if time.time() - e["time"] > self.ttl:
+			return None
+		return e["sha"]
+
+	def put(self, url, ref, sha):
+		self.entries[_cache_key(url, ref)] = {"sha" : sha, "time" : time.time()}
+		self.modified = True
+
+	def save(self):
+		if self.modified == False or self.ttl <= 0:
+			return
+
+		now = time.time()
+		live = {k : e for k, e in self.entries.items() if now - e["time"] <= self.ttl}
+		try:
+			wpm_internal_utils.write_json_file(self.path, live)
+		except OSError:
+			pass
+
+#####################################################################################################
+
+def resolve_remote_revisions(packages, jobs, cache = None, timeout = DEFAULT_TIMEOUT):
+	#returns [(package, sha or None)] in the order of `packages`
+	from . import wpm_git_utils
+
+	refs = {}
+	for p in packages:
+		r = p.get_remote_ref()
+		if r != None:
+			refs[p.name] = r
+
+	resolved = {}
+	missing = []
+	for url, ref in refs.values():
+		if (url, ref) in resolved:
+			continue
+		sha = cache.get(url, ref) if cache != None else None
+		resolved[(url, ref)] = sha
+		if sha == None:
+			missing.append((url, ref))
+
+	if missing:
+		with ThreadPoolExecutor(max_workers = max(1, min(int(jobs), len(missing)))) as executor:
+			shas = executor.map(lambda r: wpm_git_utils.ls_remote_ref(r[0], r[1], timeout), missing)
+			for r, sha in zip(missing, shas):
+				resolved[r] = sha
+				if sha != None and cache != None:
+					cache.put(r[0], r[1], sha)
+
+	if cache != None:
+		cache.save()
+
+	result = []
+	for p in packages:
+		r = refs.get(p.name, None)
+		result.append((p, resolved[r] if r != None else None))
+
+	return result
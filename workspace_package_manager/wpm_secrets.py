@@ -0,0 +1,284 @@
+import os
+import json
+import time
+import threading
+
+from . import wpm_internal_utils
+
+#####################################################################################################
+# requirement (secret) resolution:
+#  - every name seen by a workspace is remembered (names only) in <workspace>/.wpm/requirements.json
+#  - the first lookup of a run asks the vault for all of those names at once, later lookups are free
+#  - resolved values go to an encrypted session cache, <workspace>/.wpm/secrets.cache, for WPM_SECRET_TTL seconds
+#    (AES-256-GCM from the optional `cryptography` package, without it nothing is cached)
+#    the key lives in $XDG_RUNTIME_DIR (a per-user tmpfs cleared at logout), never next to the data,
+#    so a copied or mounted workspace does not carry usable secrets; without XDG_RUNTIME_DIR nothing is cached
+#  - values typed at the prompt are only cached with WPM_CACHE_PROMPTED=1
+
+DEFAULT_TTL = 8 * 3600
+
+_MAGIC = b"WPM2"
+_NONCE_SIZE = 12
+_TAG_SIZE = 16
+
+def get_ttl():
+	try:
+		return int(os.environ.get("WPM_SECRET_TTL", DEFAULT_TTL))
+	except ValueError:
+		return DEFAULT_TTL
+
+def get_cache_prompted():
+	return os.environ.get("WPM_CACHE_PROMPTED", "") == "1"
+
+def get_cache_path(workspace):
+	return os.path.join(workspace, ".wpm", "secrets.cache")
+
+def get_names_path(workspace):
+	return os.path.join(workspace, ".wpm", "requirements.json")
+
+def _get_aead():
+	try:
+		from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+	except ImportError:
+		return None
+	return AESGCM
+
+def _get_key_folder():
+	runtime = os.environ.get("XDG_RUNTIME_DIR", None)
+	if runtime == None or runtime == "" or not os.path.isdir(runtime):
+		return None
+	return os.path.join(runtime, "wpm")
+
+def get_session_key():
+	#32 random bytes, created on first use; None if no private place exists
+	folder = _get_key_folder()
+	if folder == None:
+		return None
+
+	try:
+		os.makedirs(folder, mode = 0o700, exist_ok = True)
+		st = os.stat(folder)
+		if hasattr(os, "getuid") and (st.st_uid != os.getuid() or (st.st_mode & 0o077) != 0):
+			#someone else's (or a shared) folder
+			return None
+
+		path = os.path.join(folder, "secrets.key")
+		try:
+			fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+			try:
+				os.write(fd, os.urandom(32))
+			finally:
+				os.close(fd)
+		except FileExistsError:
+			pass
+
+		with open(path, "rb") as f:
+			key = f.read()
+		if len(key) != 32:
+			return None
+		return key
+	except OSError:
+		return None
+
+def encrypt(key, plaintext):
+	nonce = os.urandom(_NONCE_SIZE)
+	return _MAGIC + nonce + _get_aead()(key).encrypt(nonce, plaintext, _MAGIC)
+
+def decrypt(key, blob):
+	#returns None if the blob was not written with `key` or was modified
+	from cryptography.exceptions import InvalidTag
+
+	if len(blob) < len(_MAGIC) + _NONCE_SIZE + _TAG_SIZE or not blob.startswith(_MAGIC):
+		return None
+	nonce = blob[len(_MAGIC):len(_MAGIC) + _NONCE_SIZE]
+	try:
+		return _get_aead()(key).decrypt(nonce, blob[len(_MAGIC) + _NONCE_SIZE:], _MAGIC)
+	except InvalidTag:
+		return None
+
+#####################################################################################################
+
+class SessionCache():
+	def __init__(self, workspace, ttl = None, use_existing = True):
+		self.path = get_cache_path(workspace)
+		self.ttl = ttl if ttl != None else get_ttl()
+		self.modified = False
+
+		#why nothing is cached, None when enabled
+		self.disabled = None
+		self.key = None
+		if self.ttl <= 0:
+			self.disabled = "WPM_SECRET_TTL=0"
+		elif _get_aead() == None:
+			self.disabled = "the cryptography package is not installed"
+		else:
+			self.key = get_session_key()
+			if self.key == None:
+				self.disabled = "no private XDG_RUNTIME_DIR"
+
+		self.entries = {}
+		if self.key != None and use_existing:
+			self.entries = self._read()
+
+	def enabled(self):
+		return self.key != None
+
+	def _read(self):
+		try:
+			with open(self.path, "rb") as f:
+				plaintext = decrypt(self.key, f.read())
+			if plaintext == None:
+				return {}
+			entries = json.loads(plaintext.decode("utf-8"))
+		except (OSError, ValueError):
+			return {}
+
+		now = time.time()
+		return {k : e for k, e in entries.items() if now - e["time"] <= self.ttl}
+
+	def get(self, name):
+		e = self.entries.get(name, None)
+		if e == None or time.time() - e["time"] > self.ttl:
+			return None
+		return e["value"]
+
+	def put(self, name, value):
+		if self.key == None:
+			return
+		self.entries[name] = {"value" : value, "time" : time.time()}
+		self.modified = True
+
+	def save(self):
+		if self.key == None or self.modified == False:
+			return
+		data = encrypt(self.key, json.dumps(self.entries).encode("utf-8"))
+		tmp = self.path + ".tmp"
+		try:
+			fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+			with os.fdopen(fd, "wb") as f:
+				f.write(data)
+			os.replace(tmp, self.path)
+			self.modified = False
+		except OSError:
+			if os.path.exists(tmp):
+				os.remove(tmp)
+
+	def clear(self):
+		self.entries = {}
+		self.modified = False
+		if os.path.exists(self.path):
+			os.remove(self.path)
+
+#####################################################################################################
+
+class SecretResolver():
+	#PackageDatabase.try_resolve goes through here when set (database.secrets)
+	def __init__(self, workspace, factory, cache = None, prompt = True, cache_prompted = None):
+		self.workspace = workspace
+		self.factory = factory
+		self.cache = cache
+		self.prompt = prompt
+		self.cache_prompted = cache_prompted if cache_prompted != None else get_cache_prompted()
+
+		self.values = {}
+		#names the vault was already asked for in this run
+		self.asked = set()
+		self.prefetched = False
+		self.lock = threading.Lock()
+
+		data = wpm_internal_utils.read_json_file(get_names_path(workspace)) or {}
+		self.known = list(data.get("names", []))
+		self.requested = []
+
+	def _lookup_many(self, names):
+		#one vault request for all `names` when the factory supports it
+		if not names or self.factory == None:
+			return {}
+		if hasattr(self.factory, "tryResolveMany"):
+			return self.factory.tryResolveMany(names) or {}
+		return {n : self.factory.tryResolve(n) for n in names}
+
+	def _prefetch(self, name):
+		self.prefetched = True
+
+		names = list(self.known)
+		if not name in names:
+			names.append(name)
+
+		missing = []
+		for n in names:
+			v = self.cache.get(n) if self.cache != None else None
+			if v != None:
+				self.values[n] = v
+			else:
+				missing.append(n)
+
+		self.asked.update(missing)
+		for n, v in self._lookup_many(missing).items():
+			if v != None:
+				self.values[n] = v
+				if self.cache != None:
+					self.cache.put(n, v)
+
+	def resolve(self, name):
+		with self.lock:
+			if not name in self.requested:
+				self.requested.append(name)
+
+			if self.prefetched == False:
+				self._prefetch(name)
+
+			v = self.values.get(name, None)
+			if v != None:
+				return v
+
+			if self.factory != None and not name in self.asked:
+				self.asked.add(name)
+				v = self.factory.tryResolve(name)
+
+			cache = self.cache
+			if v == None and self.prompt:
+				v = wpm_internal_utils.ReadSecret(f"--- require : {name} --- (empty to ignore):")
+				if v == "":
+					v = None
+				if self.cache_prompted == False:
+					cache = None
+
+			if v != None:
+				self.values[name] = v
+				if cache != None:
+					cache.put(name, v)
+			return v
+
+	def save(self):
+		#remembers the names for the next run's prefetch, and the values in the session cache
+		with self.lock:
+			new_names = [n for n in self.requested if not n in self.known]
+			if new_names:
+				self.known.extend(new_names)
+				try:
+					wpm_internal_utils.write_json_file(get_names_path(self.workspace), {"names" : self.known})
+				except OSError:
+					pass
+
+			if self.cache != None:
+				self.cache.save()
+
+#####################################################################################################
+# stand-in vault for tests and offline use: WPM_VAULT_FILE=<json file with {"name" : "value"}>
+
+class LocalVault():
+	def __init__(self, path):
+		self.path = path
+		self.requests = 0
+
+	def _load(self):
+		self.requests += 1
+		return wpm_internal_utils.read_json_file(self.path) or {}
+
+	def GetValue(self, name):
+		return self._load().get(name, None)
+
+	def GetValues(self, names):
+		data = self._load()
+		return {n : data.get(n, None) for n in names}
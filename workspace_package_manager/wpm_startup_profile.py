@@ -0,0 +1,117 @@
+import sys
+import time
+import builtins
+import importlib.util
+
+#####################################################################################################
+# `wpm --startup-profile` support: times every module import (through builtins.__import__)
+# and named initialisation sections, then prints a report at exit
+# nothing is hooked until start() is called
+
+class _NullSection():
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		return False
+
+class _Section():
+	def __init__(self, profile, name):
+		self.profile = profile
+		self.name = name
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *args):
+		self.profile.sections.append((self.name, time.perf_counter() - self.start))
+		return False
+
+class StartupProfile():
+	def __init__(self):
+		self.enabled = False
+		self.start_time = None
+
+		#(name, total seconds, self seconds) in import order
+		self.imports = []
+		self.sections = []
+
+		self._stack = []
+		self._original_import = None
+
+	def start(self):
+		if self.enabled:
+			return
+		self.enabled = True
+		self.start_time = time.perf_counter()
+		self._original_import = builtins.__import__
+		builtins.__import__ = self._import
+
+	def stop(self):
+		if self._original_import != None:
+			builtins.__import__ = self._original_import
+			self._original_import = None
+
+	def section(self, name):
+		if self.enabled == False:
+			return _NullSection()
+		return _Section(self, name)
+
+	def _resolve(self, name, globals, fromlist, level):
+		if level == 0:
+			base = name
+		else:
+			package = (globals or {}).get("__package__", None) or ""
+			try:
+				base = importlib.util.resolve_name("." * level + name, package)
+			except (ImportError, ValueError):
+				return None
+
+		if base not in sys.modules:
+			return base
+
+		for f in (fromlist or ()):
+			sub = f"{base}.{f}"
+			if f != "*" and sub not in sys.modules and not hasattr(sys.modules[base], f):
+				return sub
+
+		return None
+
+	def _import(self, name, globals = None, locals = None, fromlist = (), level = 0):
+		label = self._resolve(name, globals, fromlist, level)
+		if label == None:
+			return self._original_import(name, globals, locals, fromlist, level)
+
+		self._stack.append(0.0)
+		start = time.perf_counter()
+		try:
+			return self._original_import(name, globals, locals, fromlist, level)
+		finally:
+			total = time.perf_counter() - start
+			children = self._stack.pop()
+			if self._stack:
+				self._stack[-1] += total
+			self.imports.append((label, total, total - children))
+
+	def report(self, limit = 25):
+		self.stop()
+
+		lines = []
+		elapsed = time.perf_counter() - self.start_time
+		lines.append(f"-- startup profile: {elapsed * 1000.0:.1f} ms total")
+
+		lines.append("   imports (cumulative / self, slowest first):")
+		imports = sorted(self.imports, key = lambda i: i[1], reverse = True)
+		for name, total, own in imports[:limit]:
+			lines.append(f"{total * 1000.0:10.1f} ms {own * 1000.0:8.1f} ms  {name}")
+		if len(imports) > limit:
+			lines.append(f"   ... {len(imports) - limit} more")
+
+		lines.append("   initialisation:")
+		for name, duration in self.sections:
+			lines.append(f"{duration * 1000.0:10.1f} ms  {name}")
+
+		return "\n".join(lines)
+
+profile = StartupProfile()
@@ -0,0 +1,273 @@
+import os
+import time
+import struct
+import hashlib
+import threading
+
+from . import wpm_internal_utils
+from . import wpm_git_config
+from . import wpm_git_refs
+
+#####################################################################################################
+# `wpm status --fast` without running git for packages that did not change:
+# the last fast status of every package is kept in <workspace>/.wpm/status-cache.json next to a
+# fingerprint of everything it depends on
+#  - git metadata: HEAD, index, the checked out branch ref, packed-refs, config and info/exclude
+#  - the global config files and the core.excludesFile they (or the repository config) point to
+#  - the worktree: every tracked file (edits) and every folder holding one (new/removed untracked files),
+#    the tracked paths are read straight from .git/index
+#  - every folder below the untracked, not ignored folders (`git ls-files --others --directory`, listed when
+#    the status is computed): an empty folder or one with only ignored files turns dirty with no other trace
+# a package is not cached when something in it changed in the last RACY_SECONDS (a later write could
+# keep the same timestamp), or when it has submodules or a split index (not fully described by the above)
+
+RACY_SECONDS = 2
+#untracked trees larger than this are not walked, the package is not cached
+MAX_UNTRACKED_DIRS = 1000
+
+def get_cache_path(workspace):
+	return os.path.join(workspace, ".wpm", "status-cache.json")
+
+#####################################################################################################
+# .git/index (versions 2, 3 and 4)
+
+_INDEX_HEADER = struct.Struct(">4sII")
+
+class GitIndexError(Exception):
+	pass
+
+def _read_varint(data, pos):
+	#git's offset encoding used by index v4 path compression
+	c = data[pos]
+	pos += 1
+	value = c & 127
+	while c & 128:
+		c = data[pos]
+		pos += 1
+		value = ((value + 1) << 7) | (c & 127)
+	return value, pos
+
+def read_index_paths(index_path, hash_size = 20):
+	#returns (tracked paths, simple) where simple is False if the index holds submodules or is split
+	with open(index_path, "rb") as f:
+		data = f.read()
+
+	if len(data) < _INDEX_HEADER.size:
+		raise GitIndexError(f"truncated index {index_path}")
+	signature, version, count = _INDEX_HEADER.unpack_from(data, 0)
+	if signature != b"DIRC" or not version in [2, 3, 4]:
+		raise GitIndexError(f"unsupported index {index_path} (version {version})")
+
+	#ctime, mtime, dev, ino, mode, uid, gid, size, object id, flags
+	fixed = 40 + hash_size + 2
+	paths = []
+	simple = True
+	previous = b""
+	pos = _INDEX_HEADER.size
+	for _ in range(count):
+		start = pos
+		mode = struct.unpack_from(">I", data, start + 24)[0]
+		flags = struct.unpack_from(">H", data, start + fixed - 2)[0]
+		pos = start + fixed
+		if flags & 0x4000:
+			#extended flags (v3+)
+			pos += 2
+
+		if (mode >> 12) == 0o16:
+			#gitlink, the status also depends on the submodule's own worktree
+			simple = False
+
+		if version == 4:
+			strip, pos = _read_varint(data, pos)
+			end = data.index(b"\0", pos)
+			path = previous[:len(previous) - strip] + data[pos:end]
+			pos = end + 1
+		else:
+			end = data.index(b"\0", pos)
+			path = data[pos:end]
+			#entries are padded with 1-8 NULs to a multiple of 8 bytes
+			pos = start + ((pos - start + len(path) + 8) & ~7)
+
+		paths.append(path)
+		previous = path
+
+	#extensions: a `link` extension means the entries live in a shared index
+	while pos + 8 <= len(data) - hash_size:
+		ext, size = struct.unpack_from(">4sI", data, pos)
+		if ext == b"link":
+			simple = False
+		pos += 8 + size
+
+	return [os.fsdecode(p) for p in paths], simple
+
+#####################################################################################################
+
+class _Fingerprint():
+	def __init__(self):
+		self.digest = hashlib.sha1()
+		self.newest = 0
+
+	def add(self, path):
+		try:
+			st = os.lstat(path)
+		except OSError:
+			self.digest.update(b"-\0")
+			return
+		#mode and ctime: chmod (git tracks the executable bit) leaves mtime alone
+		self.digest.update(f"{st.st_mtime_ns}:{st.st_ctime_ns}:{st.st_size}:{st.st_ino}:{st.st_mode}\0".encode("ascii"))
+		if st.st_mtime_ns > self.newest:
+			self.newest = st.st_mtime_ns
+
+def _hash_size(commondir):
+	config = wpm_git_config.ConfigFile(os.path.join(commondir, "config"))
+	if (config.get("extensions", "objectformat") or "sha1").lower() == "sha256":
+		return 32
+	return 20
+
+def get_fingerprint(ipath, untracked):
+	#returns a string describing the state of the package at `ipath`, or None if it can't be cached
+	#`untracked`: the untracked folders (relative paths) found when the status was computed
+	gitdir, commondir = wpm_git_refs.get_git_dirs(ipath)
+	if not os.path.isdir(gitdir):
+		return None
+
+	fp = _Fingerprint()
+	fp.digest.update(os.fsencode(ipath) + b"\0")
+
+	head = os.path.join(gitdir, "HEAD")
+	try:
+		with open(head, "r") as f:
+			head_value = f.read().strip()
+	except OSError:
+		return None
+	fp.digest.update(head_value.encode("utf-8") + b"\0")
+	fp.add(head)
+	if head_value.startswith("ref:"):
+		fp.add(os.path.join(commondir, head_value[4:].strip()))
+	for name in ["packed-refs", "config", os.path.join("info", "exclude")]:
+		fp.add(os.path.join(commondir, name))
+	for path in wpm_git_config.get_global_config_paths():
+		fp.add(path)
+	try:
+		excludes = wpm_git_config.get_excludes_file(commondir)
+	except (OSError, wpm_git_config.GitConfigError):
+		return None
+	fp.digest.update(os.fsencode(excludes) + b"\0")
+	fp.add(excludes)
+
+	index = os.path.join(gitdir, "index")
+	fp.add(index)
+	try:
+		paths, simple = read_index_paths(index, _hash_size(commondir))
+	except FileNotFoundError:
+		paths, simple = [], True
+	except (OSError, ValueError, IndexError, GitIndexError, struct.error):
+		return None
+	if simple == False:
+		return None
+
+	folders = set([""])
+	for p in paths:
+		fp.add(os.path.join(ipath, p))
+		folder = os.path.dirname(p)
+		while not folder in folders:
+			folders.add(folder)
+			folder = os.path.dirname(folder)
+	for folder in sorted(folders):
+		fp.add(os.path.join(ipath, folder))
+
+	count = 0
+	for u in untracked:
+		fp.digest.update(os.fsencode(u) + b"\0")
+		for folder, dirs, _ in os.walk(os.path.join(ipath, u)):
+			dirs.sort()
+			fp.add(folder)
+			count += 1
+			if count > MAX_UNTRACKED_DIRS:
+				return None
+
+	if fp.newest >= (time.time() - RACY_SECONDS) * 1000000000:
+		return None
+
+	return fp.digest.hexdigest()
+
+#####################################################################################################
+
+_status_fields = ["marker", "status", "info", "branch", "hash", "ahead", "behind", "updatable", "stale"]
+
+def _to_json(status):
+	return {k : getattr(status, k) for k in _status_fields}
+
+def _from_json(data):
+	status = wpm_internal_utils.PackageStatusMessage()
+	for k in _status_fields:
+		if k in data:
+			setattr(status, k, data[k])
+	return status
+
+class StatusCache():
+	#wpm_status_scanner cache (lookup/store), fast status only; use_existing = False (--no-cache) recomputes everything
+	def __init__(self, workspace, use_existing = True):
+		self.path = get_cache_path(workspace)
+		self.lock = threading.Lock()
+		self.modified = False
+		self.hits = 0
+		self.misses = 0
+
+		self.entries = {}
+		if use_existing:
+			self.entries = wpm_internal_utils.read_json_file(self.path) or {}
+
+	def lookup(self, workspace, package, fast):
+		if fast == False:
+			return None, None
+
+		ipath = package.get_install_path(workspace)
+		if not os.path.exists(os.path.join(ipath, ".git")):
+			return None, None
+
+		with self.lock:
+			e = self.entries.get(package.name, None)
+		if e != None:
+			if get_fingerprint(ipath, e.get("untracked", [])) == e.get("fingerprint", None):
+				with self.lock:
+					self.hits += 1
+				return _from_json(e["status"]), None
+
+		with self.lock:
+			self.misses += 1
+
+		#the token describes the package before its status is computed, a change made in between shows up next time
+		from . import wpm_git_utils
+		try:
+			untracked = wpm_git_utils.list_untracked_dirs(ipath)
+		except Exception:
+			return None, None
+		fingerprint = get_fingerprint(ipath, untracked)
+		if fingerprint == None:
+			return None, None
+		return None, (fingerprint, untracked)
+
+	def store(self, workspace, package, fast, status, token):
+		if fast == False or token == None:
+			return
+		fingerprint, untracked = token
+		with self.lock:
+			self.entries[package.name] = {
+				"fingerprint" : fingerprint,
+				"untracked" : untracked,
+				"path" : package.get_install_path(workspace),
+				"status" : _to_json(status)
+			}
+			self.modified = True
+
+	def save(self):
+		if self.modified == False:
+			return
+		with self.lock:
+			#packages removed from the workspace
+			live = {k : e for k, e in self.entries.items() if os.path.isdir(e.get("path", ""))}
+		try:
+			wpm_internal_utils.write_json_file(self.path, live)
+		except OSError:
+			pass
@@ -0,0 +1,116 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+from . import wpm_internal_utils
+from . import wpm_trace
+
+#####################################################################################################
+
+class PackageStatusResult():
+	def __init__(self, package, status):
+		self.package = package
+		self.status = status
+
+def get_package_status(workspace, package, fast, fetch_state = None, cache = None):
+	#`cache`: lookup(workspace, package, fast) -> (status or None, token), store(workspace, package, fast, status, token)
+	#(the daemon keeps one in memory), errors are not cached
+	token = None
+	if cache != None:
+		status, token = cache.lookup(workspace, package, fast)
+		if status != None:
+			return status
+
+	with wpm_trace.span("status", "package", name = package.name, fast = fast):
+		status = package.get_status(workspace, fast, fetch_state)
+
+	if cache != None and status != None:
+		cache.store(workspace, package, fast, status, token)
+	return status
+
+def _compute_status(workspace, package, fast, fetch_state = None, cache = None):
+	try:
+		status = get_package_status(workspace, package, fast, fetch_state, cache)
+	except Exception as e:
+		status = wpm_internal_utils.PackageStatusMessage()
+		status.marker = "!"
+		status.status = "ERROR"
+		status.info = str(e).replace("\n", " ").strip()
+
+	if status == None:
+		status = wpm_internal_utils.PackageStatusMessage()
+
+	return PackageStatusResult(package, status)
+
+def _fetch_remote(workspace, package, timeout):
+	try:
+		with wpm_trace.span("fetch", "package", name = package.name):
+			return package.fetch_remote(workspace, timeout)
+	except Exception:
+		return "failed"
+
+#####################################################################################################
+
+class StatusScanner():
+	def __init__(self, workspace, jobs = 1, fetch_jobs = None, fetch_timeout = None, cache = None):
+		self.workspace = workspace
+		self.cache = cache
+		self.jobs = max(1, int(jobs))
+
+		#a full (non fast) status first refreshes remotes on its own pool, each fetch bounded by `fetch_timeout`
+		self.fetch_jobs = max(1, int(fetch_jobs)) if fetch_jobs != None else self.jobs
+		self.fetch_timeout = fetch_timeout
+
+		self.lock = threading.Lock()
+
+	def is_parallel(self):
+		return self.jobs > 1 or self.fetch_jobs > 1
+
+	def scan(self, packages, fast, on_result = None):
+		#checks `packages` and calls `on_result` as soon as each one is done
+		#returns all results sorted by package name
+		results = []
+
+		def _report(r):
+			with self.lock:
+				results.append(r)
+				if on_result != None:
+					on_result(r)
+					sys.stdout.flush()
+
+		if fast == False:
+			self._scan_with_fetch(packages, _report)
+		elif self.jobs == 1 or len(packages) <= 1:
+			for p in packages:
+				_report(_compute_status(self.workspace, p, fast, None, self.cache))
+		else:
+			with ThreadPoolExecutor(max_workers = min(self.jobs, len(packages))) as executor:
+				futures = [executor.submit(_compute_status, self.workspace, p, fast, None, self.cache) for p in packages]
+				for f in as_completed(futures):
+					_report(f.result())
+
+		return sorted(results, key = lambda r: r.package.name)
+
+	def _scan_with_fetch(self, packages, report):
+		#fetch -> status pipeline, the status of a package starts as soon as its own fetch is done
+		if not packages:
+			return
+
+		fetch_pool = ThreadPoolExecutor(max_workers = min(self.fetch_jobs, len(packages)))
+		status_pool = ThreadPoolExecutor(max_workers = min(self.jobs, len(packages)))
+		try:
+			pending = {}
+			for p in packages:
+				pending[fetch_pool.submit(_fetch_remote, self.workspace, p, self.fetch_timeout)] = ("fetch", p)
+
+			while pending:
+				done, _ = wait(list(pending.keys()), return_when = FIRST_COMPLETED)
+				for f in done:
+					phase, p = pending.pop(f)
+					if phase == "fetch":
+						pending[status_pool.submit(_compute_status, self.workspace, p, False, f.result(), self.cache)] = ("status", p)
+					else:
+						report(f.result())
+		finally:
+			fetch_pool.shutdown()
+			status_pool.shutdown()
@@ -0,0 +1,147 @@
+import os
+import re
+import json
+import time
+import threading
+
+#####################################################################################################
+# `wpm --trace out.json`: spans for the hot paths (bucket/definition loads, subprocesses,
+# GitPython commands, per package status/install/update) written as Chrome trace events
+# (chrome://tracing, https://ui.perfetto.dev)
+# while disabled span() hands back a shared no-op object, nothing is timed or stored
+
+_credentials = re.compile(r"(\w+://)[^/@\s]+@")
+
+def redact(text):
+	#clone urls can carry tokens, traces are meant to be shared
+	return _credentials.sub(r"\1***@", text)
+
+class _NullSpan():
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		return False
+
+	def set(self, **args):
+		pass
+
+_null_span = _NullSpan()
+
+class _Span():
+	def __init__(self, tracer, name, category, args):
+		self.tracer = tracer
+		self.name = name
+		self.category = category
+		self.args = args
+
+	def set(self, **args):
+		#extra arguments known only once the work is done (return codes, sizes)
+		self.args.update(args)
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		end = time.perf_counter()
+		if exc_type != None:
+			self.args["error"] = str(exc)
+		self.tracer._add_complete(self.name, self.category, self.start, end, self.args)
+		return False
+
+class Tracer():
+	def __init__(self):
+		self.enabled = False
+		self.path = None
+		self.origin = None
+		self.events = []
+
+		self.lock = threading.Lock()
+		self._threads = {}
+
+	def start(self, path):
+		if self.enabled:
+			return
+		self.enabled = True
+		self.path = path
+		self.origin = time.perf_counter()
+		self._trace_gitpython()
+
+	#`span_name`/`span_category` so that `name = ...` stays free for the event arguments
+	def span(self, span_name, span_category = "wpm", **args):
+		if self.enabled == False:
+			return _null_span
+		return _Span(self, span_name, span_category, args)
+
+	def instant(self, span_name, span_category = "wpm", **args):
+		if self.enabled == False:
+			return
+		self._add({"name" : span_name, "cat" : span_category, "ph" : "i", "s" : "t", "ts" : self._us(time.perf_counter()), "args" : args})
+
+	def _us(self, t):
+		return round((t - self.origin) * 1000000.0, 3)
+
+	def _tid(self):
+		#small, stable thread ids plus a name for each of them
+		ident = threading.get_ident()
+		tid = self._threads.get(ident, None)
+		if tid == None:
+			tid = len(self._threads) + 1
+			self._threads[ident] = tid
+			self.events.append({"name" : "thread_name", "ph" : "M", "pid" : os.getpid(), "tid" : tid,
+				"args" : {"name" : threading.current_thread().name}})
+		return tid
+
+	def _add(self, event):
+		with self.lock:
+			event["pid"] = os.getpid()
+			event["tid"] = self._tid()
+			self.events.append(event)
+
+	def _add_complete(self, name, category, start, end, args):
+		args = {k : (redact(v) if isinstance(v, str) else v) for k, v in args.items()}
+		self._add({"name" : name, "cat" : category, "ph" : "X", "ts" : self._us(start), "dur" : self._us(end) - self._us(start), "args" : args})
+
+	def _trace_gitpython(self):
+		#every GitPython command goes through Git.execute
+		try:
+			from git.cmd import Git
+		except ImportError:
+			return
+
+		original = Git.execute
+		if getattr(original, "_wpm_traced", False):
+			return
+
+		tracer = self
+		def execute(git_self, command, *args, **kwargs):
+			cmd = " ".join(command) if isinstance(command, (list, tuple)) else str(command)
+			with tracer.span("gitpython", "git", cmd = cmd, cwd = str(getattr(git_self, "_working_dir", None))):
+				return original(git_self, command, *args, **kwargs)
+
+		execute._wpm_traced = True
+		Git.execute = execute
+
+	def save(self):
+		#returns the number of events written
+		if self.enabled == False:
+			return 0
+
+		with self.lock:
+			data = {
+				"traceEvents" : list(self.events),
+				"displayTimeUnit" : "ms"
+			}
+
+		folder = os.path.dirname(os.path.abspath(self.path))
+		os.makedirs(folder, exist_ok = True)
+		with open(self.path, "w") as f:
+			json.dump(data, f)
+
+		return len(data["traceEvents"])
+
+tracer = Tracer()
+
+def span(span_name, span_category = "wpm", **args):
+	return tracer.span(span_name, span_category, **args)
@@ -2,24 +2,32 @@
 import os
 import sys
 import time
-import json
-import shutil
 import argparse
-import subprocess
 
+#only light modules here, everything else is imported by the commands that need it
 from workspace_package_manager import wpm_internal_utils
-from workspace_package_manager import wpm_package_database
-from workspace_package_manager import wpm_package_controller
+from workspace_package_manager import wpm_startup_profile
+from workspace_package_manager import wpm_records
+from workspace_package_manager import wpm_trace
 
 #####################################################################################################
 #####################################################################################################
 
 clrs = wpm_internal_utils.Colors
+_profile = wpm_startup_profile.profile
 
 _env_search_locations = os.environ.get("WPM_SEARCH_LOCATIONS", None)
 _env_worskace_path = os.environ.get("WPM_WORKSPACE_PATH", None)
 _env_worskace_addr = os.environ.get("WPM_VAULT_ADDR", None)
 
+_use_cache = True
+_secrets = None
+
+#set while `wpm daemon run` serves commands: the database and the fast status stay in memory between them
+_daemon = None
+_status_cache = None
+_interactive = True
+
 def validate_search_locations(workspace):
 	if _env_search_locations == None:
 		return "No bucket search locations found"
@@ -29,49 +37,102 @@ def validate_search_locations(workspace):
 def get_package_search_locations(workspace):
 	return _env_search_locations.split(":")
 
-def load_all_packages(workspace, silent):
-	packs = wpm_package_database.PackageDatabase()
+def load_all_packages(workspace, silent, targets = None):
+	#`targets`: the package names a single package command works on, only their definitions are loaded
+	if _daemon != None:
+		return _daemon.get_packages()
+	return _load_packages(workspace, silent, targets)
 
-	packs.factory = VaultFactory()
-	
-	packs.load_workspace(workspace)
+def _load_packages(workspace, silent, targets = None):
+	from workspace_package_manager import wpm_package_database
+	from workspace_package_manager import wpm_package_index
+	from workspace_package_manager import wpm_secrets
 
-	logger = print
-	if silent:
-		logger = None
-	
-	loader = wpm_package_database.PackageDatabaseConstructor(packs, logger)
-	
-	bucket_list = get_package_search_locations(workspace)
-	loader.load_bucket_list(workspace, bucket_list)
+	global _secrets
+
+	with _profile.section("load packages"):
+		packs = wpm_package_database.PackageDatabase()
+
+		packs.factory = VaultFactory()
+		_secrets = wpm_secrets.SecretResolver(workspace, packs.factory, wpm_secrets.SessionCache(workspace, None, _use_cache), _interactive)
+		packs.secrets = _secrets
+		
+		packs.load_workspace(workspace)
+
+		logger = print
+		if silent:
+			logger = None
+		
+		loader = wpm_package_database.PackageDatabaseConstructor(packs, logger)
+
+		index = wpm_package_index.PackageIndexCache(workspace, _use_cache)
+
+		bucket_list = get_package_search_locations(workspace)
+		#--no-cache: full load, both indexes are rebuilt
+		chains = wpm_package_index.DefinitionChainIndex(workspace)
+		loader.load_bucket_list(workspace, bucket_list, index, targets if _use_cache else None, chains)
+
+		_secrets.save()
 
 	return packs
 
 #####################################################################################################
 class VaultFactory:
+	#the connection is opened on the first lookup, commands that need no secrets never pay for it
 	def __init__(self):
 		self.vault = None
-		try:
-			_addr, _port = _env_worskace_addr.split(":")
-			from vaultsrc import vaultClient
-			self.vault = vaultClient.Connect({
-				"host" : _addr,
-				"port" : int(_port)
-			})
-		except:
-			pass
+		self.connected = False
+
+	def connect(self):
+		if self.connected:
+			return self.vault
+
+		self.connected = True
+		with _profile.section("vault connect"):
+			vault_file = os.environ.get("WPM_VAULT_FILE", None)
+			if vault_file != None and vault_file != "":
+				#local stand-in (tests, offline work)
+				from workspace_package_manager import wpm_secrets
+				self.vault = wpm_secrets.LocalVault(vault_file)
+				return self.vault
+			try:
+				_addr, _port = _env_worskace_addr.split(":")
+				from vaultsrc import vaultClient
+				self.vault = vaultClient.Connect({
+					"host" : _addr,
+					"port" : int(_port)
+				})
+			except:
+				pass
+
+		return self.vault
 
 	def tryResolve(self, name):
 		try:
-			return self.vault.GetValue(name)
+			return self.connect().GetValue(name)
 		except:
 			pass
 
+	def tryResolveMany(self, names):
+		#one request when the client can batch, otherwise the lookups overlap
+		vault = self.connect()
+		if vault == None:
+			return {}
+		if hasattr(vault, "GetValues"):
+			try:
+				return vault.GetValues(names)
+			except:
+				pass
+
+		from concurrent.futures import ThreadPoolExecutor
+		with ThreadPoolExecutor(max_workers = max(1, min(8, len(names)))) as executor:
+			return dict(zip(names, executor.map(self.tryResolve, names)))
+
 #####################################################################################################
 #####################################################################################################
 
-def _do_remove(workspace, package_name_ref):
-	packs = load_all_packages(workspace, silent)
+def _do_remove(workspace, silent, package_name_ref):
+	packs = load_all_packages(workspace, silent, [package_name_ref])
 
 	package_info = packs.find(package_name_ref)
 	if (package_info == None):
@@ -85,51 +146,112 @@ def _do_remove(workspace, package_name_ref):
 	else:
 		print(f"{clrs.LIGHT_RED}-- warning:{clrs.END} could not find install path {ipath}")
 
-def _do_revision(workspace, silent, remoterev, package_name_ref):
-	packs = load_all_packages(workspace, silent)
+def _do_revision(workspace, silent, args):
+	packs = load_all_packages(workspace, silent, [args.name] if (args.name != None and not args.all) else None)
 
-	package_info = packs.find(package_name_ref)
+	cache = None
+	if args.remoterev:
+		from workspace_package_manager import wpm_remote_revisions
+
+	if args.all:
+		if args.remoterev:
+			cache = wpm_remote_revisions.RemoteRevisionCache(workspace, args.ttl, _use_cache)
+		_do_all_revisions(workspace, packs, args.remoterev, cache, args.jobs, args.format, args.timeout)
+		return
+
+	if args.name == None:
+		raise Exception("Missing package name (or --all) ...")
+
+	package_info = packs.find(args.name)
 	if (package_info == None):
-		raise Exception(f"Could not find package [{package_name_ref}] ...")
+		raise Exception(f"Could not find package [{args.name}] ...")
 
 	rev = None
-	if remoterev:
-		rev = package_info.get_remote_revision()
+	if args.remoterev:
+		#asked for one package: always the remote's current answer, never the cache
+		_, rev = wpm_remote_revisions.resolve_remote_revisions([package_info], 1, None, args.timeout)[0]
 	else:
 		rev = package_info.get_installed_revision(workspace)
 
+	if args.format != "text":
+		with wpm_records.RecordWriter(args.format) as writer:
+			writer.emit(wpm_records.revision_record(workspace, package_info, rev, args.remoterev))
+		return
+
 	print("-" * wpm_internal_utils.LineSize())
-	print("    " + rev)
+	print("    " + str(rev))
 	print("-" * wpm_internal_utils.LineSize())
 
-def _do_install(workspace, silent, package_name_ref, force, shallow, optional):
-	packs = load_all_packages(workspace, silent)
+def _do_all_revisions(workspace, packs, remoterev, cache, jobs, fmt = "text", timeout = None):
+	names = sorted(packs.get_all_names())
+	if not names and fmt == "text":
+		print("Missing packages")
+		return
+
+	if remoterev:
+		from workspace_package_manager import wpm_remote_revisions
+		packages = [packs.get(n) for n in names]
+		revisions = wpm_remote_revisions.resolve_remote_revisions(packages, jobs, cache, timeout)
+	else:
+		packages = [packs.get(n) for n in names if os.path.exists(packs.get(n).get_install_path(workspace))]
+		revisions = [(p, p.get_installed_revision(workspace)) for p in packages]
+
+	if fmt != "text":
+		with wpm_records.RecordWriter(fmt) as writer:
+			for p, rev in revisions:
+				writer.emit(wpm_records.revision_record(workspace, p, rev, remoterev))
+		return
+
+	if not revisions:
+		return
+
+	maxname = max([len(p.name) for p, _ in revisions]) + 4
+	for p, rev in revisions:
+		if rev == None:
+			rev = "?"
+		print(p.name.rjust(maxname) + " | " + rev)
+
+def _do_install(workspace, silent, package_name_ref, force, shallow, optional, jobs, args):
+	from workspace_package_manager import wpm_package_controller
+	from workspace_package_manager import wpm_package_models
+
+	packs = load_all_packages(workspace, silent, package_name_ref)
+
+	from workspace_package_manager import wpm_git_mirrors
+
+	strategy = wpm_package_models.CloneStrategy(args.depth, args.filter, True if args.single_branch else None)
+	strategy.mirror = args.mirror or wpm_git_mirrors.mirrors_enabled()
 	
-	c = wpm_package_controller.WorkspaceController(workspace, packs)
-	c.install_loop(package_name_ref, force, shallow, optional)
+	c = wpm_package_controller.WorkspaceController(workspace, packs, strategy)
+	c.install_loop(package_name_ref, force, shallow, optional, jobs)
 
 def _do_refresh(workspace, silent, fast):
 	packs = load_all_packages(workspace, silent)
 	items = os.listdir(workspace)
 	items = sorted(items)
-	for name in items:
-		apath = os.path.join(workspace, name)
-		
-		package_info = packs.find(name)
-		if package_info != None:
-			print(f"SANITIZING: {package_info.name} ...")
+
+	#every missing safe.directory goes into the global config in a single write
+	from workspace_package_manager import wpm_git_config
+	found = [packs.find(name) for name in items]
+	found = [p for p in found if p != None]
+	wpm_git_config.get_reconciler().ensure_safe_directories([p.get_install_path(workspace) for p in found])
+
+	for package_info in found:
+		print(f"SANITIZING: {package_info.name} ...")
+		with wpm_trace.span("refresh", "package", name = package_info.name):
 			package_info.sanitize(workspace, fast)
 
 	print("Done.")
 
 def _do_update(workspace, silent, name):
-	packs = load_all_packages(workspace, silent)
+	packs = load_all_packages(workspace, silent, [name])
 	package_info = packs.find(name)
 	if package_info != None:
 		ipath = package_info.get_install_path(workspace)
 		if os.path.exists(ipath):
 			print(f"UPDATING: {package_info.name} ...")
-			package_info.update(workspace)
+			with wpm_trace.span("update", "package", name = package_info.name):
+				package_info.update(workspace)
 			print("Done.")
 		else:
 			print(f"MISSING INSTALL: wpm install {name} ...")
@@ -137,6 +259,131 @@ def _do_update(workspace, silent, name):
 		print(f"MISSING PACKAGE: {name} ...")
 
 
+def _do_graph(workspace, silent, args):
+	from workspace_package_manager import wpm_dependency_graph
+
+	packs = load_all_packages(workspace, silent)
+	if args.name != None:
+		if packs.find(args.name) == None:
+			raise Exception(f"Could not find package [{args.name}] ...")
+		roots = [args.name]
+	else:
+		roots = [n for n in sorted(packs.get_all_names()) if os.path.exists(packs.get(n).get_install_path(workspace))]
+
+	graph = wpm_dependency_graph.resolve(workspace, packs, roots)
+	names = [n.name for n in graph.ordered()]
+	if args.name != None:
+		reachable = wpm_dependency_graph.subgraph(graph, args.name)
+		names = [n for n in names if n in reachable]
+
+	if args.format == "dot":
+		print(wpm_dependency_graph.to_dot(graph, names))
+		return
+	if args.format != "text":
+		with wpm_records.RecordWriter(args.format) as writer:
+			for n in names:
+				writer.emit(wpm_dependency_graph.graph_record(graph.get(n)))
+		return
+
+	if not names:
+		print("Missing packages")
+		return
+
+	maxname = max([len(n) for n in names]) + 4
+	for n in names:
+		node = graph.get(n)
+		level = str(node.level) if node.level != None else "-"
+		line = level.rjust(3) + " | " + n.rjust(maxname)
+		if node.dependencies:
+			line += " -> " + ", ".join(node.dependencies)
+		if node.state == "unknown":
+			line += f" {clrs.DARK_GRAY}(not installed, dependencies unknown){clrs.END}"
+		elif node.state != "ok":
+			line += f" {clrs.LIGHT_RED}({node.error}){clrs.END}"
+		print(line)
+
+	for cycle in graph.cycles:
+		if cycle[0] in names:
+			print(f"{clrs.LIGHT_RED}-- cycle:{clrs.END} " + " -> ".join(cycle + [cycle[0]]))
+
+def _do_lock(workspace, silent, args):
+	from workspace_package_manager import wpm_lockfile
+
+	packs = load_all_packages(workspace, silent)
+	path = args.file or wpm_lockfile.get_lock_path(workspace)
+
+	data, problems = wpm_lockfile.create_lock(workspace, [packs.get(n) for n in sorted(packs.get_all_names())], args.jobs)
+	for name in sorted(problems.keys()):
+		color = clrs.YELLOW if args.force else clrs.LIGHT_RED
+		print(f"{color}-- {name}:{clrs.END} {', '.join(problems[name])}")
+	if problems and not args.force:
+		raise Exception(f"{len(problems)} packages can't be reproduced from their remote, nothing written (--force to lock them anyway)")
+
+	wpm_lockfile.write_lock(path, data)
+	print(f"{clrs.LIGHT_BLUE}-- locked:{clrs.END} {len(data['packages'])} packages in {path}")
+
+def _do_sync(workspace, silent, args):
+	from workspace_package_manager import wpm_lockfile
+	from workspace_package_manager import wpm_download_utils
+
+	path = args.file or wpm_lockfile.get_lock_path(workspace)
+	locked = wpm_lockfile.read_lock(path)
+	names = sorted(locked.keys())
+
+	packs = load_all_packages(workspace, silent, names)
+	unknown = [n for n in names if packs.find(n) == None]
+	if unknown:
+		raise Exception(f"Locked packages missing from the search locations: {', '.join(unknown)}")
+
+	missing = [n for n in names if not os.path.exists(packs.get(n).get_install_path(workspace))]
+	locked_git = []
+	installed = []
+	others = []
+	if missing:
+		from workspace_package_manager import wpm_package_controller
+		from workspace_package_manager import wpm_package_models
+		from workspace_package_manager import wpm_git_mirrors
+
+		strategy = wpm_package_models.CloneStrategy()
+		strategy.mirror = wpm_git_mirrors.mirrors_enabled()
+
+		print(f"{clrs.LIGHT_BLUE}-- installing:{clrs.END} {', '.join(missing)}")
+		c = wpm_package_controller.WorkspaceController(workspace, packs, strategy)
+
+		#git packages are cloned at their locked revision, then finished like any install (do(install))
+		locked_git = [n for n in missing if wpm_lockfile.can_install_locked(packs.get(n), locked[n])]
+		start = time.time()
+		installed = wpm_lockfile.install_packages(workspace, [(packs.get(n), locked[n]) for n in locked_git], args.jobs)
+		for r in installed:
+			if r.state == "installed":
+				package = packs.get(r.name)
+				c.finish_one(package, package.get_actions(workspace), start)
+
+		others = [n for n in missing if not n in locked_git]
+		if others:
+			c.install_loop(others, False, True, True, args.jobs)
+
+	targets = [(packs.get(n), locked[n]) for n in names if not n in locked_git]
+	results = installed + wpm_lockfile.sync_packages(workspace, targets, args.force, args.jobs)
+
+	received = sum([packs.get(n).transfer.size for n in missing if packs.get(n).transfer != None])
+	for r in results:
+		if r.transfer != None:
+			received += r.transfer.size
+		if r.state == "synced" or r.state == "installed":
+			print(f"{clrs.LIGHT_BLUE}-- {r.state}:{clrs.END} {r.name} -> {locked[r.name]['revision'][:12]} ({r.info})")
+		elif r.state != "unchanged":
+			print(f"{clrs.LIGHT_RED}-- {r.state}:{clrs.END} {r.name} ({r.info})")
+
+	synced = len([r for r in results if r.state == "synced"])
+	unchanged = len([r for r in results if r.state == "unchanged" and not r.name in others])
+	count = len([r for r in results if r.state == "installed"]) + len(others)
+	print(f"Done: {synced} synced, {unchanged} unchanged, {count} installed, {wpm_download_utils.format_size(received)} received.")
+
+	failed = [r for r in results if r.state == "failed" or r.state == "skipped"]
+	if failed:
+		raise Exception(f"{len(failed)} of {len(results)} packages are not at their locked revision")
+
 def print_package_missing_status(pname):
 	print("    " + (pname + " ").ljust(16,"-") + "> Missing...")
 
@@ -152,33 +399,54 @@ def print_unlisted_status(abs_path, name):
 	else:
 		print(name.rjust(32) + f" | file:{abs_path}")
 
-def print_installed_package_status(workspace, package, fast):
-	status_data = package.get_status(workspace, fast)
-
+def format_installed_package_status(package, status_data):
 	start = status_data.status.rjust(8)
 
-	message = f"{start}" + f"{status_data.marker} {package.name}".rjust(32) + f" | {status_data.info}"; 
-	
-	print(message)
+	return f"{start}" + f"{status_data.marker} {package.name}".rjust(32) + f" | {status_data.info}"
+
+def print_installed_package_status(workspace, package, fast, fetch_timeout = None, cache = None):
+	from workspace_package_manager import wpm_status_scanner
+
+	fetch_state = None
+	if fast == False:
+		fetch_state = package.fetch_remote(workspace, fetch_timeout)
+
+	status_data = wpm_status_scanner.get_package_status(workspace, package, fast, fetch_state, cache)
+
+	print(format_installed_package_status(package, status_data))
 
 	return status_data.updatable
 
 def print_ok_status(abs_path, pname):
 	print("    " + (pname + " ").ljust(16,"-") + "> Ok...")
 
-def show_single_package_status(packs, workspace, name, fast):
+def show_single_package_status(packs, workspace, name, fast, fetch_timeout = None, writer = None, cache = None):
 	entry = packs.find(name)
-	if entry != None:
+	if entry != None and writer != None:
+		if os.path.exists(entry.get_install_path(workspace)):
+			from workspace_package_manager import wpm_status_scanner
+			fetch_state = None
+			if fast == False:
+				fetch_state = entry.fetch_remote(workspace, fetch_timeout)
+			status_data = wpm_status_scanner.get_package_status(workspace, entry, fast, fetch_state, cache)
+			writer.emit(wpm_records.status_record(workspace, entry, status_data))
+		else:
+			writer.emit(wpm_records.missing_record(workspace, entry))
+	elif entry != None:
 		abspath = entry.get_install_path(workspace)
 		if os.path.exists(abspath):
-			print_installed_package_status(workspace, entry, fast);
+			print_installed_package_status(workspace, entry, fast, fetch_timeout, cache)
 		else:
 			print_package_missing_status(entry.name)
+	elif writer != None:
+		raise Exception(f"No such package `{name}`")
 	else:
 		print(f"No such package `{name}`")
 		return
 
-def show_all_package_status(packs, workspace, fast):
+def show_all_package_status(packs, workspace, fast, jobs, fetch_jobs = None, fetch_timeout = None, writer = None, cache = None):
+	from workspace_package_manager import wpm_status_scanner
+
 	locations = {}
 	for n, e in packs.getall():
 		locations[e.get_install_path(workspace)] = e
@@ -191,6 +459,7 @@ def show_all_package_status(packs, workspace, fast):
 
 	unlisted = []
 	ignored = []
+	installed = []
 		
 	for abspath, v in locations.items():
 		if isinstance(v, str):
@@ -199,7 +468,34 @@ def show_all_package_status(packs, workspace, fast):
 			else:
 				unlisted.append((abspath, v))
 		elif os.path.exists(abspath):
-				print_installed_package_status(workspace, v, fast);
+				installed.append(v)
+
+	def _print_result(r):
+		print(format_installed_package_status(r.package, r.status))
+
+	scanner = wpm_status_scanner.StatusScanner(workspace, jobs, fetch_jobs, fetch_timeout, cache)
+
+	if writer != None:
+		#ndjson streams records as packages finish, json gets them sorted by name
+		def _emit_result(r):
+			writer.emit(wpm_records.status_record(workspace, r.package, r.status))
+
+		results = scanner.scan(installed, fast, _emit_result if writer.format == "ndjson" else None)
+		if writer.format != "ndjson":
+			for r in results:
+				_emit_result(r)
+		for apath, name in unlisted:
+			writer.emit(wpm_records.folder_record("unlisted", apath, name))
+		for apath, name in ignored:
+			writer.emit(wpm_records.folder_record("ignored", apath, name))
+		return
+
+	results = scanner.scan(installed, fast, _print_result)
+
+	if scanner.is_parallel() and len(results) > 1:
+		print ("SUMMARY:")
+		for r in results:
+			_print_result(r)
 
 	print ("UNLISTED:")
 	for apath, name in unlisted:
@@ -209,19 +505,34 @@ def show_all_package_status(packs, workspace, fast):
 		print_ignored_status(apath, name)
 
 
-def _do_status(workspace, silent, name, fast):
+def _do_status(workspace, silent, name, fast, jobs, fetch_jobs, fetch_timeout, fmt = "text"):
 
-	packs = load_all_packages(workspace, silent)
+	packs = load_all_packages(workspace, silent, [name] if name != None else None)
 
-	if name != None:
+	#fast status of unchanged packages comes from .wpm/status-cache.json (or the daemon's memory)
+	cache = _status_cache
+	if cache == None and fast:
+		from workspace_package_manager import wpm_status_cache
+		cache = wpm_status_cache.StatusCache(workspace, _use_cache)
+
+	if fmt != "text":
+		with wpm_records.RecordWriter(fmt) as writer:
+			if name != None:
+				show_single_package_status(packs, workspace, name, fast, fetch_timeout, writer, cache)
+			else:
+				show_all_package_status(packs, workspace, fast, jobs, fetch_jobs, fetch_timeout, writer, cache)
+	elif name != None:
 		
-		show_single_package_status(packs, workspace, name, fast)
+		show_single_package_status(packs, workspace, name, fast, fetch_timeout, None, cache)
 		
 	else:
 		hworkspace = os.environ['HOST_WORKSPACE']
 		print(f"WORKSPACE: {hworkspace}")
 
-		show_all_package_status(packs, workspace, fast)
+		show_all_package_status(packs, workspace, fast, jobs, fetch_jobs, fetch_timeout, None, cache)
+
+	if cache != None and cache is not _status_cache:
+		cache.save()
 
 	#if show_update_commands == True:
 	#	print ("Ready to update: " + workspace)
@@ -239,6 +550,18 @@ def _do_list(workspace : str, silent : bool, args):
 	packs = load_all_packages(workspace, silent)
 	
 	names = sorted(packs.get_all_names())
+
+	if args.format != "text":
+		with wpm_records.RecordWriter(args.format) as writer:
+			for n in names:
+				p = packs.get(n)
+				exists = os.path.exists(p.get_install_path(workspace))
+				if exists == False and _showall == False:
+					continue
+				rev = p.get_installed_revision(workspace) if (exists and _showrev) else None
+				writer.emit(wpm_records.list_record(workspace, p, exists, rev))
+		return
+
 	if not names:
 		print("Missing packages")
 		return
@@ -260,7 +583,7 @@ def _do_list(workspace : str, silent : bool, args):
 			if _showloc == True:
 				details.append("installed:"+ install_location)
 			if _showrev == True:
-				details.append("rev:" + p.get_installed_revision(workspace))
+				details.append("rev:" + (p.get_installed_revision(workspace) or "?"))
 		elif _showall == True:
 			if _showloc == True:
 				extra_info.append("missing:"+ install_location)
@@ -280,28 +603,192 @@ def _do_list(workspace : str, silent : bool, args):
 
 		index += 1
 
+def _do_mirror(args):
+	from workspace_package_manager import wpm_git_mirrors
+	from workspace_package_manager import wpm_download_utils
+
+	store = wpm_git_mirrors.MirrorStore()
+	cmd = args.mirror_action
+
+	if cmd == "prune":
+		days = 0 if args.all else args.older_than
+		removed = store.prune(days)
+		for m in removed:
+			print(f"{clrs.LIGHT_BLUE}-- removed:{clrs.END} {m.name} ({m.url})")
+		print(f"Removed {len(removed)} mirror(s).")
+		return
+
+	mirrors = store.list()
+	print(f"MIRRORS: {store.root}")
+	if not mirrors:
+		return
+
+	maxname = max([len(m.name) for m in mirrors]) + 4
+	if cmd == "size":
+		total = 0
+		for m in mirrors:
+			size = m.size()
+			total += size
+			print(m.name.rjust(maxname) + " | " + wpm_download_utils.format_size(size))
+		print("total".rjust(maxname) + " | " + wpm_download_utils.format_size(total))
+	else:
+		now = time.time()
+		for m in mirrors:
+			age = (now - m.last_fetch) / 3600.0
+			print(m.name.rjust(maxname) + f" | {m.url} | fetched {age:.1f}h ago")
+
+def _do_gitconfig(args):
+	from workspace_package_manager import wpm_git_config
+
+	reconciler = wpm_git_config.get_reconciler()
+	if args.dedupe:
+		kept, removed = reconciler.dedupe_safe_directories()
+		print(f"{reconciler.global_path}: removed {removed} duplicate safe.directory entries, {kept} left.")
+		return
+
+	kept, duplicates = reconciler.dedupe_safe_directories(True)
+	print(f"{reconciler.global_path}: {kept + duplicates} safe.directory entries, {len(reconciler.get_safe_directories())} in effect (all global files).")
+	if duplicates:
+		print(f"{clrs.YELLOW}run `wpm gitconfig --dedupe` to remove the {duplicates} duplicates.{clrs.END}")
+
+def _do_secrets(workspace, args):
+	from workspace_package_manager import wpm_secrets
+
+	cache = wpm_secrets.SessionCache(workspace)
+	if args.clear:
+		cache.clear()
+		print(f"Removed {cache.path}")
+		return
+
+	if not cache.enabled():
+		print(f"{clrs.YELLOW}session cache disabled ({cache.disabled}){clrs.END}")
+		return
+
+	now = time.time()
+	print(f"SECRETS: {cache.path} (ttl {cache.ttl} sec)")
+	for name in sorted(cache.entries.keys()):
+		left = cache.ttl - (now - cache.entries[name]["time"])
+		print(f"    {name.ljust(32)} | expires in {int(left)} sec")
+
+def _can_forward(args):
+	#read only commands with the default options, a daemon answers them from memory
+	from workspace_package_manager import wpm_daemon
+	if not hasattr(args, 'action'):
+		return False
+	if not wpm_daemon.is_served(args.action, getattr(args, 'fast', False), getattr(args, 'remoterev', False)):
+		return False
+	return args.no_cache == False and args.trace == None and args.startup_profile == False
+
+def _run_daemon(workspace, idle_timeout):
+	from workspace_package_manager import wpm_daemon
+
+	global _daemon, _status_cache, _interactive
+
+	parser, _ = build_parser()
+
+	def _runner(argv):
+		try:
+			args = parser.parse_args(argv)
+		except SystemExit:
+			raise wpm_daemon.Fallback("arguments")
+		if not _can_forward(args):
+			raise wpm_daemon.Fallback(f"not served: {getattr(args, 'action', None)}")
+		_exec_action(workspace, args)
+
+	server = wpm_daemon.DaemonServer(workspace, get_package_search_locations(workspace), lambda: _load_packages(workspace, True), _runner, idle_timeout)
+
+	_daemon = server
+	_status_cache = server.cache
+	#nobody to answer a prompt
+	_interactive = False
+	try:
+		server.serve()
+	finally:
+		_daemon = None
+		_status_cache = None
+		_interactive = True
+
+def _do_daemon(workspace, args):
+	from workspace_package_manager import wpm_daemon
+
+	cmd = args.daemon_action
+	if cmd == "run":
+		_run_daemon(workspace, args.idle_timeout)
+		return
+
+	reply = wpm_daemon.control(workspace, "ping")
+	if cmd == "stop":
+		if reply == None:
+			print("No daemon running.")
+			return
+		wpm_daemon.control(workspace, "stop")
+		print(f"{clrs.LIGHT_BLUE}-- daemon:{clrs.END} stopped pid {reply['info']['pid']}")
+		return
+
+	if cmd == "start":
+		if reply == None:
+			#same interpreter and import path as this process
+			env = dict(os.environ)
+			root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+			env["PYTHONPATH"] = os.pathsep.join([p for p in [root, env.get("PYTHONPATH", "")] if p != ""])
+			argv = [sys.executable, "-c", "from wpmcli.cli import main; main()", "daemon", "run", "--idle-timeout", str(args.idle_timeout)]
+			info = wpm_daemon.spawn(workspace, argv, env)
+			if info == None:
+				raise Exception(f"The daemon did not start, see {wpm_daemon.get_log_path(workspace)}")
+			print(wpm_daemon.format_info(info))
+			return
+		print(f"{clrs.YELLOW}Already running.{clrs.END}")
+
+	if reply == None:
+		print("No daemon running.")
+		return
+	print(wpm_daemon.format_info(reply["info"]))
+
 def _exec_action(workspace, args):
 	try:
 		originalDirectory = os.getcwd()
 
 		acc = args.action
+		fmt = getattr(args, "format", "text")
+		silent = args.quiet or fmt != "text"
+
 		if acc == "install":
-			_do_install(workspace, args.quiet, args.names, args.force, args.shallow, args.skip)
+			_do_install(workspace, args.quiet, args.names, args.force, args.shallow, args.skip, args.jobs, args)
 		elif acc == "refresh":
 			_do_refresh(workspace, args.quiet, args.fast)
 		elif acc == "update":
 			_do_update(workspace, args.quiet, args.name)
 		elif acc == "status":
-			_do_status(workspace, args.quiet, args.name, args.fast)
+			_do_status(workspace, silent, args.name, args.fast, args.jobs, args.fetch_jobs, args.fetch_timeout, fmt)
 		elif acc == "list":
-			_do_list(workspace, args.quiet, args)
+			_do_list(workspace, silent, args)
 		elif acc == "remove":
 			_do_remove(workspace, args.quiet, args.name)
 		elif acc == "revision":
-			_do_revision(workspace, args.quiet, args.remoterev, args.name)
+			_do_revision(workspace, silent, args)
+		elif acc == "mirror":
+			_do_mirror(args)
+		elif acc == "gitconfig":
+			_do_gitconfig(args)
+		elif acc == "secrets":
+			_do_secrets(workspace, args)
+		elif acc == "daemon":
+			_do_daemon(workspace, args)
+		elif acc == "graph":
+			_do_graph(workspace, silent, args)
+		elif acc == "lock":
+			_do_lock(workspace, args.quiet, args)
+		elif acc == "sync":
+			_do_sync(workspace, args.quiet, args)
+
+		if _secrets != None:
+			_secrets.save()
 
 		os.chdir(originalDirectory)
 	except Exception as e:
+		if getattr(args, "format", "text") != "text":
+			wpm_records.write_error(args.format, str(e))
+			return
 		print("-" * wpm_internal_utils.LineSize())
 		print(f"{clrs.RED}<<< FAILED >>>{clrs.END}")
 		print(str(e))
@@ -352,13 +839,12 @@ def validate_workspace():
 	return workspace
 
 
-def main():
-	workspace = validate_workspace()
-
-	user_arguments = sys.argv[1:]
-
+def build_parser():
 	parser = argparse.ArgumentParser()
 	parser.add_argument('-q', '--quiet', dest='quiet', action='store_true', help="Run in quiet mode.")
+	parser.add_argument('--startup-profile', dest='startup_profile', action='store_true', help="Print import and initialisation times when done.")
+	parser.add_argument('--no-cache', dest='no_cache', action='store_true', help="Ignore (and rebuild) the caches in .wpm/ (package index, fast status).")
+	parser.add_argument('--trace', dest='trace', default=None, metavar='FILE', help="Write a Chrome trace (chrome://tracing, ui.perfetto.dev) of the run to FILE.")
 
 	subparsers = parser.add_subparsers(description='Actions:')
 
@@ -367,6 +853,11 @@ def main():
 	install_parser.add_argument('-f', '--force', dest='force', action='store_true', help="Reinstall the package if already exists.")
 	install_parser.add_argument('-s', '--shallow', dest='shallow', action='store_true', help="Install without any other depndencies.")
 	install_parser.add_argument('-k', '--skip', dest='skip', action='store_true', help="Skip packages that are already installed")
+	install_parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1, help="Number of packages installed at the same time (default 1).")
+	install_parser.add_argument('--depth', dest='depth', type=int, default=None, help="Clone only the last N commits.")
+	install_parser.add_argument('--filter', dest='filter', default=None, help="Partial clone: `blobless`, `treeless` or a git filter spec.")
+	install_parser.add_argument('--single-branch', dest='single_branch', action='store_true', help="Clone only the active branch.")
+	install_parser.add_argument('-m', '--mirror', dest='mirror', action='store_true', help="Clone through the shared mirror store (also WPM_USE_MIRRORS=1).")
 	install_parser.add_argument('names', nargs='*', help='The namse of the package to install, see "list" command.')
 
 	refresh_parser = subparsers.add_parser('refresh', description='Handles the removal of retarded garbage, run it at least once when you start working.')
@@ -380,27 +871,107 @@ def main():
 	revision_parser = subparsers.add_parser('revision', description='Prints the current revision of a package')
 	revision_parser.set_defaults(action='revision')
 	revision_parser.add_argument('-r', '--remote', dest='remoterev', action='store_true', help="Returns the remote revision")
-	revision_parser.add_argument('name', default=None, help='The package name')
+	revision_parser.add_argument('-a', '--all', dest='all', action='store_true', help="Revisions of all packages (remote) or of all installed packages.")
+	revision_parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=8, help="Number of remotes queried at the same time (default 8).")
+	revision_parser.add_argument('--ttl', dest='ttl', type=int, default=60, help="--all: seconds a remote revision stays cached in .wpm/ (0 disables, default 60).")
+	revision_parser.add_argument('--timeout', dest='timeout', type=float, default=30, help="Seconds a remote may take to answer before its revision is reported as unknown (default 30).")
+	revision_parser.add_argument('name', nargs='?', default=None, help='The package name')
+	revision_parser.add_argument('--format', dest='format', default='text', choices=wpm_records.FORMATS, help="Output format: text (default), json or ndjson (one record per line, streamed).")
 
 	list_parser = subparsers.add_parser('list', description='Lists package information.')
 	list_parser.set_defaults(action='list')
 	list_parser.add_argument('-a', '--all', dest='showall', action='store_true', help="Show all packages from database")
 	list_parser.add_argument('-d', '--def', dest='showdef', action='store_true', help="Show package definition.")
 	list_parser.add_argument('-r', '--rev', dest='showrev', action='store_true', help="shwo package revision.")
+	list_parser.add_argument('--format', dest='format', default='text', choices=wpm_records.FORMATS, help="Output format: text (default), json or ndjson (one record per line, streamed).")
 
 	status_parser = subparsers.add_parser('status', description='Shows status of packages in workspace and workspace')
 	status_parser.set_defaults(action='status')
 	status_parser.add_argument('-f', '--fast', dest='fast', action='store_true', help="Only show if repository is dirty.")
+	status_parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1, help="Number of packages checked at the same time (default 1).")
+	status_parser.add_argument('--fetch-jobs', dest='fetch_jobs', type=int, default=None, help="Number of remotes fetched at the same time (default: same as --jobs).")
+	status_parser.add_argument('--fetch-timeout', dest='fetch_timeout', type=float, default=60, help="Seconds a remote fetch may take before the package is reported as stale (default 60).")
 	status_parser.add_argument('name', nargs='?', default=None, help='The name of the package to install, see "list" command.')
+	status_parser.add_argument('--format', dest='format', default='text', choices=wpm_records.FORMATS, help="Output format: text (default), json or ndjson (one record per line, streamed).")
+
+	mirror_parser = subparsers.add_parser('mirror', description='Manages the shared git mirror store (WPM_MIRROR_PATH, default ~/.cache/wpm/mirrors).')
+	mirror_parser.set_defaults(action='mirror')
+	mirror_parser.add_argument('mirror_action', nargs='?', default='list', choices=['list', 'size', 'prune'], help="list (default), size or prune")
+	mirror_parser.add_argument('--older-than', dest='older_than', type=int, default=30, help="prune: remove mirrors not fetched for this many days (default 30).")
+	mirror_parser.add_argument('--all', dest='all', action='store_true', help="prune: remove every mirror.")
+
+	gitconfig_parser = subparsers.add_parser('gitconfig', description='Shows the safe.directory entries in the global git config.')
+	gitconfig_parser.set_defaults(action='gitconfig')
+	gitconfig_parser.add_argument('--dedupe', dest='dedupe', action='store_true', help="Remove duplicate safe.directory entries (one time cleanup).")
+
+	secrets_parser = subparsers.add_parser('secrets', description='Shows the requirements held in the encrypted session cache (names only).')
+	secrets_parser.set_defaults(action='secrets')
+	secrets_parser.add_argument('--clear', dest='clear', action='store_true', help="Forget every cached value.")
+
+	daemon_parser = subparsers.add_parser('daemon', description='Keeps packages and status in memory, status/list/revision are answered by it while it runs.')
+	daemon_parser.set_defaults(action='daemon')
+	daemon_parser.add_argument('daemon_action', nargs='?', default='status', choices=['start', 'stop', 'status', 'run'], help="start (in background), stop, status (default) or run (in foreground)")
+	daemon_parser.add_argument('--idle-timeout', dest='idle_timeout', type=int, default=4 * 3600, help="Seconds without requests before the daemon exits (0 = never, default 4 hours).")
+
+	graph_parser = subparsers.add_parser('graph', description='Shows the dependency graph (from the actions.py of installed packages) with its install levels and cycles.')
+	graph_parser.set_defaults(action='graph')
+	graph_parser.add_argument('name', nargs='?', default=None, help='Only the package and its dependencies (default: every installed package).')
+	graph_parser.add_argument('--format', dest='format', default='text', choices=wpm_records.FORMATS + ['dot'], help="Output format: text (default), json, ndjson or dot (graphviz).")
+
+	lock_parser = subparsers.add_parser('lock', description='Writes the current revision of every installed package to the lockfile.')
+	lock_parser.set_defaults(action='lock')
+	lock_parser.add_argument('--file', dest='file', default=None, help="Lockfile path (default .wpm/lock.json).")
+	lock_parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=8, help="Number of packages read at the same time (default 8).")
+	lock_parser.add_argument('--force', dest='force', action='store_true', help="Also lock revisions with local changes or on no remote branch (warns).")
+
+	sync_parser = subparsers.add_parser('sync', description='Brings installed packages to the revisions in the lockfile, only the ones that differ are touched.')
+	sync_parser.set_defaults(action='sync')
+	sync_parser.add_argument('--file', dest='file', default=None, help="Lockfile path (default .wpm/lock.json).")
+	sync_parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=8, help="Number of packages synced at the same time (default 8).")
+	sync_parser.add_argument('--force', dest='force', action='store_true', help="Discard local changes in packages that have to move.")
 
 	rm_parser = subparsers.add_parser('rm', description='remove a package')
 	rm_parser.set_defaults(action='remove')
 	rm_parser.add_argument('name', help='The name of the package to remove.')
 
+	return parser, subparsers
+
+def main():
+	#already started by wpmcli.entry (the console script), here for `python -c "from wpmcli.cli import main"`
+	if "--startup-profile" in sys.argv[1:]:
+		_profile.start()
+
+	try:
+		_main()
+	finally:
+		#also on exit() (bad workspace or search locations), stderr: stdout may be carrying --format records
+		if _profile.enabled:
+			print(_profile.report(), file = sys.stderr)
+
+def _main():
+	with _profile.section("validate workspace"):
+		workspace = validate_workspace()
+
+	user_arguments = sys.argv[1:]
+
+	parser, subparsers = build_parser()
 	args = parser.parse_args(user_arguments)
 
+	global _use_cache
+	_use_cache = not args.no_cache
+
+	if os.environ.get("WPM_NO_DAEMON", "") in ["", "0"] and _can_forward(args):
+		from workspace_package_manager import wpm_daemon
+		code = wpm_daemon.forward(workspace, user_arguments)
+		if code != None:
+			sys.exit(code)
+
+	if args.trace != None:
+		wpm_trace.tracer.start(args.trace)
+
 	if hasattr(args, 'action'):
-		_exec_action(workspace, args)
+		with _profile.section(f"run {args.action}"), wpm_trace.span(f"wpm {args.action}", "command"):
+			_exec_action(workspace, args)
 	else:
 		print("Usage:")
 		print("\t-> wpm [-q] ACTION [args]")
@@ -414,5 +985,8 @@ def main():
 		print("Search search locations (WPM_SEARCH_LOCATIONS):")
 		for p in get_package_search_locations(workspace):
 			print(f"\t-> {p}")
-	
 
+	if wpm_trace.tracer.enabled:
+		count = wpm_trace.tracer.save()
+		#stderr, stdout may be carrying --format records
+		print(f"-- trace: {count} events written to {args.trace}", file = sys.stderr)
@@ -0,0 +1,15 @@
+import sys
+
+#console script entry: `--startup-profile` has to hook imports before wpmcli.cli (and everything it imports) is loaded,
+#wpm_startup_profile itself only needs modules python has already loaded at startup
+
+def main():
+	if "--startup-profile" in sys.argv[1:]:
+		from workspace_package_manager import wpm_startup_profile
+		wpm_startup_profile.profile.start()
+
+	from wpmcli import cli
+	cli.main()
+
+if __name__ == "__main__":
+	main()